@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Binary Viewer 命令行工具 (不依赖 PyQt5，适合批量处理)
+用法:
+  python binary_cli.py hexdump FILE [-s OFFSET] [-n LENGTH] [-w BYTES_PER_LINE]
+  python binary_cli.py search PATTERN FILE [FILE ...] [-m MAX] [-j JOBS]
+      PATTERN: hex "DE AD BE EF" / 通配 "DE ?? BE EF" / 文本 "hello"
+  python binary_cli.py stats FILE [FILE ...] [--blocks] [--cache] [-j JOBS]
+输出按行流式写到 stdout，内存占用与文件大小无关 (每次只读一个块)
+"""
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # 共用的 viewer/cli_common.py
+from binary_core import (
+    SEARCH_CHUNK_SIZE, STATS_BLOCK_SIZE, byte_counts, iter_find, iter_hexdump,
+    load_block_stats, open_mapped, parse_find_query, save_block_stats, stats_from_counts,
+)
+from cli_common import run_files
+
+
+def _int(text):
+    """十进制或 0x 十六进制"""
+    return int(text, 0)
+
+
+def _reader(data):
+    return lambda offset, n: data[offset: offset + n]
+
+
+def _close(f, data):
+    if hasattr(data, "close"):
+        data.close()
+    f.close()
+
+
+def cmd_hexdump(args, out):
+    f, data = open_mapped(args.file)
+    try:
+        size = len(data)
+        offset = min(max(args.offset, 0), size)
+        length = size - offset if args.length is None else min(args.length, size - offset)
+        for line in iter_hexdump(_reader(data), offset, length, args.width):
+            out.write(line + "\n")
+    finally:
+        _close(f, data)
+    return 0
+
+
+SEARCH_BATCH_HITS = 100000  # 并行查找时每个任务最多返回的偏移数，结果占用的内存有上限
+
+
+def _file_hits(data, query, max_count=None, start=0):
+    """逐个产出 data 中从 start 起的匹配偏移 (最多 max_count 个)"""
+    mode, patt = parse_find_query(query)
+    n = 0
+    for off in iter_find(_reader(data), len(data), mode, patt, start, chunk_size=SEARCH_CHUNK_SIZE):
+        yield off
+        n += 1
+        if max_count and n >= max_count:
+            return
+
+
+def search_file(path, query, start=0, limit=SEARCH_BATCH_HITS):
+    """
+    从 start 起查找，最多返回 limit 个偏移 (供并行查找的进程调用)
+    返回 (path, [offset, ...], next_start, error)；next_start 为 None 表示已查到文件末尾
+    """
+    try:
+        f, data = open_mapped(path)
+    except OSError as e:
+        return path, [], None, str(e)
+    try:
+        hits = list(_file_hits(data, query, limit, start))
+    finally:
+        _close(f, data)
+    return path, hits, (hits[-1] + 1 if len(hits) >= limit else None), None
+
+
+def _search_serial(files, query, max_count):
+    """逐个文件产出 (path, 偏移的迭代器, error)；偏移边查边产出，不先收集起来"""
+    for path in files:
+        try:
+            f, data = open_mapped(path)
+        except OSError as e:
+            yield path, (), str(e)
+            continue
+        try:
+            yield path, _file_hits(data, query, max_count), None
+        finally:
+            _close(f, data)
+
+
+def _search_parallel(files, query, jobs, max_count):
+    """
+    同时查 jobs 个文件，每个任务最多返回 SEARCH_BATCH_HITS 个偏移，用完再从下一个偏移接着查
+    按输入顺序产出 (path, [offset, ...], error)；每个文件只有一个任务在途，内存占用有上限
+    """
+    def submit(path, start, count):
+        limit = SEARCH_BATCH_HITS if not max_count else min(SEARCH_BATCH_HITS, max_count - count)
+        return pool.submit(search_file, path, query, start, limit)
+
+    files = iter(files)
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        pending = deque([path, submit(path, 0, 0), 0] for path in islice(files, jobs))
+        while pending:
+            entry = pending[0]
+            path, hits, next_start, err = entry[1].result()
+            yield path, hits, err
+            entry[2] += len(hits)
+            if next_start is not None and not (max_count and entry[2] >= max_count):
+                entry[1] = submit(path, next_start, entry[2])
+                continue
+            pending.popleft()
+            path = next(files, None)
+            if path is not None:
+                pending.append([path, submit(path, 0, 0), 0])
+
+
+def cmd_search(args, out):
+    mode, _ = parse_find_query(args.pattern)
+    if mode is None:
+        sys.stderr.write("查找字符串无法识别为 hex / 通配 / 文本\n")
+        return 2
+    if args.jobs <= 1 or len(args.files) <= 1:
+        results = _search_serial(args.files, args.pattern, args.max_count)
+    else:
+        results = _search_parallel(args.files, args.pattern, args.jobs, args.max_count)
+    found = False
+    for path, hits, err in results:
+        if err:
+            sys.stderr.write(f"{path}: {err}\n")
+            continue
+        for off in hits:
+            found = True
+            out.write(f"{path}:{off}:0x{off:08X}\n")
+    return 0 if found else 1
+
+
+def stats_file(path, with_blocks=False, use_cache=False, block_size=STATS_BLOCK_SIZE):
+    """
+    整个文件的 (size, entropy, zero_ratio, printable_ratio)，以及可选的逐块统计
+    返回 (path, summary, blocks, error)
+    """
+    blocks = load_block_stats(path, block_size) if use_cache else None
+    try:
+        f, data = open_mapped(path)
+    except OSError as e:
+        return path, None, None, str(e)
+    try:
+        size = len(data)
+        total = [0] * 256
+        fresh = [] if (with_blocks or use_cache) and blocks is None else None
+        view = memoryview(data)
+        try:
+            for pos in range(0, size, block_size):
+                part = view[pos: pos + block_size]
+                counts = byte_counts(part)
+                for i, c in enumerate(counts):
+                    total[i] += int(c)
+                if fresh is not None:
+                    fresh.extend(stats_from_counts(counts, len(part)))
+                part.release()
+        finally:
+            view.release()
+    finally:
+        _close(f, data)
+    if fresh is not None:
+        blocks = array("f", fresh)
+        if use_cache:
+            save_block_stats(path, blocks, block_size)
+    summary = (size,) + stats_from_counts(total, size)
+    return path, summary, (blocks if with_blocks else None), None
+
+
+def cmd_stats(args, out):
+    out.write("path\tsize\tentropy\tzero\tprintable\n")
+    rc = 0
+    for path, summary, blocks, err in run_files(stats_file, args.files, args.jobs, args.blocks, args.cache):
+        if err:
+            sys.stderr.write(f"{path}: {err}\n")
+            rc = 1
+            continue
+        size, e, z, p = summary
+        out.write(f"{path}\t{size}\t{e:.4f}\t{z:.4f}\t{p:.4f}\n")
+        if blocks is not None:
+            for i in range(len(blocks) // 3):
+                e, z, p = blocks[i * 3: i * 3 + 3]
+                out.write(f"  0x{i * STATS_BLOCK_SIZE:08X}\t{e:.4f}\t{z:.4f}\t{p:.4f}\n")
+    return rc
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="二进制文件 hexdump / 查找 / 统计 (无界面)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("hexdump", help="输出 hex + ASCII")
+    p.add_argument("file")
+    p.add_argument("-s", "--offset", type=_int, default=0, help="起始偏移 (支持 0x)")
+    p.add_argument("-n", "--length", type=_int, default=None, help="长度 (默认到文件末尾)")
+    p.add_argument("-w", "--width", type=int, default=16, help="每行字节数")
+    p.set_defaults(func=cmd_hexdump)
+
+    p = sub.add_parser("search", help="查找 hex / ?? 通配 / 文本，输出 path:offset:0xOFFSET")
+    p.add_argument("pattern")
+    p.add_argument("files", nargs="+")
+    p.add_argument("-m", "--max-count", type=int, default=None, help="每个文件最多输出的匹配数")
+    p.add_argument("-j", "--jobs", type=int, default=1, help="并行进程数")
+    p.set_defaults(func=cmd_search)
+
+    p = sub.add_parser("stats", help="熵 / 全零比例 / 可打印比例")
+    p.add_argument("files", nargs="+")
+    p.add_argument("--blocks", action="store_true", help="同时输出逐块统计")
+    p.add_argument("--cache", action="store_true", help="读写 .bvstats 旁路缓存 (与界面共用)")
+    p.add_argument("-j", "--jobs", type=int, default=1, help="并行进程数")
+    p.set_defaults(func=cmd_stats)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args, sys.stdout)
+    except BrokenPipeError:  # eg: | head
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
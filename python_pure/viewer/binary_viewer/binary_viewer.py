@@ -10,13 +10,401 @@ Features:
 - 跳转到偏移 (goto offset)
 - 在状态栏显示当前光标所在字节的文件偏移
 - 另存为 (保存当前文件的副本)
+- 大文件: mmap 打开，只渲染当前窗口附近的若干行
+- 概览条: 后台按块统计熵 / 全零比例 / 可打印比例，结果缓存在旁路文件 (.bvstats)，
+  点击概览条直接跳转 (方便定位压缩区、擦除区)
+- 对比模式: 两个文件按块并行哈希，只在不同的块里细化到字节区间，
+  左右同步显示并高亮差异，可跳到上一处/下一处差异
+- 编辑: 在 hex / ASCII 区直接输入覆盖字节，修改记录在 piece table 中 (原文件保持 mmap 只读)，
+  支持撤销/重做；保存回原文件时只写入改动过的字节，另存为时按 piece 流式写出
+- 数据检查面板: 把光标处的字节解码为 int8~int64 (LE/BE)、float32/64、时间戳以及自定义结构体，
+  结构体格式预编译为 struct.Struct，直接在 mmap 上 unpack_from (不拷贝切片)
+- 查找支持 ?? 通配字节 (eg: DE ?? BE EF)
+不依赖 Qt 的格式化 / 查找 / 统计 / 对比逻辑在 binary_core.py，命令行工具见 binary_cli.py
 """
 from PyQt5 import QtWidgets, QtGui, QtCore
+from array import array
+from bisect import bisect_left, bisect_right
+import mmap
 import sys
 import os
-import re
 
-HEX_PREFIX_WIDTH = 10  # e.g. "00000000: "
+from binary_core import (
+    HEX_PREFIX_WIDTH, STATS_BLOCK_SIZE, INSPECTOR_FIELDS, PieceTable,
+    compute_block_stats, diff_files, format_hex_line, inspect_at, iter_find,
+    load_block_stats, open_mapped, parse_find_query, parse_layouts, save_block_stats,
+    format_layout_values,
+)
+
+WINDOW_LINES = 4096  # 文本框中一次最多渲染的行数
+DIFF_WINDOW_LINES = 1024
+
+
+# ---------- overview strip ----------
+class BlockStatsWorker(QtCore.QThread):
+    """后台计算块统计；自己打开文件 / mmap，不与界面共享句柄"""
+    progress = QtCore.pyqtSignal(int, int)
+    done = QtCore.pyqtSignal(str, object)
+
+    def __init__(self, path, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self._cancel = False
+
+    def cancel(self):
+        self._cancel = True
+
+    def run(self):
+        stats = load_block_stats(self.path)
+        if stats is None:
+            try:
+                with open(self.path, "rb") as f:
+                    if os.fstat(f.fileno()).st_size == 0:
+                        stats = array("f")
+                    else:
+                        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                            stats = compute_block_stats(
+                                mm, progress=self.progress.emit, cancelled=lambda: self._cancel
+                            )
+            except Exception:
+                stats = None
+            if stats is None:
+                return
+            save_block_stats(self.path, stats)
+        self.done.emit(self.path, stats)
+
+
+class OverviewStrip(QtWidgets.QWidget):
+    """
+    竖直概览条：每个像素行对应文件的一段
+    颜色: 全零=黑，高熵(压缩/加密)=红，文本=绿，其它按熵从蓝到黄
+    """
+    offsetClicked = QtCore.pyqtSignal(int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setFixedWidth(36)
+        self.setMouseTracking(True)
+        self.stats = None
+        self.file_size = 0
+        self.block_size = STATS_BLOCK_SIZE
+        self.window = (0, 0)  # 当前渲染窗口 [start, end)
+        self.progress_text = ""
+        self._image = None
+
+    def set_stats(self, stats, file_size):
+        self.stats = stats
+        self.file_size = file_size
+        self.progress_text = ""
+        self._image = None
+        self.update()
+
+    def set_progress(self, done, total):
+        self.progress_text = f"{done * 100 // max(total, 1)}%"
+        self.update()
+
+    def set_window(self, start, end):
+        self.window = (start, end)
+        self.update()
+
+    @staticmethod
+    def block_color(entropy, zero, printable):
+        if zero >= 0.99:
+            return QtGui.QColor(0, 0, 0)
+        if entropy >= 7.5:
+            return QtGui.QColor(220, 40, 40)
+        if printable >= 0.9:
+            return QtGui.QColor(60, 180, 75)
+        t = max(0.0, min(entropy / 7.5, 1.0))
+        return QtGui.QColor(int(40 + 200 * t), int(80 + 140 * t), int(200 - 150 * t))
+
+    def _render_image(self):
+        h = max(self.height(), 1)
+        img = QtGui.QImage(1, h, QtGui.QImage.Format_RGB32)
+        img.fill(QtGui.QColor(128, 128, 128))
+        nblocks = len(self.stats) // 3
+        if nblocks:
+            for y in range(h):
+                b0 = y * nblocks // h
+                b1 = max((y + 1) * nblocks // h, b0 + 1)
+                n = b1 - b0
+                e = sum(self.stats[i * 3] for i in range(b0, b1)) / n
+                z = sum(self.stats[i * 3 + 1] for i in range(b0, b1)) / n
+                p = sum(self.stats[i * 3 + 2] for i in range(b0, b1)) / n
+                img.setPixelColor(0, y, self.block_color(e, z, p))
+        self._image = img
+
+    def resizeEvent(self, event):
+        self._image = None
+        super().resizeEvent(event)
+
+    def paintEvent(self, event):
+        painter = QtGui.QPainter(self)
+        rect = self.rect()
+        if self.stats is None or not self.file_size:
+            painter.fillRect(rect, QtGui.QColor(128, 128, 128))
+            if self.progress_text:
+                painter.drawText(rect, QtCore.Qt.AlignCenter, self.progress_text)
+            return
+        if self._image is None or self._image.height() != rect.height():
+            self._render_image()
+        painter.drawImage(rect, self._image)
+        start, end = self.window
+        if end > start:
+            y0 = int(start * rect.height() / self.file_size)
+            y1 = max(int(end * rect.height() / self.file_size), y0 + 2)
+            painter.setPen(QtGui.QPen(QtGui.QColor(255, 255, 255), 1))
+            painter.setBrush(QtGui.QColor(255, 255, 255, 60))
+            painter.drawRect(0, y0, rect.width() - 1, y1 - y0)
+
+    def offset_at(self, y):
+        if not self.file_size:
+            return None
+        y = max(0, min(y, self.height() - 1))
+        return min(int(y * self.file_size / max(self.height(), 1)), self.file_size - 1)
+
+    def mousePressEvent(self, event):
+        off = self.offset_at(event.pos().y())
+        if off is not None:
+            self.offsetClicked.emit(off)
+
+    def mouseMoveEvent(self, event):
+        off = self.offset_at(event.pos().y())
+        if off is None:
+            return
+        if event.buttons() & QtCore.Qt.LeftButton:
+            self.offsetClicked.emit(off)
+        if self.stats:
+            i = min(off // self.block_size, len(self.stats) // 3 - 1)
+            e, z, p = self.stats[i * 3: i * 3 + 3]
+            self.setToolTip(f"0x{off:08X}\n熵: {e:.2f}\n全零: {z:.0%}\n可打印: {p:.0%}")
+
+# ---------- diff mode ----------
+class DiffWorker(QtCore.QThread):
+    progress = QtCore.pyqtSignal(int, int)
+    done = QtCore.pyqtSignal(object)
+
+    def __init__(self, path_a, path_b, parent=None):
+        super().__init__(parent)
+        self.path_a = path_a
+        self.path_b = path_b
+        self._cancel = False
+
+    def cancel(self):
+        self._cancel = True
+
+    def run(self):
+        opened = []  # 已经打开的 (file, data)；第二个文件打不开时也要关掉第一个
+        try:
+            for path in (self.path_a, self.path_b):
+                opened.append(open_mapped(path))
+            (_, mm_a), (_, mm_b) = opened
+            ranges = diff_files(mm_a, mm_b, progress=self.progress.emit,
+                                cancelled=lambda: self._cancel)
+        except Exception:  # 打不开 / 对比中读取出错：界面显示对比失败，不会一直停在“对比中”
+            self.done.emit(None)
+            return
+        finally:
+            for f, data in opened:
+                if hasattr(data, "close"):
+                    data.close()
+                f.close()
+        if ranges is not None:  # None 表示已取消
+            self.done.emit(ranges)
+
+
+class HexPane(QtWidgets.QPlainTextEdit):
+    """只渲染 [view_base, view_base + DIFF_WINDOW_LINES 行) 的 hex 面板"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setReadOnly(True)
+        font = QtGui.QFont("Courier New")
+        font.setStyleHint(QtGui.QFont.Monospace)
+        font.setPointSize(10)
+        self.setFont(font)
+        self.setLineWrapMode(QtWidgets.QPlainTextEdit.NoWrap)
+        self.data = bytearray()
+        self.bpl = 16
+        self.view_base = 0
+
+    def render(self, base, end):
+        lines = [format_hex_line(off, self.data[off: off + self.bpl], self.bpl)
+                 for off in range(base, min(end, len(self.data)), self.bpl)]
+        sb = self.verticalScrollBar()
+        sb.blockSignals(True)
+        self.setPlainText('\n'.join(lines))
+        sb.blockSignals(False)
+        self.view_base = base
+
+    def highlight(self, ranges, color):
+        """高亮与当前窗口相交的差异区间 (hex 与 ASCII 两栏)"""
+        bpl = self.bpl
+        base = self.view_base
+        end = min(base + DIFF_WINDOW_LINES * bpl, len(self.data))
+        ascii_start = HEX_PREFIX_WIDTH + bpl * 3 + 1  # hex 区 bpl*3-1 字符 + 两个空格
+        fmt = QtGui.QTextCharFormat()
+        fmt.setBackground(color)
+        doc = self.document()
+        sels = []
+        for s, e in ranges:
+            s, e = max(s, base), min(e, end)
+            off = s
+            while off < e:
+                line_end = min((off // bpl + 1) * bpl, e)
+                block = doc.findBlockByNumber((off - base) // bpl)
+                if not block.isValid():
+                    break
+                c0, c1 = off % bpl, (line_end - 1) % bpl
+                for a, b in ((HEX_PREFIX_WIDTH + c0 * 3, HEX_PREFIX_WIDTH + c1 * 3 + 2),
+                             (ascii_start + c0, ascii_start + c1 + 1)):
+                    cur = QtGui.QTextCursor(block)
+                    cur.setPosition(block.position() + a)
+                    cur.setPosition(block.position() + min(b, block.length() - 1),
+                                    QtGui.QTextCursor.KeepAnchor)
+                    sel = QtWidgets.QTextEdit.ExtraSelection()
+                    sel.cursor = cur
+                    sel.format = fmt
+                    sels.append(sel)
+                off = line_end
+        self.setExtraSelections(sels)
+
+
+class BinaryDiffWindow(QtWidgets.QMainWindow):
+    """两个文件左右对比：同步滚动，高亮差异区间，上一处/下一处差异"""
+
+    def __init__(self, path_a, path_b, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(f"Binary Diff - {os.path.basename(path_a)} <-> {os.path.basename(path_b)}")
+        self.resize(1400, 800)
+        self.path_a = path_a
+        self.path_b = path_b
+        self.ranges = []
+        self.range_starts = []
+        self.current_diff = -1
+        self.view_base = 0
+        self.bpl = 16
+
+        self.file_a, data_a = open_mapped(path_a)
+        self.file_b, data_b = open_mapped(path_b)
+        self.pane_a = HexPane()
+        self.pane_b = HexPane()
+        self.pane_a.data = data_a
+        self.pane_b.data = data_b
+        for pane, other in ((self.pane_a, self.pane_b), (self.pane_b, self.pane_a)):
+            pane.verticalScrollBar().valueChanged.connect(
+                lambda v, pane=pane, other=other: self.on_scrolled(pane, other, v))
+            pane.horizontalScrollBar().valueChanged.connect(other.horizontalScrollBar().setValue)
+
+        splitter = QtWidgets.QSplitter()
+        for pane, path in ((self.pane_a, path_a), (self.pane_b, path_b)):
+            box = QtWidgets.QWidget()
+            vl = QtWidgets.QVBoxLayout(box)
+            vl.setContentsMargins(0, 0, 0, 0)
+            vl.addWidget(QtWidgets.QLabel(f"{path}  ({len(pane.data)} bytes)"))
+            vl.addWidget(pane)
+            splitter.addWidget(box)
+        self.setCentralWidget(splitter)
+
+        tb = self.addToolBar("Diff")
+        tb.setMovable(False)
+        prev_action = QtWidgets.QAction("上一处差异", self)
+        prev_action.setShortcut("Shift+F3")
+        prev_action.triggered.connect(lambda: self.step_diff(-1))
+        tb.addAction(prev_action)
+        next_action = QtWidgets.QAction("下一处差异", self)
+        next_action.setShortcut("F3")
+        next_action.triggered.connect(lambda: self.step_diff(1))
+        tb.addAction(next_action)
+        tb.addSeparator()
+        self.diff_label = QtWidgets.QLabel("对比中...")
+        tb.addWidget(self.diff_label)
+
+        self.render_window(0)
+
+        self.worker = DiffWorker(path_a, path_b, self)
+        self.worker.progress.connect(
+            lambda d, t: self.diff_label.setText(f"对比中... {d * 100 // max(t, 1)}%"))
+        self.worker.done.connect(self.on_diff_done)
+        self.worker.start()
+
+    def total_size(self):
+        return max(len(self.pane_a.data), len(self.pane_b.data))
+
+    def render_window(self, base):
+        bpl = self.bpl
+        total_lines = (self.total_size() + bpl - 1) // bpl
+        line = max(0, min(base // bpl, total_lines - DIFF_WINDOW_LINES))
+        self.view_base = line * bpl
+        end = self.view_base + DIFF_WINDOW_LINES * bpl
+        for pane in (self.pane_a, self.pane_b):
+            pane.render(self.view_base, end)
+        self.apply_highlight()
+
+    def visible_ranges(self):
+        end = self.view_base + DIFF_WINDOW_LINES * self.bpl
+        lo = max(bisect_right(self.range_starts, self.view_base) - 1, 0)
+        hi = bisect_left(self.range_starts, end)
+        return self.ranges[lo:hi]
+
+    def apply_highlight(self):
+        ranges = self.visible_ranges()
+        self.pane_a.highlight(ranges, QtGui.QColor(255, 200, 200))
+        self.pane_b.highlight(ranges, QtGui.QColor(200, 255, 200))
+
+    def on_scrolled(self, pane, other, value):
+        sb = pane.verticalScrollBar()
+        half = DIFF_WINDOW_LINES // 2
+        top = self.view_base + value * self.bpl
+        if value >= sb.maximum() and self.view_base + DIFF_WINDOW_LINES * self.bpl < self.total_size():
+            self.render_window(self.view_base + half * self.bpl)
+        elif value <= sb.minimum() and self.view_base > 0:
+            self.render_window(self.view_base - half * self.bpl)
+        for p in (pane, other):
+            p.verticalScrollBar().blockSignals(True)
+            p.verticalScrollBar().setValue((top - self.view_base) // self.bpl)
+            p.verticalScrollBar().blockSignals(False)
+
+    def on_diff_done(self, ranges):
+        if ranges is None:
+            self.diff_label.setText("对比失败")
+            return
+        self.ranges = ranges
+        self.range_starts = [s for s, _ in ranges]
+        diff_bytes = sum(e - s for s, e in ranges)
+        self.diff_label.setText(f"差异: {len(ranges)} 处, {diff_bytes} bytes")
+        self.apply_highlight()
+        if ranges:
+            self.step_diff(1)
+
+    def step_diff(self, direction):
+        if not self.ranges:
+            return
+        self.current_diff = (self.current_diff + direction) % len(self.ranges)
+        start, end = self.ranges[self.current_diff]
+        self.goto(start)
+        self.diff_label.setText(
+            f"差异 {self.current_diff + 1}/{len(self.ranges)}: 0x{start:08X} - 0x{end:08X} ({end - start} bytes)")
+
+    def goto(self, offset):
+        bpl = self.bpl
+        if not (self.view_base <= offset < self.view_base + DIFF_WINDOW_LINES * bpl):
+            self.render_window(offset - DIFF_WINDOW_LINES // 2 * bpl)
+        line = (offset - self.view_base) // bpl
+        for pane in (self.pane_a, self.pane_b):
+            block = pane.document().findBlockByNumber(line)
+            if block.isValid():
+                pane.setTextCursor(QtGui.QTextCursor(block))
+                pane.centerCursor()
+
+    def closeEvent(self, event):
+        self.worker.cancel()
+        self.worker.wait()
+        for obj in (self.pane_a.data, self.pane_b.data, self.file_a, self.file_b):
+            if hasattr(obj, "close"):
+                obj.close()
+        super().closeEvent(event)
+
 
 class BinaryViewer(QtWidgets.QMainWindow):
     def __init__(self):
@@ -25,8 +413,11 @@ class BinaryViewer(QtWidgets.QMainWindow):
         self.resize(1000, 700)
 
         self.bytes_per_line = 16
-        self.data = bytearray()
+        self.data = PieceTable(bytearray())
         self.current_path = None
+        self._file = None
+        self.view_base = 0  # 当前渲染窗口的起始偏移 (bytes_per_line 对齐)
+        self.stats_worker = None
 
         # --- widgets
         self.text = QtWidgets.QPlainTextEdit()
@@ -37,8 +428,19 @@ class BinaryViewer(QtWidgets.QMainWindow):
         self.text.setFont(font)
         self.text.setLineWrapMode(QtWidgets.QPlainTextEdit.NoWrap)
         self.text.cursorPositionChanged.connect(self.on_cursor_moved)
+        self.text.verticalScrollBar().valueChanged.connect(self.on_scrolled)
+        self.text.installEventFilter(self)
 
-        self.setCentralWidget(self.text)
+        self.overview = OverviewStrip()
+        self.overview.offsetClicked.connect(self.goto_and_highlight)
+
+        central = QtWidgets.QWidget()
+        hl = QtWidgets.QHBoxLayout(central)
+        hl.setContentsMargins(0, 0, 0, 0)
+        hl.setSpacing(2)
+        hl.addWidget(self.text)
+        hl.addWidget(self.overview)
+        self.setCentralWidget(central)
 
         # toolbar
         tb = self.addToolBar("Main")
@@ -48,10 +450,29 @@ class BinaryViewer(QtWidgets.QMainWindow):
         open_action.triggered.connect(self.open_file)
         tb.addAction(open_action)
 
+        save_action = QtWidgets.QAction("保存", self)
+        save_action.setShortcut(QtGui.QKeySequence.Save)
+        save_action.triggered.connect(self.save)
+        tb.addAction(save_action)
+
         saveas_action = QtWidgets.QAction("另存为", self)
         saveas_action.triggered.connect(self.save_as)
         tb.addAction(saveas_action)
 
+        undo_action = QtWidgets.QAction("撤销", self)
+        undo_action.setShortcut(QtGui.QKeySequence.Undo)
+        undo_action.triggered.connect(self.undo)
+        tb.addAction(undo_action)
+
+        redo_action = QtWidgets.QAction("重做", self)
+        redo_action.setShortcut(QtGui.QKeySequence.Redo)
+        redo_action.triggered.connect(self.redo)
+        tb.addAction(redo_action)
+
+        diff_action = QtWidgets.QAction("对比", self)
+        diff_action.triggered.connect(self.open_diff)
+        tb.addAction(diff_action)
+
         tb.addSeparator()
         tb.addWidget(QtWidgets.QLabel("每行字节:"))
         self.spin_bpl = QtWidgets.QSpinBox()
@@ -63,7 +484,7 @@ class BinaryViewer(QtWidgets.QMainWindow):
         tb.addSeparator()
         tb.addWidget(QtWidgets.QLabel("查找:"))
         self.find_edit = QtWidgets.QLineEdit()
-        self.find_edit.setPlaceholderText("输入 hex (eg: DE AD BE EF) 或文本 (eg: hello)")
+        self.find_edit.setPlaceholderText("输入 hex (eg: DE AD BE EF / DE ?? BE EF) 或文本 (eg: hello)")
         self.find_edit.returnPressed.connect(self.on_find)
         tb.addWidget(self.find_edit)
         find_btn = QtWidgets.QPushButton("查找")
@@ -86,8 +507,30 @@ class BinaryViewer(QtWidgets.QMainWindow):
         self.size_label = QtWidgets.QLabel("Size: 0")
         self.status.addPermanentWidget(self.size_label)
 
-        # find results area
-        self.find_results = []
+        # data inspector
+        self.settings = QtCore.QSettings("python_pure", "binary_viewer")
+        self.inspector_fields = list(INSPECTOR_FIELDS)
+        self.inspector_table = QtWidgets.QTableWidget(0, 2)
+        self.inspector_table.setHorizontalHeaderLabels(["类型", "值"])
+        self.inspector_table.horizontalHeader().setStretchLastSection(True)
+        self.inspector_table.verticalHeader().setVisible(False)
+        self.inspector_table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.layout_edit = QtWidgets.QPlainTextEdit()
+        self.layout_edit.setPlaceholderText("自定义结构体，每行一个:\nheader = <4sIHH\nentry = >QQ")
+        self.layout_edit.setPlainText(self.settings.value("inspector/layouts", "", type=str))
+        self.layout_edit.setMaximumHeight(100)
+        apply_btn = QtWidgets.QPushButton("应用结构体")
+        apply_btn.clicked.connect(self.apply_layouts)
+        dock_widget = QtWidgets.QWidget()
+        vl = QtWidgets.QVBoxLayout(dock_widget)
+        vl.setContentsMargins(2, 2, 2, 2)
+        vl.addWidget(self.inspector_table)
+        vl.addWidget(self.layout_edit)
+        vl.addWidget(apply_btn)
+        dock = QtWidgets.QDockWidget("数据检查", self)
+        dock.setWidget(dock_widget)
+        self.addDockWidget(QtCore.Qt.RightDockWidgetArea, dock)
+        self.apply_layouts(quiet=True)
 
     # ---------- core ----------
     def open_file(self):
@@ -96,16 +539,107 @@ class BinaryViewer(QtWidgets.QMainWindow):
         )
         if not path:
             return
+        self.load_file(path)
+
+    def load_file(self, path):
+        if not self.confirm_discard():
+            return
         try:
-            with open(path, "rb") as f:
-                self.data = bytearray(f.read())
+            f, data = open_mapped(path)
         except Exception as e:
             QtWidgets.QMessageBox.critical(self, "错误", f"无法打开文件:\n{e}")
             return
+        self.close_file()
+        self._file = f
+        self.data = PieceTable(data)
         self.current_path = path
+        self.view_base = 0
         self.path_label.setText(path)
         self.update_title()
         self.refresh_view()
+        self.start_stats()
+
+    def close_file(self):
+        self.stop_stats()
+        self.data.close()
+        self.data = PieceTable(bytearray())
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def closeEvent(self, event):
+        if not self.confirm_discard():
+            event.ignore()
+            return
+        self.close_file()
+        super().closeEvent(event)
+
+    def confirm_discard(self):
+        """有未保存的修改时询问是否放弃"""
+        if not self.data.is_modified():
+            return True
+        ret = QtWidgets.QMessageBox.question(
+            self, "提示", "当前文件有未保存的修改，是否放弃？",
+            QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No
+        )
+        return ret == QtWidgets.QMessageBox.Yes
+
+    # ---------- overview ----------
+    def stop_stats(self):
+        if self.stats_worker is not None:
+            self.stats_worker.cancel()
+            self.stats_worker.wait()
+            self.stats_worker = None
+
+    def start_stats(self):
+        self.stop_stats()
+        self.overview.set_stats(None, len(self.data))
+        if not self.current_path or not self.data:
+            return
+        worker = BlockStatsWorker(self.current_path, self)
+        worker.progress.connect(self.overview.set_progress)
+        worker.done.connect(self.on_stats_done)
+        worker.finished.connect(lambda w=worker: self.on_stats_finished(w))
+        self.stats_worker = worker
+        worker.start(QtCore.QThread.LowPriority)
+
+    def on_stats_finished(self, worker):
+        """线程结束 (完成 / 取消 / 出错) 后才释放；之后 stop_stats 不会再用到已删除的 QThread"""
+        if worker is self.stats_worker:
+            self.stats_worker = None
+        worker.deleteLater()
+
+    def on_stats_done(self, path, stats):
+        if path != self.current_path:
+            return
+        self.overview.set_stats(stats, len(self.data))
+        self.update_overview_window()
+
+    def update_overview_window(self):
+        start, end = self.window_range()
+        self.overview.set_window(start, end)
+
+    def open_diff(self):
+        """与另一个文件对比 (当前未打开文件时先选择第一个文件)"""
+        first = self.current_path
+        if not first:
+            first, _ = QtWidgets.QFileDialog.getOpenFileName(
+                self, "选择第一个文件", os.getcwd(), "All Files (*.*)"
+            )
+            if not first:
+                return
+        second, _ = QtWidgets.QFileDialog.getOpenFileName(
+            self, "选择要对比的文件", os.path.dirname(first), "All Files (*.*)"
+        )
+        if not second:
+            return
+        try:
+            win = BinaryDiffWindow(first, second, self)
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, "错误", f"无法打开文件:\n{e}")
+            return
+        win.setAttribute(QtCore.Qt.WA_DeleteOnClose)
+        win.show()
 
     def save_as(self):
         if not self.data:
@@ -116,105 +650,242 @@ class BinaryViewer(QtWidgets.QMainWindow):
         )
         if not path:
             return
+        if self.current_path and os.path.exists(path) and os.path.samefile(path, self.current_path):
+            self.save()
+            return
         try:
             with open(path, "wb") as f:
-                f.write(self.data)
+                self.data.write_to(f)
         except Exception as e:
             QtWidgets.QMessageBox.critical(self, "错误", f"保存失败:\n{e}")
             return
         QtWidgets.QMessageBox.information(self, "完成", f"已保存为: {path}")
 
+    def save(self):
+        """保存回原文件：只写入修改过的字节"""
+        if not self.current_path or not self.data.is_modified():
+            return
+        try:
+            self.data.write_in_place(self.current_path)
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, "错误", f"保存失败:\n{e}")
+            return
+        self.update_title()
+        self.start_stats()
+        self.status.showMessage("已保存", 3000)
+
+    # ---------- editing ----------
+    def eventFilter(self, obj, event):
+        if obj is self.text and event.type() == QtCore.QEvent.KeyPress:
+            if self.edit_key(event.text()):
+                return True
+        return super().eventFilter(obj, event)
+
+    def cursor_offset(self):
+        """光标位置对应的 (offset, area, nibble)；area 为 "hex" / "ascii"，不在数据上时 offset 为 None"""
+        cursor = self.text.textCursor()
+        line_no = cursor.block().blockNumber()
+        col = cursor.positionInBlock()
+        bpl = self.bytes_per_line
+        hex_start = HEX_PREFIX_WIDTH
+        ascii_start = hex_start + bpl * 3 + 1  # hex 区 bpl*3-1 字符 + 两个空格
+        offset, area, nibble = None, None, 0
+        if hex_start <= col < ascii_start - 2:
+            idx_in_hex = col - hex_start
+            offset = line_no * bpl + idx_in_hex // 3
+            area, nibble = "hex", min(idx_in_hex % 3, 1)
+        elif ascii_start <= col < ascii_start + bpl:
+            offset = line_no * bpl + col - ascii_start
+            area = "ascii"
+        if offset is not None:
+            offset += self.view_base
+            if offset >= len(self.data):
+                offset = None
+        return offset, area, nibble
+
+    def edit_key(self, ch):
+        """在光标处覆盖写一个 hex 半字节 / 一个 ASCII 字符；返回是否已处理"""
+        if not ch or not ch.isprintable():
+            return False
+        offset, area, nibble = self.cursor_offset()
+        if offset is None:
+            return False
+        old = self.data[offset]
+        if area == "hex":
+            if ch not in "0123456789abcdefABCDEF":
+                return False
+            v = int(ch, 16)
+            new = (v << 4) | (old & 0x0F) if nibble == 0 else (old & 0xF0) | v
+        else:
+            if not (32 <= ord(ch) <= 126):
+                return False
+            new = ord(ch)
+        self.data.overwrite(offset, bytes([new]))
+        self.redraw_line(offset)
+        # 前进光标：hex 区高半字节 -> 低半字节 -> 下一个字节
+        if area == "hex" and nibble == 0:
+            self.set_cursor(offset, "hex", 1)
+        else:
+            self.set_cursor(min(offset + 1, len(self.data) - 1), area, 0)
+        self.update_title()
+        return True
+
+    def redraw_line(self, offset):
+        bpl = self.bytes_per_line
+        base = offset - offset % bpl
+        block = self.text.document().findBlockByNumber((base - self.view_base) // bpl)
+        if not block.isValid():
+            return
+        cur = QtGui.QTextCursor(block)
+        cur.movePosition(QtGui.QTextCursor.EndOfBlock, QtGui.QTextCursor.KeepAnchor)
+        cur.insertText(format_hex_line(base, self.data[base: base + bpl], bpl))
+
+    def set_cursor(self, offset, area, nibble):
+        bpl = self.bytes_per_line
+        start, end = self.window_range()
+        if not (start <= offset < end):
+            self.move_window(offset - WINDOW_LINES // 2 * bpl)
+        block = self.text.document().findBlockByNumber((offset - self.view_base) // bpl)
+        if not block.isValid():
+            return
+        if area == "hex":
+            col = HEX_PREFIX_WIDTH + (offset % bpl) * 3 + nibble
+        else:
+            col = HEX_PREFIX_WIDTH + bpl * 3 + 1 + offset % bpl
+        cur = QtGui.QTextCursor(block)
+        cur.setPosition(block.position() + col)
+        self.text.setTextCursor(cur)
+
+    def undo(self):
+        self.apply_history(self.data.undo())
+
+    def redo(self):
+        self.apply_history(self.data.redo())
+
+    def apply_history(self, offset):
+        if offset is None:
+            return
+        self.refresh_view()
+        self.set_cursor(offset, "hex", 0)
+        self.update_title()
+
     def on_bpl_changed(self, v):
         self.bytes_per_line = v
         self.refresh_view()
 
     def update_title(self):
         name = self.current_path or "(unnamed)"
-        self.setWindowTitle(f"Binary Viewer - {os.path.basename(name)}")
+        mark = " *" if self.data.is_modified() else ""
+        self.setWindowTitle(f"Binary Viewer - {os.path.basename(name)}{mark}")
+
+    def window_range(self):
+        """当前渲染窗口 [start, end)"""
+        end = min(self.view_base + WINDOW_LINES * self.bytes_per_line, len(self.data))
+        return self.view_base, end
 
     def refresh_view(self):
-        """把 self.data 按当前 bytes_per_line 渲染到 self.text"""
+        """把 self.data 中当前窗口按 bytes_per_line 渲染到 self.text"""
         bpl = self.bytes_per_line
+        self.view_base -= self.view_base % bpl
         lines = []
-        size = len(self.data)
-        for base in range(0, size, bpl):
-            chunk = self.data[base: base + bpl]
-            hex_bytes = ' '.join(f"{b:02X}" for b in chunk)
-            pad_len = (bpl - len(chunk)) * 3
-            hex_padded = hex_bytes + ' ' * pad_len
-            ascii_repr = ''.join((chr(b) if 32 <= b <= 126 else '.') for b in chunk)
-            lines.append(f"{base:08X}: {hex_padded}  {ascii_repr}")
+        start, end = self.window_range()
+        for base in range(start, end, bpl):
+            lines.append(format_hex_line(base, self.data[base: base + bpl], bpl))
         text = '\n'.join(lines) if lines else ''
+        sb = self.text.verticalScrollBar()
+        sb.blockSignals(True)
         self.text.setPlainText(text)
+        sb.blockSignals(False)
         self.size_label.setText(f"Size: {len(self.data)} bytes")
         self.offset_label.setText("Offset: -")
-        self.find_results = []
+        self.update_overview_window()
 
-    # ---------- cursor/offset mapping ----------
-    def on_cursor_moved(self):
-        cursor = self.text.textCursor()
-        block = cursor.block()
-        line_no = block.blockNumber()
-        col = cursor.positionInBlock()
+    def move_window(self, base):
+        """把渲染窗口移到 base 附近 (行对齐，并限制在文件范围内)"""
         bpl = self.bytes_per_line
-        hex_start = HEX_PREFIX_WIDTH
-        hex_area_len = bpl * 3
-        ascii_start = hex_start + hex_area_len + 2
-        offset = None
-        if hex_start <= col < (hex_start + hex_area_len):
-            idx_in_hex = col - hex_start
-            byte_index = idx_in_hex // 3
-            offset = line_no * bpl + byte_index
-        elif col >= ascii_start:
-            idx_in_ascii = col - ascii_start
-            byte_index = idx_in_ascii
-            offset = line_no * bpl + byte_index
+        total_lines = (len(self.data) + bpl - 1) // bpl
+        line = max(0, min(base // bpl, total_lines - WINDOW_LINES))
+        if line * bpl != self.view_base:
+            self.view_base = line * bpl
+            self.refresh_view()
+
+    def on_scrolled(self, value):
+        """滚动到窗口边缘时向前/向后平移窗口 (半个窗口)"""
+        sb = self.text.verticalScrollBar()
+        bpl = self.bytes_per_line
+        half = WINDOW_LINES // 2
+        if value >= sb.maximum() and self.window_range()[1] < len(self.data):
+            top = self.view_base + value * bpl
+            self.move_window(self.view_base + half * bpl)
+        elif value <= sb.minimum() and self.view_base > 0:
+            top = self.view_base
+            self.move_window(self.view_base - half * bpl)
         else:
-            offset = None
-        if offset is None or offset >= len(self.data):
+            return
+        sb.blockSignals(True)
+        sb.setValue((top - self.view_base) // bpl)
+        sb.blockSignals(False)
+
+    # ---------- cursor/offset mapping ----------
+    def on_cursor_moved(self):
+        offset, _, _ = self.cursor_offset()
+        if offset is None:
             self.offset_label.setText("Offset: -")
         else:
             self.offset_label.setText(f"Offset: {offset} (0x{offset:08X})")
+        self.update_inspector(offset)
 
-    # ---------- find ----------
-    def parse_find_query(self, s: str):
-        s = s.strip()
-        if not s:
-            return None, None
-        if re.fullmatch(r"[0-9A-Fa-f\s]+", s) and re.search(r"[0-9A-Fa-f]", s):
-            raw = re.sub(r"\s+", "", s)
-            if len(raw) % 2 != 0:
-                return None, None
-            try:
-                b = bytes.fromhex(raw)
-                return "hex", b
-            except Exception:
-                return None, None
+    # ---------- data inspector ----------
+    def apply_layouts(self, quiet=False):
+        text = self.layout_edit.toPlainText()
+        try:
+            layouts = parse_layouts(text)
+        except ValueError as e:
+            if not quiet:
+                QtWidgets.QMessageBox.warning(self, "结构体", str(e))
+            layouts = []
         else:
-            return "text", s.encode('utf-8', errors='ignore')
+            self.settings.setValue("inspector/layouts", text)
+        self.inspector_fields = list(INSPECTOR_FIELDS) + [
+            (name, st, format_layout_values) for name, st in layouts
+        ]
+        table = self.inspector_table
+        table.setRowCount(len(self.inspector_fields))
+        for row, (name, _, _) in enumerate(self.inspector_fields):
+            table.setItem(row, 0, QtWidgets.QTableWidgetItem(name))
+            table.setItem(row, 1, QtWidgets.QTableWidgetItem("-"))
+        table.resizeColumnToContents(0)
+        self.update_inspector(self.cursor_offset()[0])
+
+    def update_inspector(self, offset):
+        """只更新值这一列的文字，行与 QTableWidgetItem 复用"""
+        table = self.inspector_table
+        if offset is None:
+            for row in range(table.rowCount()):
+                table.item(row, 1).setText("-")
+            return
+        for row, (_, text) in enumerate(inspect_at(self.data, offset, self.inspector_fields)):
+            table.item(row, 1).setText(text)
 
+    # ---------- find ----------
     def on_find(self):
         q = self.find_edit.text()
-        mode, patt = self.parse_find_query(q)
+        mode, patt = parse_find_query(q)
         if mode is None:
             QtWidgets.QMessageBox.warning(self, "查找", "查找字符串无法识别为 hex 或 文本")
             return
-        self.find_results = []
-        start = 0
-        while True:
-            idx = self.data.find(patt, start)
-            if idx == -1:
-                break
-            self.find_results.append(idx)
-            start = idx + 1
-        if not self.find_results:
+        offset = next(iter_find(self.data.read, len(self.data), mode, patt), None)
+        if offset is None:
             QtWidgets.QMessageBox.information(self, "查找", "未找到匹配项")
             return
-        self.goto_and_highlight(self.find_results[0])
+        self.goto_and_highlight(offset)
 
     def goto_and_highlight(self, offset: int):
         bpl = self.bytes_per_line
-        line = offset // bpl
+        start, end = self.window_range()
+        if not (start <= offset < end):
+            self.move_window(offset - WINDOW_LINES // 2 * bpl)
+        line = (offset - self.view_base) // bpl
         doc = self.text.document()
         block = doc.findBlockByNumber(line)
         if not block.isValid():
@@ -248,7 +919,12 @@ class BinaryViewer(QtWidgets.QMainWindow):
 
 def main():
     app = QtWidgets.QApplication(sys.argv)
-    win = BinaryViewer()
+    if len(sys.argv) > 2:
+        win = BinaryDiffWindow(sys.argv[1], sys.argv[2])
+    else:
+        win = BinaryViewer()
+        if len(sys.argv) > 1:
+            win.load_file(sys.argv[1])
     win.show()
     sys.exit(app.exec_())
 
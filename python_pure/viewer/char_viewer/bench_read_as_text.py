@@ -0,0 +1,115 @@
+# bench_read_as_text.py
+"""
+read_as_text 编码检测基准：
+  1) 采样评分 vs 整个文件评分（旧行为）
+  2) printable_and_chinese_score 向量化实现 vs 原来的逐字符生成器实现（先核对结果完全一致）
+用法:
+  python bench_read_as_text.py [大小MB] [编码]
+  python bench_read_as_text.py --check      只核对评分结果一致（几秒内完成，不生成文件、不计时）
+例如:
+  python bench_read_as_text.py 200 gbk
+会先核对评分结果，再在临时目录生成一个指定编码的日志文件，分别计时两种方式并核对选出的编码一致
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+import char_core
+from char_core import printable_and_chinese_score, read_as_text
+
+LINE = "2024-05-01 12:00:{sec:02d} [INFO] 设备 {n} 上报状态正常，电压 220V，温度 36.5℃ device ok\n"
+
+
+def make_file(path, size_mb, encoding):
+    target = size_mb * 1024 * 1024
+    block = "".join(LINE.format(sec=i % 60, n=i) for i in range(2000)).encode(encoding)
+    with open(path, "wb") as f:
+        written = 0
+        while written < target:
+            f.write(block)
+            written += len(block)
+
+
+def reference_score(text):
+    """原来的逐字符实现，作为对照"""
+    if not text:
+        return 0.0, 0.0, 0.0
+    length = len(text)
+    replace_count = text.count('\ufffd')
+    control_count = sum(1 for ch in text if ord(ch) < 32 and ch not in '\n\r\t')
+    printable_ratio = (length - replace_count - control_count) / length
+    han_count = sum(1 for ch in text if '\u4e00' <= ch <= '\u9fff')
+    chinese_ratio = han_count / length
+    return printable_ratio + 0.5 * chinese_ratio, printable_ratio, chinese_ratio
+
+
+def random_text(n, rng):
+    pools = [(0, 0x20), (0x20, 0x7f), (0x4e00, 0xa000), (0xac00, 0xd7a4), (0x3040, 0x3100)]
+    out = []
+    for _ in range(n):
+        lo, hi = rng.choice(pools)
+        out.append(chr(rng.randrange(lo, hi)))
+    if rng.random() < 0.3:
+        out.append('\ufffd' * rng.randrange(1, 5))
+    return ''.join(out)
+
+
+def check_score_parity():
+    """两种后端 (numpy / 正则) 都必须与逐字符实现结果完全一致"""
+    rng = random.Random(0)
+    samples = [random_text(rng.randrange(0, 300), rng) for _ in range(500)]
+    samples += ['', '\n\r\t', '\x00\x1f\x7f', '\u4dff\u4e00\u9fff\ua000', 'a' * 10]
+    backends = [False, True] if char_core._HAS_NUMPY else [False]
+    saved = char_core._HAS_NUMPY
+    try:
+        for use_numpy in backends:
+            char_core._HAS_NUMPY = use_numpy
+            for text in samples:
+                assert printable_and_chinese_score(text) == reference_score(text), repr(text)
+    finally:
+        char_core._HAS_NUMPY = saved
+    print(f"评分一致性: {len(samples)} 个样本 x {len(backends)} 种后端 通过")
+
+
+def bench_score(text):
+    t_ref, r_ref = timed(reference_score, text)
+    t_new, r_new = timed(printable_and_chinese_score, text)
+    assert r_ref == r_new
+    backend = "numpy" if char_core._HAS_NUMPY else "正则"
+    print(f"评分 {len(text)} 字符: 逐字符 {t_ref:.3f} s, 向量化({backend}) {t_new:.3f} s, "
+          f"加速 {t_ref / t_new:.1f}x")
+
+
+def timed(func, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - t0, result
+
+
+def main():
+    check_score_parity()  # 结果不一致时不必再跑耗时的基准
+    if sys.argv[1:] == ["--check"]:
+        return
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    encoding = sys.argv[2] if len(sys.argv) > 2 else "gbk"
+    fd, path = tempfile.mkstemp(suffix=".log")
+    os.close(fd)
+    try:
+        make_file(path, size_mb, encoding)
+        t_full, (text_full, enc_full, det_full) = timed(read_as_text, path, score_sample=None)
+        t_sample, (text_sample, enc_sample, det_sample) = timed(read_as_text, path)
+        print(f"文件: {size_mb} MB, 实际编码 {encoding}")
+        print(f"整个文件评分: {t_full:8.2f} s  -> {enc_full} (检测: {det_full})")
+        print(f"采样评分:     {t_sample:8.2f} s  -> {enc_sample} (检测: {det_sample})")
+        print(f"加速: {t_full / t_sample:.1f}x")
+        assert enc_full == enc_sample, "两种方式选出的编码不一致"
+        assert text_full == text_sample
+        bench_score(text_sample[:20 * 1024 * 1024])
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Char Viewer 命令行工具 (不依赖 PyQt5，适合批量处理)
+编码检测规则与界面 (read_as_text / detect_file_encoding) 完全相同
+用法:
+  python char_cli.py detect FILE [FILE ...] [-e ENCODING] [--cache] [-j JOBS]
+  python char_cli.py transcode FILE [FILE ...] (-o OUTDIR | --in-place) [-t utf-8] [-e ENCODING] [--cache] [-j JOBS]
+      -o: 输出文件保留相对于所有输入文件公共上级目录的路径 (a/x.log 与 b/x.log 不会互相覆盖)
+每个文件输出一行报告 (制表符分隔)：检测器结果 / 最终选用的编码 / 处理结果
+转码按块流式进行，内存占用与文件大小无关
+"""
+import argparse
+import codecs
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # 共用的 viewer/cli_common.py
+from char_core import EncodingCache, detect_file_encoding, stream_codec, transcode_file
+from cli_common import run_files
+
+_cache = None  # 每个进程一个；只记在内存里，由主进程合并保存
+
+
+def _worker_cache(use_cache):
+    global _cache
+    if not use_cache:
+        return None
+    if _cache is None:
+        _cache = EncodingCache(autosave=False)
+    return _cache
+
+
+def _updates(cache):
+    return cache.take_updates() if cache is not None else []
+
+
+def detect_one(path, force_encoding=None, use_cache=False):
+    """返回 (path, size, detected, used, error, cache_updates)"""
+    cache = _worker_cache(use_cache)
+    try:
+        size = os.path.getsize(path)
+        used, detected = detect_file_encoding(path, force_encoding, cache=cache)
+    except OSError as e:
+        return path, None, None, None, str(e), _updates(cache)
+    return path, size, detected, used, None, _updates(cache)
+
+
+def cmd_detect(args, out):
+    out.write("path\tsize\tdetected\tused\n")
+    rc = 0
+    updates = []
+    for path, size, detected, used, err, upd in run_files(detect_one, args.files, args.jobs,
+                                                     args.encoding, args.cache):
+        updates.extend(upd)
+        if err:
+            sys.stderr.write(f"{path}: {err}\n")
+            rc = 1
+            continue
+        out.write(f"{path}\t{size}\t{detected or '-'}\t{used}\n")
+    _save_cache(args, updates)
+    return rc
+
+
+def _same_encoding(a, b):
+    return codecs.lookup(a).name == codecs.lookup(b).name
+
+
+def output_base(files):
+    """-o 输出时保留的相对路径的起点：所有输入文件所在目录的公共上级目录"""
+    return os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in files])
+
+
+def transcode_one(path, out_dir=None, base=None, target="utf-8", force_encoding=None, use_cache=False):
+    """
+    检测后转码一个文件；out_dir 为 None 表示原地改写，否则写到 out_dir 下相对 base 的同一路径
+    返回 (path, detected, used, bytes_in, bytes_out, replaced, status, cache_updates)
+    status: "ok" / "skip"（原地改写且已经是目标编码）/ 错误信息
+    """
+    cache = _worker_cache(use_cache)
+    try:
+        used, detected = detect_file_encoding(path, force_encoding, cache=cache)
+        if out_dir is None:
+            with open(path, "rb") as f:
+                _, bom_len = stream_codec(used, f.read(4))
+            if bom_len == 0 and _same_encoding(used, target):
+                size = os.path.getsize(path)
+                return path, detected, used, size, size, 0, "skip", _updates(cache)
+            dst = path
+        else:
+            dst = os.path.join(out_dir, os.path.relpath(os.path.abspath(path), base))
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+        bytes_in, bytes_out, replaced = transcode_file(path, dst, used, target)
+    except (OSError, LookupError, ValueError) as e:
+        return path, None, None, 0, 0, 0, str(e), _updates(cache)
+    return path, detected, used, bytes_in, bytes_out, replaced, "ok", _updates(cache)
+
+
+def cmd_transcode(args, out):
+    try:
+        codecs.lookup(args.to)
+    except LookupError:
+        sys.stderr.write(f"未知的目标编码: {args.to}\n")
+        return 2
+    # 同一个文件给了多次时只处理一次（否则会同时写同一个输出文件）
+    files, seen = [], set()
+    for path in args.files:
+        key = os.path.normcase(os.path.abspath(path))
+        if key not in seen:
+            seen.add(key)
+            files.append(path)
+    rc = 0
+    if len(files) < len(args.files):
+        sys.stderr.write(f"忽略了 {len(args.files) - len(files)} 个重复的输入文件\n")
+        rc = 1
+    base = None
+    if args.out_dir:
+        try:
+            base = output_base(files)
+        except ValueError:  # Windows 上输入文件在不同的盘
+            sys.stderr.write("输入文件没有公共上级目录，无法保留相对路径\n")
+            return 2
+        os.makedirs(args.out_dir, exist_ok=True)
+    out.write("path\tdetected\tused\tto\tbytes_in\tbytes_out\treplaced\tstatus\n")
+    updates = []
+    for path, detected, used, n_in, n_out, replaced, status, upd in run_files(
+            transcode_one, files, args.jobs, args.out_dir, base, args.to, args.encoding, args.cache):
+        updates.extend(upd)
+        if status not in ("ok", "skip"):
+            sys.stderr.write(f"{path}: {status}\n")
+            rc = 1
+            status = "error"
+        out.write(f"{path}\t{detected or '-'}\t{used or '-'}\t{args.to}\t{n_in}\t{n_out}\t{replaced}\t{status}\n")
+    _save_cache(args, updates)
+    return rc
+
+
+def _save_cache(args, updates):
+    if args.cache and updates:
+        EncodingCache().merge(updates)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="文本文件编码检测 / 转码 (无界面，规则与 Char Viewer 相同)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def common(p):
+        p.add_argument("files", nargs="+")
+        p.add_argument("-e", "--encoding", default=None, help="不检测，直接按该编码读取")
+        p.add_argument("--cache", action="store_true", help="读写检测结果缓存 (与界面共用)")
+        p.add_argument("-j", "--jobs", type=int, default=1, help="并行进程数")
+
+    p = sub.add_parser("detect", help="输出 path / 大小 / 检测器结果 / 最终选用的编码")
+    common(p)
+    p.set_defaults(func=cmd_detect)
+
+    p = sub.add_parser("transcode", help="检测后流式转码 (默认转成 UTF-8)")
+    common(p)
+    p.add_argument("-t", "--to", default="utf-8", help="目标编码")
+    dest = p.add_mutually_exclusive_group(required=True)
+    dest.add_argument("-o", "--out-dir", help="输出目录 (保留相对于输入文件公共上级目录的路径)")
+    dest.add_argument("--in-place", action="store_true", help="原地改写 (已是目标编码的文件跳过)")
+    p.set_defaults(func=cmd_transcode)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args, sys.stdout)
+    except BrokenPipeError:  # eg: | head
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
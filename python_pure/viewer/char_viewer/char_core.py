@@ -0,0 +1,945 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Char Viewer 核心 (不依赖 Qt)
+- 编码检测（BOM / UTF-8 / 检测器 + 中文友好评分，只对头 / 中 / 尾采样评分）与检测结果缓存
+- 流式转码（内存占用与文件大小无关）
+- 稀疏行索引、跟随读取（增量解码）、行过滤、按块查找
+char_viewer.py (界面) 与 char_cli.py (命令行) 共用本模块
+"""
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+import codecs
+import hashlib
+import json
+import mmap
+import re
+import shutil
+import sys
+import os
+import threading
+
+# optional detectors
+try:
+    from charset_normalizer import from_bytes as cn_from_bytes
+    _HAS_CHARSET_NORMALIZER = True
+except Exception:
+    _HAS_CHARSET_NORMALIZER = False
+
+try:
+    import chardet
+    _HAS_CHARDET = True
+except Exception:
+    _HAS_CHARDET = False
+
+# optional: numpy 向量化评分
+try:
+    import numpy as np
+    _HAS_NUMPY = True
+except Exception:
+    _HAS_NUMPY = False
+
+
+def detect_encoding_bytes(b):
+    """尝试用 charset-normalizer 或 chardet 检测编码，返回 (encoding, confidence)"""
+    if _HAS_CHARSET_NORMALIZER:
+        try:
+            results = cn_from_bytes(b)
+            if results:
+                best = results.best()
+                if best:
+                    enc = best.encoding
+                    conf = getattr(best, "confidence", 0.9)
+                    return enc, conf
+        except Exception:
+            pass
+    if _HAS_CHARDET:
+        try:
+            r = chardet.detect(b)
+            enc = r.get("encoding")
+            conf = r.get("confidence", 0)
+            if enc:
+                return enc, conf
+        except Exception:
+            pass
+    return None, 0.0
+
+
+_CONTROL_RUN_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]+')
+_HAN_RUN_RE = re.compile('[\u4e00-\u9fff]+')
+
+
+def count_control_and_han(text):
+    """
+    统计 (控制字符数(不含换行 / 回车 / 制表符), 常用汉字数)
+    有 numpy 时把文本编码为 UTF-32 后对码点数组做向量化比较；
+    否则用正则按连续片段匹配再累加长度（都在 C 层完成，不逐字符走 Python 循环）
+    """
+    if _HAS_NUMPY:
+        cps = np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype='<u4')
+        low = cps[cps < 32]
+        control = low.size - int(np.count_nonzero((low == 9) | (low == 10) | (low == 13)))
+        han = int(np.count_nonzero((cps >= 0x4e00) & (cps <= 0x9fff)))
+        return control, han
+    control = sum(map(len, _CONTROL_RUN_RE.findall(text)))
+    han = 0 if text.isascii() else sum(map(len, _HAN_RUN_RE.findall(text)))
+    return control, han
+
+
+def printable_and_chinese_score(text):
+    """
+    计算简单启发式评分：
+    - printable_ratio: 非替代字符、非控制字符的比例
+    - chinese_ratio: 常用汉字比例
+    - score = printable_ratio + 0.5 * chinese_ratio
+    """
+    if not text:
+        return 0.0, 0.0, 0.0
+    length = len(text)
+    replace_char = '\ufffd'
+    replace_count = text.count(replace_char)
+    control_count, han_count = count_control_and_han(text)
+    printable_count = length - replace_count - control_count
+    printable_ratio = printable_count / length
+    chinese_ratio = han_count / length
+    score = printable_ratio + 0.5 * chinese_ratio
+    return score, printable_ratio, chinese_ratio
+
+
+SCORE_SAMPLE_SIZE = 64 * 1024  # 编码评分时头 / 中 / 尾各取的字节数
+_BOUNDARY_SCAN = 4096  # 中间 / 尾部采样在开头这么多字节内找换行作为字符边界
+
+_BOMS = (
+    (b'\xef\xbb\xbf', 'utf-8-sig'),
+    (b'\xff\xfe\x00\x00', 'utf-32'),
+    (b'\x00\x00\xfe\xff', 'utf-32'),
+    (b'\xff\xfe', 'utf-16'),
+    (b'\xfe\xff', 'utf-16'),
+)
+
+
+def _code_unit(enc):
+    """UTF-16/32 的码元字节数，其它编码按 1 处理"""
+    e = enc.lower().replace('_', '-')
+    if e.startswith('utf-16'):
+        return 2
+    if e.startswith('utf-32'):
+        return 4
+    return 1
+
+
+def read_samples(f, size, score_sample=SCORE_SAMPLE_SIZE):
+    """
+    分层采样：返回 [(chunk, is_head, is_tail)]
+    文件不超过 3 个采样段时（或 score_sample 为 None）直接返回整个文件
+    采样起点按 4 字节对齐，保证 UTF-16/32 不会落在码元中间
+    """
+    f.seek(0)
+    if score_sample is None or size <= 3 * score_sample:
+        return [(f.read(), True, True)]
+    samples = []
+    for off in (0, (size // 2 - score_sample // 2) & ~3, (size - score_sample) & ~3):
+        f.seek(off)
+        chunk = f.read(score_sample)
+        samples.append((chunk, off == 0, off + len(chunk) >= size))
+    return samples
+
+
+def _skip_partial_char(chunk, enc, final):
+    """
+    采样段开头附近没有换行（长行 / 整个文件没有换行）时找一个字符起点：
+      - UTF-8：跳过开头的后续字节 (0x80-0xBF)
+      - 其它编码：依次丢掉开头 0-3 个字节，取第一个能严格解码的位置；都不行时原样返回
+    """
+    if codecs.lookup(enc).name in ('utf-8', 'utf-8-sig'):
+        i = 0
+        while i < min(len(chunk), 3) and 0x80 <= chunk[i] <= 0xBF:
+            i += 1
+        return chunk[i:]
+    for skip in range(4):
+        try:
+            codecs.getincrementaldecoder(enc)().decode(chunk[skip:], final=final)
+            return chunk[skip:]
+        except UnicodeDecodeError:
+            continue
+    return chunk
+
+
+def decode_sample(chunk, enc, is_head, is_tail, errors='replace'):
+    """
+    在字符边界上安全地解码一个采样段：
+      - 非文件开头的段，从第一个换行之后开始（GBK/Big5/Shift_JIS/UTF-8 的后续字节都不会是 0x0A）；
+        开头 _BOUNDARY_SCAN 字节内没有换行时按编码跳过不完整的第一个字符 (_skip_partial_char)
+      - 非文件结尾的段，用增量解码器 final=False，末尾不完整的多字节字符留在解码器里不输出
+    """
+    if not is_head and _code_unit(enc) == 1:
+        nl = chunk.find(b'\n', 0, _BOUNDARY_SCAN)
+        if nl != -1:
+            chunk = chunk[nl + 1:]
+        else:
+            chunk = _skip_partial_char(chunk, enc, is_tail)
+    if enc.lower().replace('_', '-') in ('utf-16', 'utf-32'):
+        # 增量解码器要求 BOM；bytes.decode 在没有 BOM 时按本机字节序，这里保持一致
+        enc = f"{enc}-{'le' if sys.byteorder == 'little' else 'be'}"
+    dec = codecs.getincrementaldecoder(enc)(errors=errors)
+    return dec.decode(chunk, final=is_tail)
+
+
+# ----------------- 编码检测结果缓存 -----------------
+ENCODING_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "char_viewer", "encodings.json")
+ENCODING_CACHE_SIZE = 1000  # 最多记住的文件数（LRU）
+
+
+class EncodingCache:
+    """
+    (绝对路径, 大小, 修改时间, 文件头哈希) -> (used_encoding, detected_encoding) 的持久化 LRU 缓存
+    文件内容变化（大小 / mtime / 文件头任一不同）即视为不同的键；读写缓存文件失败时当作没有缓存
+    autosave=False 时 put 只记在内存里（多进程并行检测时由主进程 merge 后统一保存，避免互相覆盖）
+    """
+
+    def __init__(self, path=ENCODING_CACHE_PATH, max_entries=ENCODING_CACHE_SIZE, autosave=True):
+        self.path = path
+        self.max_entries = max_entries
+        self.autosave = autosave
+        self._entries = None  # 第一次使用时才读文件
+        self._updates = []
+        self._lock = threading.Lock()  # 检测在线程池里进行，可能同时读写
+
+    @staticmethod
+    def key(path, size, mtime_ns, head):
+        digest = hashlib.blake2b(head, digest_size=16).hexdigest()
+        return f"{os.path.abspath(path)}|{size}|{mtime_ns}|{digest}"
+
+    def _load(self):
+        if self._entries is None:
+            self._entries = OrderedDict()
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    for k, v in json.load(f):
+                        self._entries[k] = tuple(v)
+            except (OSError, ValueError, TypeError):
+                pass
+        return self._entries
+
+    def get(self, key):
+        with self._lock:
+            entries = self._load()
+            value = entries.get(key)
+            if value is not None:
+                entries.move_to_end(key)
+            return value
+
+    def put(self, key, used, detected):
+        with self._lock:
+            entries = self._load()
+            self._put(entries, key, (used, detected))
+            if self.autosave:
+                self.save()
+            else:
+                self._updates.append((key, (used, detected)))
+
+    def _put(self, entries, key, value):
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def take_updates(self):
+        """取出（并清空）autosave=False 时新增的条目"""
+        with self._lock:
+            updates, self._updates = self._updates, []
+            return updates
+
+    def merge(self, updates):
+        """并入其它进程 take_updates() 的结果并保存一次"""
+        with self._lock:
+            entries = self._load()
+            for key, value in updates:
+                self._put(entries, key, tuple(value))
+            self.save()
+
+    def save(self):
+        """先写临时文件再替换，多个窗口同时写也不会留下半个文件"""
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(list(self._entries.items()), f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+
+def detect_file_encoding(path, force_encoding=None, sample_size=4096, score_sample=SCORE_SAMPLE_SIZE,
+                         cache=None):
+    """
+    只读取头 / 中 / 尾三个采样段来选择编码（不解码整个文件）
+    返回： (used_encoding, detected_encoding_or_none)
+    规则与 read_as_text 的说明一致；score_sample=None 时对整个文件评分（旧行为，用于基准对比）
+    cache: EncodingCache，自动检测时先查缓存，未命中则检测后写入
+    """
+    if cache is None or (force_encoding and force_encoding != "自动检测"):
+        return _detect_file_encoding(path, force_encoding, sample_size, score_sample)
+    with open(path, "rb") as f:
+        st = os.fstat(f.fileno())
+        head = f.read(max(sample_size, 4))
+    key = cache.key(path, st.st_size, st.st_mtime_ns, head)
+    hit = cache.get(key)
+    if hit is not None:
+        return hit
+    used, detected = _detect_file_encoding(path, None, sample_size, score_sample)
+    cache.put(key, used, detected)
+    return used, detected
+
+
+def _detect_file_encoding(path, force_encoding, sample_size, score_sample):
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        f.seek(0)
+        head = f.read(max(sample_size, 4))
+        if not head:
+            return 'utf-8', None
+
+        # 只在确实有 BOM 的情况下直接使用对应 Unicode 编码：
+        for bom, enc in _BOMS:
+            if head.startswith(bom):
+                return enc, enc
+
+        # 如果用户手动指定编码（下拉框），直接使用（解码时 errors='replace' 保证不会抛）
+        if force_encoding and force_encoding != "自动检测":
+            try:
+                codecs.lookup(force_encoding)
+                return force_encoding, None
+            except LookupError:
+                return 'utf-8', None
+
+        samples = read_samples(f, size, score_sample)
+
+    # 尝试常见的 UTF-8 先行（每个采样段都能严格解码才认为是 UTF-8）
+    try:
+        for chunk, is_head, is_tail in samples:
+            decode_sample(chunk, 'utf-8', is_head, is_tail, errors='strict')
+        return 'utf-8', 'utf-8'
+    except UnicodeDecodeError:
+        pass
+
+    # 自动检测（可得 None）
+    detected_enc, conf = detect_encoding_bytes(head[:sample_size])
+
+    # 构造候选编码列表：优先中文友好编码，再把检测到的以及其它常见编码补上
+    preferred = ['utf-8', 'utf-8-sig', 'gbk', 'gb18030', 'cp936']
+    others = ['big5', 'shift_jis', 'cp949', 'utf-16', 'utf-16-le', 'utf-16-be', 'latin1', 'iso-8859-1']
+    candidates = []
+    for p in preferred:
+        if p not in candidates:
+            candidates.append(p)
+    if detected_enc and detected_enc not in candidates:
+        candidates.append(detected_enc)
+    for o in others:
+        if o not in candidates:
+            candidates.append(o)
+
+    # 对候选做评分（只解码采样段），选最高分。并对中文编码进行适当加权；对 cp949 有偏好修正
+    best_score = -1.0
+    best_enc = None
+    scores = {}
+    for enc in candidates:
+        if not enc:
+            continue
+        try:
+            txt = '\n'.join(decode_sample(chunk, enc, is_head, is_tail)
+                            for chunk, is_head, is_tail in samples)
+        except Exception:
+            continue
+        sc, pr, hr = printable_and_chinese_score(txt)
+        # 对中文相关编码在出现汉字时加权
+        if enc.lower() in ('gbk', 'cp936', 'gb18030') and hr > 0.01:
+            sc += 0.2 + hr
+        # 如果检测器给出的是 cp949，则对 GBK 类候选稍微加分（避免把中文误判为韩文）
+        if detected_enc and detected_enc.lower() == 'cp949' and enc.lower() in ('gbk', 'cp936', 'gb18030'):
+            sc += 0.5 * hr
+        scores[enc] = (sc, pr, hr)
+        if sc > best_score:
+            best_score = sc
+            best_enc = enc
+
+    # 额外判断：如果检测器认为是 utf-16，但 GBK 的评分明显优于 utf-16（且 GBK 汉字比例较高），则改用 GBK
+    if detected_enc and detected_enc.lower().startswith('utf-16'):
+        utf16_score = scores.get(detected_enc, (-1, 0, 0))[0]
+        gbk_score, gbk_pr, gbk_hr = scores.get('gbk', (-1, 0, 0))
+        if gbk_score is not None and gbk_score > utf16_score and gbk_hr > 0.15 and gbk_pr > 0.6:
+            return 'gbk', detected_enc
+
+    # 如果 best_enc 是 None，回退到 utf-8 replace
+    if best_enc is None:
+        return 'utf-8', detected_enc
+
+    # 如果检测出的编码（detected_enc）与最终使用编码不同，并且 detected_enc 是 cp949 → 如果我们选择了 gbk，需要标记修正
+    return best_enc, detected_enc
+
+
+def read_as_text(path, force_encoding=None, sample_size=4096, score_sample=SCORE_SAMPLE_SIZE):
+    """
+    可靠地读取文件并选出合理编码
+    返回： (text, used_encoding, detected_encoding_or_none)
+    逻辑要点：
+      - 先用字节判断 BOM（只有有 BOM 时才直接用 UTF-16/32）
+      - 如果用户手动强制编码则直接按手动的
+      - 优先尝试 UTF-8 / UTF-8-SIG
+      - 使用检测器获得 detected_enc（可无）
+      - 构造候选编码集合（优先中文友好编码），对每个解码结果评分并选择最佳；
+      - 额外规则：如果检测为 cp949 或 utf-16，但 GBK 解码结果可读性与汉字比例明显更好，则自动改用 GBK（并把 detected 编码返回为 orig）
+    评分只针对头 / 中 / 尾三个采样段（见 detect_file_encoding），只有最终选中的编码才解码整个文件
+    """
+    used_enc, detected_enc = detect_file_encoding(path, force_encoding, sample_size, score_sample)
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data:
+        return "", "utf-8", None
+    return data.decode(used_enc, errors='replace'), used_enc, detected_enc
+
+
+# ----------------- 转码 -----------------
+TRANSCODE_CHUNK_SIZE = 1024 * 1024
+
+
+def transcode_file(src, dst, encoding, target='utf-8', chunk_size=TRANSCODE_CHUNK_SIZE):
+    """
+    按 encoding 流式解码 src，再按 target 编码写到 dst（每次只处理 chunk_size 字节）
+    先写到 dst 同目录的临时文件再替换，因此 src 与 dst 可以是同一个文件
+    返回 (bytes_in, bytes_out, replaced)：replaced 为解码结果里替换字符 U+FFFD 的个数
+    """
+    tmp = f"{dst}.{os.getpid()}.tmp"
+    bytes_in = bytes_out = replaced = 0
+    try:
+        with open(src, 'rb') as fin, open(tmp, 'wb') as fout:
+            codec, bom_len = stream_codec(encoding, fin.read(4))
+            fin.seek(bom_len)
+            bytes_in = bom_len
+            decoder = codecs.getincrementaldecoder(codec)(errors='replace')
+            encoder = codecs.getincrementalencoder(target)(errors='replace')
+            while True:
+                chunk = fin.read(chunk_size)
+                final = not chunk
+                text = decoder.decode(chunk, final=final)
+                replaced += text.count('\ufffd')
+                data = encoder.encode(text, final=final)
+                fout.write(data)
+                bytes_in += len(chunk)
+                bytes_out += len(data)
+                if final:
+                    break
+        try:
+            shutil.copymode(src, tmp)
+        except OSError:
+            pass
+        os.replace(tmp, dst)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return bytes_in, bytes_out, replaced
+
+
+# ----------------- 行索引（大文件按需显示） -----------------
+LINE_INDEX_STRIDE = 64  # 每隔多少行记录一个检查点（稀疏索引，10 GB 日志也只占几十 MB）
+INDEX_CHUNK_SIZE = 4 * 1024 * 1024  # 建索引时每次扫描的字节数（4 的倍数，保证 UTF-16/32 码元对齐）
+MAX_WINDOW_BYTES = 4 * 1024 * 1024  # 一屏最多解码的字节数（超长行截断显示）
+LINE_READ_BLOCK = 64 * 1024  # 定位行时每次读取的字节数（4 的倍数，UTF-16/32 的换行不会跨块）
+
+
+def stream_codec(encoding, head):
+    """
+    按窗口解码时使用的编解码器与 BOM 长度：
+    utf-8-sig / utf-16 / utf-32 在文件中间解码时不能再依赖 BOM，换成带字节序的具体编码
+    返回 (codec, bom_len)
+    """
+    e = encoding.lower().replace('_', '-')
+    if e == 'utf-8-sig':
+        return 'utf-8', 3 if head.startswith(b'\xef\xbb\xbf') else 0
+    native = 'le' if sys.byteorder == 'little' else 'be'
+    if e == 'utf-32':
+        if head.startswith(b'\xff\xfe\x00\x00'):
+            return 'utf-32-le', 4
+        if head.startswith(b'\x00\x00\xfe\xff'):
+            return 'utf-32-be', 4
+        return f'utf-32-{native}', 0
+    if e == 'utf-16':
+        if head.startswith(b'\xff\xfe'):
+            return 'utf-16-le', 2
+        if head.startswith(b'\xfe\xff'):
+            return 'utf-16-be', 2
+        return f'utf-16-{native}', 0
+    return encoding, 0
+
+
+class LineIndex:
+    """
+    稀疏行索引
+      checkpoints[k] : 第 k * LINE_INDEX_STRIDE 行的起始字节偏移 (array('Q'))
+      newlines       : 已扫描区域内的换行数
+      scanned        : 已扫描到的字节偏移
+    scan() 在后台线程里用自己的文件对象按块读取；界面线程用另一个文件对象只读取可见行。
+    界面只读取 newlines 之前已经确定的检查点，二者不会相互干扰。
+    不长期保留 mmap：文件被外部截断 (copytruncate 轮转) 后访问映射会触发 SIGBUS 直接杀掉进程，
+    普通读取只会读到较少的数据；界面发现文件变短 (shrunk()) 时重建索引。
+    """
+
+    def __init__(self, path, encoding):
+        self.path = path
+        self.encoding = encoding
+        self._file = open(path, 'rb')
+        head = self._file.read(4)
+        self.codec, self.base = stream_codec(encoding, head)
+        self.newline = '\n'.encode(self.codec)
+        self.unit = len(self.newline)
+        self.checkpoints = array('Q', [self.base])
+        self.newlines = 0
+        self.scanned = self.base
+        self.last_line_start = self.base
+        self.size = os.fstat(self._file.fileno()).st_size
+
+    # ---- 文件大小（界面线程） ----
+    def update_size(self):
+        """文件变长后记下新的大小；返回新的文件大小"""
+        self.size = os.fstat(self._file.fileno()).st_size
+        return self.size
+
+    def shrunk(self):
+        """文件比记下的大小短了（被截断）：索引已经失效，需要重建"""
+        return os.fstat(self._file.fileno()).st_size < self.size
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    # ---- 建索引（后台线程） ----
+    def _newline_positions(self, chunk):
+        """chunk 内所有（码元对齐的）换行的相对偏移"""
+        if _HAS_NUMPY:
+            if self.unit == 1:
+                arr = np.frombuffer(chunk, dtype=np.uint8)
+            else:
+                n = len(chunk) // self.unit
+                dtype = ('<' if self.codec.endswith('le') else '>') + ('u2' if self.unit == 2 else 'u4')
+                arr = np.frombuffer(chunk, dtype=dtype, count=n)
+            return (np.flatnonzero(arr == 10) * self.unit).tolist()
+        out = []
+        i = chunk.find(self.newline)
+        while i != -1:
+            if i % self.unit == 0:
+                out.append(i)
+                i = chunk.find(self.newline, i + self.unit)
+            else:
+                i = chunk.find(self.newline, i + 1)
+        return out
+
+    def scan(self, progress=None, cancelled=None):
+        """从 scanned 扫描到文件当前末尾，更新检查点；progress(line_count, scanned)"""
+        with open(self.path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size <= self.scanned:
+                return
+            pos = self.scanned
+            end = size - (size - self.base) % self.unit
+            f.seek(pos)
+            while pos < end:
+                if cancelled and cancelled():
+                    return
+                chunk = f.read(min(INDEX_CHUNK_SIZE, end - pos))
+                if not chunk:
+                    return  # 扫描期间文件被截断；界面发现文件变短后会重建索引
+                stride = LINE_INDEX_STRIDE
+                for rel in self._newline_positions(chunk):
+                    self.newlines += 1
+                    self.last_line_start = pos + rel + self.unit
+                    if self.newlines % stride == 0:
+                        self.checkpoints.append(self.last_line_start)
+                pos += len(chunk)
+                self.scanned = pos
+                if progress:
+                    progress(self.line_count(), pos)
+
+    def line_count(self):
+        """完整行数，加上末尾尚未以换行结束的一行"""
+        return self.newlines + (1 if self.scanned > self.last_line_start else 0)
+
+    # ---- 读取（界面线程） ----
+    def _read(self, pos, n):
+        self._file.seek(pos)
+        return self._file.read(n)
+
+    def _skip_lines(self, pos, n, limit):
+        """从 pos 开始最多跳过 n 个（完整落在 limit 之前的）换行，返回 (之后的位置, 跳过的行数)"""
+        skipped = 0
+        while skipped < n and pos < limit:
+            block = self._read(pos, min(LINE_READ_BLOCK, limit - pos))
+            if not block:
+                break  # 文件变短了
+            i = 0
+            while skipped < n:
+                j = block.find(self.newline, i)
+                if j == -1:
+                    i = len(block)
+                    break
+                if (pos + j - self.base) % self.unit:
+                    i = j + 1
+                    continue
+                i = j + self.unit
+                skipped += 1
+            pos += i
+        return pos, skipped
+
+    def line_offset(self, line):
+        """第 line 行（从 0 开始）的起始字节偏移"""
+        line = max(0, min(line, self.newlines))
+        ck = min(line // LINE_INDEX_STRIDE, len(self.checkpoints) - 1)
+        pos = self.checkpoints[ck]
+        return self._skip_lines(pos, line - ck * LINE_INDEX_STRIDE, self.scanned)[0]
+
+    def line_of_offset(self, offset):
+        """字节偏移所在的行号"""
+        ck = max(bisect_right(self.checkpoints, offset) - 1, 0)
+        pos = self.checkpoints[ck]
+        return ck * LINE_INDEX_STRIDE + self._skip_lines(pos, max(offset - pos, 0), offset)[1]
+
+    def read_lines(self, first, count):
+        """解码 [first, first+count) 行；超长时最多解码 MAX_WINDOW_BYTES 字节；文件变短时返回空串"""
+        if self._file is None or count <= 0 or first >= self.line_count() or self.shrunk():
+            return ''
+        limit = min(self.scanned, self.size)
+        start = self.line_offset(first)
+        end, _ = self._skip_lines(start, count, min(limit, start + MAX_WINDOW_BYTES))
+        data = self._read(start, end - start)
+        if data.endswith(self.newline):
+            data = data[:-self.unit]
+        return data.decode(self.codec, errors='replace')
+
+
+# ----------------- 跟随（tail -f） -----------------
+TAIL_READ_CHUNK = 64 * 1024  # 每次 read 的字节数
+TAIL_MAX_READ = 4 * 1024 * 1024  # 一次刷新最多读取的字节数，剩下的留给下一轮，避免卡住界面
+TAIL_SEED_BYTES = 256 * 1024  # 开启跟随时先显示文件末尾这么多字节内的完整行
+TAIL_MAX_LINES = 10000  # 控制台最多保留的行数（环形缓冲）
+
+
+class TailReader:
+    """
+    保持文件打开，从上次读到的位置继续读新增内容。
+    使用增量解码器：被切在两次读取之间的多字节字符（GBK / UTF-8 / UTF-16）会留到下一次一起解码
+    """
+
+    def __init__(self, path, encoding):
+        self.path = path
+        self.encoding = encoding
+        self._file = open(path, 'rb')
+        self._reset()
+
+    def _reset(self):
+        """从文件头开始（新建或文件被截断后）"""
+        self._file.seek(0)
+        head = self._file.read(4)
+        self.codec, self.base = stream_codec(self.encoding, head)
+        self.unit = len('\n'.encode(self.codec))
+        self.decoder = codecs.getincrementaldecoder(self.codec)(errors='replace')
+        self.seek(self.base)
+
+    def seek(self, pos):
+        pos = max(pos, self.base)
+        self.pos = pos - (pos - self.base) % self.unit
+        self._file.seek(self.pos)
+        self.decoder.reset()
+
+    def size(self):
+        return os.fstat(self._file.fileno()).st_size
+
+    def rotated(self):
+        """路径已经指向另一个文件（按 st_dev / st_ino 判断，例如日志改名轮转后新建了同名文件）"""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return False  # 改名后新文件还没建出来：继续读旧文件
+        own = os.fstat(self._file.fileno())
+        return (st.st_dev, st.st_ino) != (own.st_dev, own.st_ino)
+
+    def seed(self, max_bytes=TAIL_SEED_BYTES):
+        """类似 tail -n：返回文件末尾 max_bytes 内的完整行，之后从读到的位置继续"""
+        start = max(self.size() - max_bytes, self.base)
+        self.seek(start)
+        text, _, _ = self.read(max_bytes)
+        if start > self.base:
+            # 起点落在某一行中间：丢掉这半行
+            nl = text.find('\n')
+            text = text[nl + 1:] if nl != -1 else ''
+        return text
+
+    def read(self, max_bytes=TAIL_MAX_READ):
+        """
+        读取新增内容（最多 max_bytes 字节）
+        返回 (text, truncated, more)：truncated 表示文件变短后已从头重新开始，more 表示还有没读完的数据
+        """
+        size = self.size()
+        truncated = size < self.pos
+        if truncated:
+            self._reset()
+        parts = []
+        remaining = min(size - self.pos, max_bytes)
+        while remaining > 0:
+            chunk = self._file.read(min(TAIL_READ_CHUNK, remaining))
+            if not chunk:
+                break
+            self.pos += len(chunk)
+            remaining -= len(chunk)
+            parts.append(self.decoder.decode(chunk))
+        return ''.join(parts), truncated, self.pos < size
+
+    def seek_last_line(self):
+        """跳到最后一行（还没有以换行结束的部分）的开头并返回该偏移：它之前都是完整的行"""
+        newline = '\n'.encode(self.codec)
+        size = self.size()
+        pos = size - (size - self.base) % self.unit
+        while pos > self.base:
+            start = max(self.base, pos - TAIL_READ_CHUNK)
+            start -= (start - self.base) % self.unit
+            self._file.seek(start)
+            buf = self._file.read(pos - start)
+            i = buf.rfind(newline)
+            while i != -1 and (start + i - self.base) % self.unit:
+                i = buf.rfind(newline, 0, i + self.unit - 1)
+            if i != -1:
+                self.seek(start + i + self.unit)
+                return self.pos
+            pos = start
+        self.seek(self.base)
+        return self.pos
+
+    def close(self):
+        self._file.close()
+
+
+# ----------------- 行过滤 -----------------
+FILTER_BLOCK_SIZE = 1024 * 1024  # 回填时每次往前读的字节数
+
+
+class LineFilter:
+    """include / exclude 正则：能找到 include（为空时不限制）且找不到 exclude 的行才显示"""
+
+    def __init__(self, include='', exclude=''):
+        self.include_pattern = include
+        self.include = re.compile(include) if include else None
+        self.exclude = re.compile(exclude) if exclude else None
+
+    def match(self, line):
+        if self.include is not None and not self.include.search(line):
+            return False
+        return self.exclude is None or not self.exclude.search(line)
+
+    def filter_lines(self, lines):
+        return [line for line in lines if self.match(line)]
+
+    def feed(self, partial, text):
+        """
+        过滤跟随时新读到的一段文本：partial 是上次留下的不完整的最后一行
+        返回 (符合条件的完整行拼成的文本, 这次留下的不完整的最后一行)
+        """
+        lines = (partial + text).split('\n')
+        partial = lines.pop()
+        return ''.join(line + '\n' for line in self.filter_lines(lines)), partial
+
+
+def filter_tail_lines(path, encoding, end, line_filter, max_lines=TAIL_MAX_LINES, cancelled=None):
+    """
+    从 end（必须是行首）往前逐块读取，返回它之前最后 max_lines 个符合过滤条件的行（按文件顺序）
+    凑够行数就停，不会解码整个文件；cancelled() 返回 True 时返回 None
+    有 include 且编码允许时先在原始字节上找候选行（同 build_matcher），只解码候选行
+    """
+    found = []
+    count = 0
+    with open(path, 'rb') as f:
+        end = min(end, os.fstat(f.fileno()).st_size)
+        if end == 0:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            codec, base = stream_codec(encoding, mm[:4])
+            newline = '\n'.encode(codec)
+            unit = len(newline)
+            finder = None
+            if line_filter.include is not None:
+                mode, finder, _ = build_matcher(line_filter.include_pattern, codec, regex=True)
+                if mode != 'bytes':
+                    finder = None
+            block = FILTER_BLOCK_SIZE
+            while end > base and count < max_lines:
+                if cancelled and cancelled():
+                    return None
+                start = max(base, end - block)
+                start -= (start - base) % unit
+                if start > base:
+                    nxt = _next_line_start(mm, start, newline, unit, base)
+                    if nxt == -1 or nxt >= end:
+                        block *= 2  # 一行比块还长：扩大再试
+                        continue
+                    start = nxt
+                buf = mm[start:end]
+                if finder is None:
+                    lines = buf.decode(codec, errors='replace').split('\n')
+                    if lines and lines[-1] == '':
+                        lines.pop()
+                    kept = line_filter.filter_lines(lines)
+                else:
+                    kept = []
+                    i = finder(buf, 0)
+                    while i != -1:
+                        ls = buf.rfind(newline, 0, i) + 1
+                        le = buf.find(newline, i)
+                        if le == -1:
+                            le = len(buf)
+                        line = buf[ls:le].decode(codec, errors='replace')
+                        if line_filter.match(line):
+                            kept.append(line)
+                        i = finder(buf, le + 1) if le + 1 < len(buf) else -1
+                found.append(kept)
+                count += len(kept)
+                end = start
+                block = FILTER_BLOCK_SIZE
+    lines = [line for kept in reversed(found) for line in kept]
+    return lines[-max_lines:]
+
+
+# ----------------- 查找 -----------------
+SEARCH_CHUNK_SIZE = 8 * 1024 * 1024  # 每次扫描的字节数（会延长到下一行开头，匹配不会跨块）
+SEARCH_PREVIEW_CHARS = 200  # 结果列表里每行最多显示的字符数
+# 这些编码的双字节字符里第二个字节可能落在 ASCII 范围，字节匹配后需要按解码后的行再确认一次
+_MULTIBYTE_LEGACY = ('gb', 'cp936', 'big5', 'shift', 'sjis', 'cp932', 'cp949', 'euc', 'cp950', 'johab')
+
+
+def _ascii_compatible(codec):
+    try:
+        return '\n azAZ09'.encode(codec) == b'\n azAZ09'
+    except LookupError:
+        return False
+
+
+# 正则里这些写法在字节正则和 str 正则上含义不同（非 ASCII 字符算几个“字符”、是不是 \w 等）
+_BYTES_UNSAFE_ESCAPES = 'wWsSbBdDuUN'
+_REGEX_TOKEN_RE = re.compile(r'\\(.)|[.\[]', re.DOTALL)
+
+
+def _bytes_regex_safe(query):
+    """ASCII 正则里没有 .、字符类 [...] 和 \\w \\s \\b \\d 等转义时，字节正则与 str 正则的匹配结果相同"""
+    if not query.isascii():
+        return False
+    for m in _REGEX_TOKEN_RE.finditer(query):
+        if m.group(1) is None or m.group(1) in _BYTES_UNSAFE_ESCAPES:
+            return False
+    return True
+
+
+def _next_line_start(buf, pos, newline, unit, base=0):
+    """pos 之后第一个（码元对齐的）换行的下一位置；没有则返回 -1"""
+    while True:
+        i = buf.find(newline, pos)
+        if i == -1:
+            return -1
+        if (i - base) % unit == 0:
+            return i + unit
+        pos = i + 1
+
+
+def build_matcher(query, codec, regex=False, ignore_case=False):
+    """
+    返回 (mode, finder, verify)
+      mode   : 'bytes' 直接在原始字节上查找（单字节兼容 ASCII 的编码）；'text' 先解码整块再查找
+      finder : finder(buf, start) -> 匹配开始位置或 -1
+      verify : 字节匹配后对解码后的行再确认（GBK 等双字节编码可能误匹配），不需要时为 None
+    查询非法（例如正则写错）时抛 re.error / UnicodeEncodeError
+    """
+    flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)  # ^ / $ 按行匹配
+    text_rx = re.compile(query if regex else re.escape(query), flags)
+    legacy = codec.lower().replace('_', '').startswith(_MULTIBYTE_LEGACY)
+    # 字节正则与 str 正则在非 ASCII 字符上语义不同（.、\w、字符类等），只有不含这些写法的正则走字节路径
+    use_bytes = _ascii_compatible(codec) and not ignore_case and (not regex or _bytes_regex_safe(query))
+    if not use_bytes:
+        def find_text(buf, start):
+            m = text_rx.search(buf, start)
+            return m.start() if m else -1
+        return 'text', find_text, None
+
+    if regex:
+        bytes_rx = re.compile(query.encode('ascii'), re.MULTILINE)
+
+        def find_bytes(buf, start):
+            m = bytes_rx.search(buf, start)
+            return m.start() if m else -1
+        verify_rx = re.compile(query, re.ASCII | re.MULTILINE)
+    else:
+        needle = query.encode(codec)
+
+        def find_bytes(buf, start):
+            return buf.find(needle, start)
+        verify_rx = text_rx
+    verify = (lambda line: verify_rx.search(line) is not None) if legacy else None
+    return 'bytes', find_bytes, verify
+
+
+def search_file(path, encoding, query, regex=False, ignore_case=False,
+                progress=None, cancelled=None, chunk_size=SEARCH_CHUNK_SIZE):
+    """
+    在文件中查找，每个匹配行产出一次 (行号, 预览)；行号与 LineIndex 一致（从 0 开始）
+    progress(pos, size) 在每块扫描完后调用；cancelled() 返回 True 时提前结束
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0 or not query:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            codec, base = stream_codec(encoding, mm[:4])
+            mode, finder, verify = build_matcher(query, codec, regex, ignore_case)
+            newline = '\n'.encode(codec)
+            unit = len(newline)
+            end_limit = size - (size - base) % unit
+            pos = base
+            line = 0
+            while pos < end_limit:
+                if cancelled and cancelled():
+                    return
+                end = min(pos + chunk_size, end_limit)
+                if end < end_limit:
+                    nxt = _next_line_start(mm, end - (end - base) % unit, newline, unit, base)
+                    end = end_limit if nxt == -1 else nxt
+                buf = mm[pos:end]
+                if mode == 'text':
+                    buf = buf.decode(codec, errors='replace')
+                    nl, nl_len = '\n', 1
+                else:
+                    nl, nl_len = newline, unit
+                counted = 0
+                start = 0
+                while True:
+                    i = finder(buf, start)
+                    if i == -1:
+                        break
+                    ls = buf.rfind(nl, 0, i) + 1 if i else 0
+                    le = buf.find(nl, i)
+                    if le == -1:
+                        le = len(buf)
+                    line += buf.count(nl, counted, ls)
+                    counted = ls
+                    text = buf[ls:le]
+                    if mode == 'bytes':
+                        text = text.decode(codec, errors='replace')
+                        if verify is not None and not verify(text):
+                            start = i + 1
+                            continue
+                    yield line, text.rstrip('\r')[:SEARCH_PREVIEW_CHARS]
+                    start = le + nl_len
+                    if start > len(buf):
+                        break
+                line += buf.count(nl, counted)
+                pos = end
+                if progress:
+                    progress(pos, size)
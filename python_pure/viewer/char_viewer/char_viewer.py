@@ -1,197 +1,806 @@
 # char_viewer.py
+"""
+通用字符浏览器
+- 自动检测编码（BOM / UTF-8 / 检测器 + 中文友好评分），可手动指定；
+  检测结果按 (路径, 大小, 修改时间, 文件头哈希) 缓存在 ~/.cache/char_viewer，重复打开时跳过检测
+- 大文件按需显示：后台线程按块读取建立稀疏行索引，界面只读取并解码当前可见的几十行；
+  文件被外部截断（copytruncate 轮转）后滚动时重建索引
+- 跟随模式（tail -f）：保持文件句柄打开，增量解码器处理跨块的多字节字符，
+  新内容合并后一次追加到限制最大行数的控制台（环形缓冲）
+  由 QFileSystemWatcher 事件驱动（不可用时退回可调间隔的轮询），识别改名轮转并打开新文件
+- 查找（Ctrl+F）：后台线程按块扫描原始字节，匹配行号流式列出，双击跳转
+- 跟随时按包含 / 排除正则过滤行：已有内容在后台从末尾往前回填，新内容逐行增量过滤
+- 多标签：一个进程打开多个文件（命令行可给多个路径），检测编码 / 跟随读取用全局线程池，
+  建索引 / 查找 / 回填过滤这类长时间扫描放在单独的有限线程池里，不会让其它标签页的跟随等着；
+  后台标签页不刷新界面，只缓存新内容，查找结果按标签页分别保存
+"""
+import re
 import sys
 import os
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QFileDialog, QPlainTextEdit,
-    QComboBox, QVBoxLayout, QWidget, QHBoxLayout, QPushButton, QLabel
+    QComboBox, QVBoxLayout, QWidget, QHBoxLayout, QPushButton, QLabel, QScrollBar,
+    QStackedWidget, QSpinBox, QDockWidget, QLineEdit, QCheckBox, QListWidget, QListWidgetItem,
+    QShortcut, QTabWidget
 )
-from PyQt5.QtGui import QTextCursor
-from PyQt5.QtCore import QTimer
-
-# optional detectors
-try:
-    from charset_normalizer import from_bytes as cn_from_bytes
-    _HAS_CHARSET_NORMALIZER = True
-except Exception:
-    _HAS_CHARSET_NORMALIZER = False
-
-try:
-    import chardet
-    _HAS_CHARDET = True
-except Exception:
-    _HAS_CHARDET = False
-
-
-def detect_encoding_bytes(b):
-    """尝试用 charset-normalizer 或 chardet 检测编码，返回 (encoding, confidence)"""
-    if _HAS_CHARSET_NORMALIZER:
+from PyQt5.QtGui import QFontMetrics, QKeySequence, QTextCursor
+from PyQt5.QtCore import (
+    Qt, QEvent, QFileSystemWatcher, QObject, QRunnable, QThread, QThreadPool, QTimer, pyqtSignal
+)
+
+from char_core import (
+    TAIL_MAX_LINES, EncodingCache, LineFilter, LineIndex, TailReader,
+    detect_file_encoding, filter_tail_lines, search_file,
+)
+
+FOLLOW_DEBOUNCE_MS = 50  # 文件监视事件合并：连续写入时最多每 50 ms 处理一次
+FOLLOW_FALLBACK_POLL_MS = 1000  # 文件监视不可用时的轮询间隔
+SEARCH_MAX_LIST = 10000  # 结果列表最多列出的行数（之后只计数）
+SEARCH_BATCH = 500  # 每攒够这么多结果向界面发一次
+# 建索引 / 查找 / 回填过滤最多同时占用的线程数；全局线程池留给检测编码和跟随读取这类短任务
+SCAN_THREADS = max(1, QThread.idealThreadCount() // 2)
+
+
+# ----------------- GUI 部分 -----------------
+encoding_cache = EncodingCache()
+
+
+class TaskSignals(QObject):
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal()
+    result = pyqtSignal(object)
+
+
+class IndexTask(QRunnable):
+    """在线程池里扩展行索引；界面通过 signals 得到进度"""
+
+    def __init__(self, index):
+        super().__init__()
+        self.index = index
+        self.signals = TaskSignals()
+        self.cancelled = False
+
+    def run(self):
         try:
-            results = cn_from_bytes(b)
-            if results:
-                best = results.best()
-                if best:
-                    enc = best.encoding
-                    conf = getattr(best, "confidence", 0.9)
-                    return enc, conf
-        except Exception:
-            pass
-    if _HAS_CHARDET:
+            self.index.scan(progress=self.signals.progress.emit, cancelled=lambda: self.cancelled)
+        finally:
+            self.signals.finished.emit()
+
+
+class DetectTask(QRunnable):
+    """在线程池里检测编码（同时打开很多文件时不阻塞界面）；结果为 (used, detected) 或异常"""
+
+    def __init__(self, path, force_encoding):
+        super().__init__()
+        self.path = path
+        self.force_encoding = force_encoding
+        self.signals = TaskSignals()
+
+    def run(self):
         try:
-            r = chardet.detect(b)
-            enc = r.get("encoding")
-            conf = r.get("confidence", 0)
-            if enc:
-                return enc, conf
-        except Exception:
-            pass
-    return None, 0.0
+            result = detect_file_encoding(self.path, self.force_encoding, cache=encoding_cache)
+        except Exception as e:
+            result = e
+        self.signals.result.emit(result)
 
 
-def printable_and_chinese_score(text):
+class TailTask(QRunnable):
     """
-    计算简单启发式评分：
-    - printable_ratio: 非替代字符、非控制字符的比例
-    - chinese_ratio: 常用汉字比例
-    - score = printable_ratio + 0.5 * chinese_ratio
+    在线程池里读取一轮新增内容，有过滤时顺便过滤（只把符合条件的完整行交给界面）
+    结果为 (text, truncated, more, partial) 或异常；partial 是留到下一轮的不完整的最后一行
     """
-    if not text:
-        return 0.0, 0.0, 0.0
-    length = len(text)
-    replace_char = '\ufffd'
-    replace_count = text.count(replace_char)
-    control_count = sum(1 for ch in text if ord(ch) < 32 and ch not in '\n\r\t')
-    printable_count = length - replace_count - control_count
-    printable_ratio = printable_count / length
-    han_count = sum(1 for ch in text if '\u4e00' <= ch <= '\u9fff')
-    chinese_ratio = han_count / length
-    score = printable_ratio + 0.5 * chinese_ratio
-    return score, printable_ratio, chinese_ratio
-
-
-def read_as_text(path, force_encoding=None, sample_size=4096):
+
+    def __init__(self, tail, line_filter=None, partial=''):
+        super().__init__()
+        self.tail = tail
+        self.line_filter = line_filter
+        self.partial = partial
+        self.signals = TaskSignals()
+
+    def run(self):
+        try:
+            text, truncated, more = self.tail.read()
+            partial = '' if truncated else self.partial
+            if self.line_filter is not None and text:
+                text, partial = self.line_filter.feed(partial, text)
+            result = (text, truncated, more, partial)
+        except Exception as e:
+            result = e
+        self.signals.result.emit(result)
+
+
+class FilterTask(QRunnable):
+    """在线程池里回填过滤视图：从跟随起点往前找最后 TAIL_MAX_LINES 个符合条件的行"""
+
+    def __init__(self, path, encoding, end, line_filter):
+        super().__init__()
+        self.args = (path, encoding, end, line_filter)
+        self.signals = TaskSignals()
+        self.cancelled = False
+
+    def run(self):
+        try:
+            result = filter_tail_lines(*self.args, cancelled=lambda: self.cancelled)
+        except Exception as e:
+            result = e
+        self.signals.result.emit(result)
+
+
+class SearchSignals(QObject):
+    hits = pyqtSignal(list)
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(int)
+
+
+class SearchTask(QRunnable):
+    """在线程池里查找；匹配行成批发给界面，列表满了之后只计数"""
+
+    def __init__(self, path, encoding, query, regex, ignore_case):
+        super().__init__()
+        self.args = (path, encoding, query, regex, ignore_case)
+        self.signals = SearchSignals()
+        self.cancelled = False
+
+    def run(self):
+        count = 0
+        batch = []
+
+        def progress(pos, size):
+            if batch:
+                self.signals.hits.emit(batch[:])
+                batch.clear()
+            self.signals.progress.emit(int(pos * 100 / size), count)
+
+        try:
+            for hit in search_file(*self.args, progress=progress, cancelled=lambda: self.cancelled):
+                count += 1
+                if count <= SEARCH_MAX_LIST:
+                    batch.append(hit)
+                    if len(batch) >= SEARCH_BATCH:
+                        self.signals.hits.emit(batch[:])
+                        batch.clear()
+            if batch:
+                self.signals.hits.emit(batch)
+        finally:
+            self.signals.finished.emit(count)
+
+
+class PagedTextView(QWidget):
     """
-    可靠地读取文件并选出合理编码
-    返回： (text, used_encoding, detected_encoding_or_none)
-    逻辑要点：
-      - 先用字节判断 BOM（只有有 BOM 时才直接用 UTF-16/32）
-      - 如果用户手动强制编码则直接按手动的
-      - 优先尝试 UTF-8 / UTF-8-SIG
-      - 使用检测器获得 detected_enc（可无）
-      - 构造候选编码集合（优先中文友好编码），对每个解码结果评分并选择最佳；
-      - 额外规则：如果检测为 cp949 或 utf-16，但 GBK 解码结果可读性与汉字比例明显更好，则自动改用 GBK（并把 detected 编码返回为 orig）
+    只显示可见行的文本视图：QPlainTextEdit 里只放当前一屏的文字，
+    右侧滚动条以“行”为单位覆盖整个文件
     """
-    with open(path, "rb") as f:
-        data = f.read()
+    stale = pyqtSignal()  # 文件被截断，索引已失效（由 FileTab 重建）
 
-    if not data:
-        return "", "utf-8", None
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.index = None
+        self.top_line = 0
+        self.shown_top = None  # 当前文档第一行对应的文件行号（用于翻页时保持光标所在行）
 
-    b = data
+        self.text = QPlainTextEdit()
+        self.text.setReadOnly(True)
+        self.text.setLineWrapMode(QPlainTextEdit.NoWrap)
+        self.text.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.text.installEventFilter(self)
+        self.text.viewport().installEventFilter(self)
 
-    # 只在确实有 BOM 的情况下直接使用对应 Unicode 编码：
-    if b.startswith(b'\xef\xbb\xbf'):
-        return b.decode('utf-8-sig'), 'utf-8-sig', 'utf-8-sig'
-    if b.startswith(b'\xff\xfe\x00\x00') or b.startswith(b'\x00\x00\xfe\xff'):
-        try:
-            return b.decode('utf-32'), 'utf-32', 'utf-32'
-        except Exception:
-            pass
-    if b.startswith(b'\xff\xfe') or b.startswith(b'\xfe\xff'):
+        self.scrollbar = QScrollBar(Qt.Vertical)
+        self.scrollbar.valueChanged.connect(self.on_scroll)
+
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.setSpacing(0)
+        layout.addWidget(self.text)
+        layout.addWidget(self.scrollbar)
+
+    def set_index(self, index):
+        self.index = index
+        self.top_line = 0
+        self.shown_top = None
+        self.scrollbar.blockSignals(True)
+        self.scrollbar.setValue(0)
+        self.scrollbar.blockSignals(False)
+        self.refresh()
+
+    def show_message(self, text):
+        self.index = None
+        self.scrollbar.setRange(0, 0)
+        self.text.setPlainText(text)
+
+    def visible_lines(self):
+        line_h = max(QFontMetrics(self.text.font()).lineSpacing(), 1)
+        return max(self.text.viewport().height() // line_h, 1)
+
+    def line_count(self):
+        return self.index.line_count() if self.index else 0
+
+    def max_top(self):
+        return max(self.line_count() - self.visible_lines(), 0)
+
+    def update_range(self):
+        """索引增长后更新滚动条范围；当前屏未填满时顺便重绘"""
+        self._sync_scrollbar()
+        if self.text.blockCount() < self.visible_lines() + 1:
+            self.refresh()
+
+    def refresh(self):
+        if self.index is None:
+            return
+        if self.index.shrunk():
+            self.stale.emit()
+            return
+        self.top_line = min(self.top_line, self.max_top())
+        self._sync_scrollbar()
+        text = self.index.read_lines(self.top_line, self.visible_lines() + 1)
+        marks = self._cursor_marks()
+        h = self.text.horizontalScrollBar().value()
+        self.text.setPlainText(text)
+        self.shown_top = self.top_line
+        self._restore_cursor(marks)
+        self.text.horizontalScrollBar().setValue(h)
+
+    def _cursor_marks(self):
+        """光标（含选区两端）在文件中的 (行号, 列)"""
+        if self.shown_top is None:
+            return None
+        cursor = self.text.textCursor()
+        doc = self.text.document()
+        marks = []
+        for pos in (cursor.anchor(), cursor.position()):
+            block = doc.findBlock(pos)
+            marks.append((self.shown_top + block.blockNumber(), pos - block.position()))
+        return marks
+
+    def _restore_cursor(self, marks):
+        """重绘后把光标放回原来的文件行；已滚出当前屏时不处理"""
+        if not marks:
+            return
+        doc = self.text.document()
+        cursor = QTextCursor(doc)
+        for mode, (line, col) in zip((QTextCursor.MoveAnchor, QTextCursor.KeepAnchor), marks):
+            block = doc.findBlockByNumber(line - self.top_line)
+            if line < self.top_line or not block.isValid():
+                return
+            cursor.setPosition(block.position() + min(col, block.length() - 1), mode)
+        self.text.setTextCursor(cursor)
+
+    def _sync_scrollbar(self):
+        self.scrollbar.blockSignals(True)
+        self.scrollbar.setRange(0, self.max_top())
+        self.scrollbar.setPageStep(self.visible_lines())
+        self.scrollbar.setValue(self.top_line)
+        self.scrollbar.blockSignals(False)
+
+    def on_scroll(self, value):
+        if value != self.top_line:
+            self.top_line = value
+            self.refresh()
+
+    def scroll_to_line(self, line, center=True):
+        if center:
+            line -= self.visible_lines() // 2
+        self.top_line = max(0, min(line, self.max_top()))
+        self.refresh()
+
+    def show_line(self, line):
+        """把第 line 行滚到屏幕中间并选中"""
+        self.scroll_to_line(line)
+        block = self.text.document().findBlockByNumber(line - self.top_line)
+        if block.isValid():
+            cursor = QTextCursor(block)
+            cursor.movePosition(QTextCursor.EndOfBlock, QTextCursor.KeepAnchor)
+            self.text.setTextCursor(cursor)
+
+    def at_end(self):
+        return self.top_line >= self.max_top()
+
+    def goto_end(self):
+        self.top_line = self.max_top()
+        self.refresh()
+
+    def scroll_by(self, lines):
+        self.scrollbar.setValue(max(0, min(self.top_line + lines, self.max_top())))
+
+    def eventFilter(self, obj, event):
+        if self.index is not None:
+            if event.type() == QEvent.Wheel and obj is self.text.viewport():
+                steps = event.angleDelta().y() // 120
+                self.scroll_by(-steps * 3)
+                return True
+            if event.type() == QEvent.KeyPress and obj is self.text:
+                key = event.key()
+                vis = self.visible_lines()
+                if key == Qt.Key_PageDown:
+                    self.scroll_by(vis)
+                    return True
+                if key == Qt.Key_PageUp:
+                    self.scroll_by(-vis)
+                    return True
+                if key == Qt.Key_Home and event.modifiers() & Qt.ControlModifier:
+                    self.scroll_by(-self.line_count())
+                    return True
+                if key == Qt.Key_End and event.modifiers() & Qt.ControlModifier:
+                    self.goto_end()
+                    return True
+                # 只读文本框里上下键本来就是滚动：直接按行滚动整个文件
+                if key == Qt.Key_Down:
+                    self.scroll_by(1)
+                    return True
+                if key == Qt.Key_Up:
+                    self.scroll_by(-1)
+                    return True
+        return super().eventFilter(obj, event)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.refresh()
+
+class FollowHub(QObject):
+    """
+    所有标签页共用的跟随调度：一个 QFileSystemWatcher、一个合并事件的定时器和一个轮询定时器
+    标签页开启跟随时 add()，关闭时 remove()；文件有变化时调用对应标签页的 check_update()
+    """
+    message = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.tabs = []
+        self.polled = []
+        self.interval = 0  # 0 = 文件监视，其它值 = 轮询间隔 (ms)
+        self.dirty = set()
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self.on_watch_event)
+        self.watcher.directoryChanged.connect(self.on_watch_event)
+        self.debounce = QTimer(self)
+        self.debounce.setSingleShot(True)
+        self.debounce.setInterval(FOLLOW_DEBOUNCE_MS)
+        self.debounce.timeout.connect(self.flush)
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.poll)
+
+    def add(self, tab):
+        if tab not in self.tabs:
+            self.tabs.append(tab)
+        self.rewatch()
+
+    def remove(self, tab):
+        if tab in self.tabs:
+            self.tabs.remove(tab)
+            self.dirty.discard(tab)
+            self.rewatch()
+
+    def set_interval(self, interval):
+        self.interval = interval
+        self.rewatch()
+
+    def rewatch(self):
+        """按当前设置重新登记监视路径；监视失败的文件改为轮询"""
+        watched = self.watcher.files() + self.watcher.directories()
+        if watched:
+            self.watcher.removePaths(watched)
+        self.timer.stop()
+        self.polled = []
+        if not self.tabs:
+            return
+        if self.interval:
+            self.polled = list(self.tabs)
+            self.timer.start(self.interval)
+            return
+        # 同时监视所在目录：文件被改名/删除后对文件的监视会失效，靠目录事件发现新文件
+        owners = {}
+        for tab in self.tabs:
+            for path in (tab.filepath, os.path.dirname(tab.filepath)):
+                owners.setdefault(path, []).append(tab)
+        failed = self.watcher.addPaths(list(owners))
+        for path in failed:
+            for tab in owners[path]:
+                if tab not in self.polled:
+                    self.polled.append(tab)
+        if self.polled:
+            self.timer.start(FOLLOW_FALLBACK_POLL_MS)
+            self.message.emit(f"{len(self.polled)} 个文件无法监视，改为每 {FOLLOW_FALLBACK_POLL_MS} ms 轮询")
+
+    def on_watch_event(self, path):
+        files = self.watcher.files()
+        for tab in self.tabs:
+            if path in (tab.filepath, os.path.dirname(tab.filepath)):
+                self.dirty.add(tab)
+                if tab.filepath not in files and os.path.exists(tab.filepath):
+                    self.watcher.addPath(tab.filepath)
+        # 不在定时器运行中重启它，持续写入时也能保证每 FOLLOW_DEBOUNCE_MS 处理一次
+        if self.dirty and not self.debounce.isActive():
+            self.debounce.start()
+
+    def flush(self):
+        tabs = [tab for tab in self.tabs if tab in self.dirty]
+        self.dirty.clear()
+        for tab in tabs:
+            tab.check_update()
+
+    def poll(self):
+        for tab in list(self.polled):
+            tab.check_update()
+
+
+def encoding_status_text(used_enc, detected_enc):
+    """状态栏显示的编码信息"""
+    if detected_enc and detected_enc.lower() == "cp949" and used_enc.lower().startswith("gb"):
+        return f"编码: {used_enc} (由 {detected_enc} 自动修正)"
+    if detected_enc and detected_enc.lower().startswith("utf-16") and used_enc.lower().startswith("gb"):
+        return f"编码: {used_enc} (由 {detected_enc} 自动修正)"
+    if detected_enc and detected_enc.lower() != used_enc.lower():
+        return f"编码: {used_enc} (检测: {detected_enc})"
+    return f"编码: {used_enc}"
+
+
+class FileTab(QWidget):
+    """
+    一个文件一个标签页：按需显示的视图 + 跟随控制台
+    不在前台时不刷新界面，跟随读到的新内容先攒起来（最多 TAIL_MAX_LINES 行），切回来时一次追加
+    """
+    changed = pyqtSignal()  # 编码 / 行数 / 跟随状态变化，主窗口据此刷新状态栏
+
+    def __init__(self, hub, scan_pool, parent=None):
+        super().__init__(parent)
+        self.hub = hub
+        self.scan_pool = scan_pool  # 长时间扫描用的线程池（所有标签页共用）
+        self.filepath = None
+        self.encoding = "utf-8"
+        self.detected_encoding = None
+        self.forced_encoding = None
+        self.status_text = "未打开文件"
+        self.lines_text = ""
+        self.last_pos = 0
+        self.follow_mode = False
+        self.active = False
+        self.index = None
+        self.index_task = None
+        self.detect_task = None
+        self.tail = None
+        self.tail_task = None
+        self.tail_again = False
+        self.pending = []
+        self.pending_lines = 0
+        self.pending_reset = False
+        self.filter_include = ''
+        self.filter_exclude = ''
+        self.line_filter = None
+        self.filter_partial = ''  # 过滤时尚未读完整的最后一行
+        self.backfill_task = None
+        self.held = []  # 回填完成前读到的新内容（必须排在回填结果之后）
+        self.search_task = None
+        self.search_hits = []  # [(行号, 预览), ...]，切回这个标签页时重新列出
+        self.search_count = 0
+        self.search_status = ""
+
+        self.view = PagedTextView()
+        self.view.stale.connect(self.rebuild_index)
+        # 跟随模式下显示的控制台：只追加，超过 TAIL_MAX_LINES 行时 Qt 自动丢掉最前面的行
+        self.console = QPlainTextEdit()
+        self.console.setReadOnly(True)
+        self.console.setLineWrapMode(QPlainTextEdit.NoWrap)
+        self.console.setMaximumBlockCount(TAIL_MAX_LINES)
+        self.stack = QStackedWidget()
+        self.stack.addWidget(self.view)
+        self.stack.addWidget(self.console)
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.stack)
+
+    def load(self, path, force_encoding=None):
+        """在线程池里检测编码，完成后建立索引（见 on_detected）"""
+        self.filepath = os.path.abspath(path)
+        self.forced_encoding = force_encoding
+        self.status_text = "检测编码..."
+        self.changed.emit()
+        task = DetectTask(self.filepath, force_encoding)
+        task.signals.result.connect(lambda result, t=task: self.on_detected(t, result))
+        self.detect_task = task
+        QThreadPool.globalInstance().start(task)
+
+    def on_detected(self, task, result):
+        if task is not self.detect_task:
+            return
+        self.detect_task = None
         try:
-            return b.decode('utf-16'), 'utf-16', 'utf-16'
-        except Exception:
-            pass
+            if isinstance(result, Exception):
+                raise result
+            used_enc, detected_enc = result
+            self.encoding = used_enc
+            self.detected_encoding = detected_enc
+            self.start_index(LineIndex(self.filepath, used_enc))
+            if self.follow_mode:
+                self.start_tail()
+            self.status_text = encoding_status_text(used_enc, detected_enc)
+        except Exception as e:
+            self.stop_index()
+            self.stop_tail()
+            self.view.show_message(f"读取文件失败: {e}")
+            self.status_text = "读取失败"
+            self.lines_text = ""
+        self.changed.emit()
+
+    def set_active(self, active):
+        """切到前台：补上后台期间攒下的内容并重绘"""
+        self.active = active
+        if not active:
+            return
+        if self.pending:
+            text = ''.join(self.pending)
+            if self.pending_reset:
+                self.console.setPlainText(text)
+                self.console.moveCursor(QTextCursor.End)
+            else:
+                self.append_tail(text)
+            self.pending.clear()
+            self.pending_lines = 0
+            self.pending_reset = False
+        if self.index is not None:
+            self.view.refresh()
+
+    def shutdown(self):
+        self.detect_task = None
+        self.hub.remove(self)
+        self.stop_index()
+        self.stop_tail()
 
-    # 如果用户手动指定编码（下拉框），直接使用（errors='replace' 保证不会抛）
-    if force_encoding and force_encoding != "自动检测":
+    # ---------- 行索引 ----------
+    def start_index(self, index):
+        """切换到新的索引并在线程池里从头扫描"""
+        self.stop_index()
+        self.index = index
+        self.last_pos = index.size
+        self.view.set_index(index)
+        self.extend_index()
+
+    def rebuild_index(self):
+        """文件被截断（例如 copytruncate 轮转）：从头重建索引"""
         try:
-            return b.decode(force_encoding, errors='replace'), force_encoding, None
-        except Exception:
-            return b.decode('utf-8', errors='replace'), 'utf-8', None
-
-    # 尝试常见的 UTF-8 先行
-    try:
-        txt = b.decode('utf-8')
-        return txt, 'utf-8', 'utf-8'
-    except Exception:
-        pass
-    try:
-        txt = b.decode('utf-8-sig')
-        return txt, 'utf-8-sig', 'utf-8-sig'
-    except Exception:
-        pass
-
-    # 自动检测（可得 None）
-    detected_enc, conf = detect_encoding_bytes(b[:sample_size])
-
-    # 构造候选编码列表：优先中文友好编码，再把检测到的以及其它常见编码补上
-    preferred = ['utf-8', 'utf-8-sig', 'gbk', 'gb18030', 'cp936']
-    others = ['big5', 'shift_jis', 'cp949', 'utf-16', 'utf-16-le', 'utf-16-be', 'latin1', 'iso-8859-1']
-    candidates = []
-    for p in preferred:
-        if p not in candidates:
-            candidates.append(p)
-    if detected_enc and detected_enc not in candidates:
-        candidates.append(detected_enc)
-    for o in others:
-        if o not in candidates:
-            candidates.append(o)
-
-    # 对候选做评分，选最高分。并对中文编码进行适当加权；对 cp949 有偏好修正
-    best_score = -1.0
-    best_enc = None
-    best_text = None
-    scores = {}
-    for enc in candidates:
-        if not enc:
-            continue
+            self.start_index(LineIndex(self.filepath, self.encoding))
+        except OSError as e:
+            self.stop_index()
+            self.view.show_message(f"读取文件失败: {e}")
+        self.changed.emit()
+
+    def stop_index(self):
+        if self.index_task is not None:
+            self.index_task.cancelled = True
+            self.index_task = None
+        if self.index is not None:
+            self.index.close()
+            self.index = None
+
+    def extend_index(self):
+        """扫描索引中尚未覆盖的部分（打开文件时是整个文件，跟随时是新增部分）"""
+        if self.index is None or self.index_task is not None:
+            return
+        task = IndexTask(self.index)
+        task.signals.progress.connect(lambda lines, pos, idx=self.index: self.on_index_progress(idx, lines))
+        task.signals.finished.connect(lambda t=task: self.on_index_finished(t))
+        self.index_task = task
+        self.scan_pool.start(task)
+
+    def on_index_progress(self, index, lines):
+        if index is not self.index:
+            return
+        self.lines_text = f"行数: {lines} (索引中...)"
+        if self.active:
+            self.view.update_range()
+            self.changed.emit()
+
+    def on_index_finished(self, task):
+        if task is not self.index_task:
+            return
+        self.index_task = None
+        self.lines_text = f"行数: {self.index.line_count()}"
+        if self.active:
+            self.view.update_range()
+            if self.follow_mode:
+                self.view.goto_end()
+        self.changed.emit()
+        # 扫描期间文件又变长了：继续
+        if self.follow_mode and self.index.scanned < self.last_pos:
+            self.extend_index()
+
+    def show_line(self, line):
+        """跳到第 line 行（退出跟随）；该行还没建立索引时返回 False"""
+        if self.index is None or line >= self.index.line_count():
+            return False
+        self.set_follow(False)
+        self.view.show_line(line)
+        self.view.text.setFocus()
+        return True
+
+    # ---------- 跟随 ----------
+    def set_follow(self, on):
+        if on == self.follow_mode:
+            return
+        self.follow_mode = on
+        if on:
+            if self.index is not None:
+                try:
+                    self.start_tail()
+                except OSError as e:
+                    print("跟随出错:", e)
+            self.stack.setCurrentWidget(self.console)
+        else:
+            self.hub.remove(self)
+            self.stop_tail()
+            self.stack.setCurrentWidget(self.view)
+            self.view.goto_end()
+        self.changed.emit()
+
+    def start_tail(self):
+        """
+        打开跟随读取器并登记到 FollowHub。没有过滤时先显示末尾若干行；
+        有过滤时从最后一行的开头跟随，之前符合条件的行由 FilterTask 在线程池里往前回填
+        """
+        self.stop_tail()
+        self.tail = TailReader(self.filepath, self.encoding)
+        if self.line_filter is None:
+            self.console.setPlainText(self.tail.seed())
+            self.console.moveCursor(QTextCursor.End)
+        else:
+            end = self.tail.seek_last_line()
+            self.console.setPlainText("过滤中...")
+            task = FilterTask(self.filepath, self.encoding, end, self.line_filter)
+            task.signals.result.connect(lambda result, t=task: self.on_backfill(t, result))
+            self.backfill_task = task
+            self.scan_pool.start(task)
+        self.hub.add(self)
+
+    def set_filter(self, include, exclude):
+        """设置跟随视图的包含 / 排除正则（都为空表示不过滤）；正则错误时抛 re.error"""
+        line_filter = LineFilter(include, exclude) if include or exclude else None
+        self.filter_include, self.filter_exclude = include, exclude
+        self.line_filter = line_filter
+        if self.follow_mode and self.index is not None:
+            self.start_tail()
+
+    def on_backfill(self, task, result):
+        if task is not self.backfill_task:
+            return
+        self.backfill_task = None
+        if isinstance(result, Exception):
+            result = [f"过滤出错: {result}"]
+        self.console.setPlainText(''.join(line + '\n' for line in result or []))
+        self.console.moveCursor(QTextCursor.End)
+        held, self.held = self.held, []
+        for text in held:
+            self.emit_tail(text)
+
+    def stop_tail(self):
+        if self.tail is not None and self.tail_task is None:
+            self.tail.close()
+        # 还有读取任务在线程池里时由 on_tail_read 关闭
+        self.tail = None
+        self.tail_task = None
+        self.tail_again = False
+        self.pending.clear()
+        self.pending_lines = 0
+        self.pending_reset = False
+        if self.backfill_task is not None:
+            self.backfill_task.cancelled = True
+            self.backfill_task = None
+        self.held.clear()
+        self.filter_partial = ''
+
+    def check_update(self):
+        """
+        tail -f 风格追加：新增内容在线程池里增量解码后追加到控制台，同时在后台扩展行索引
+        （关闭跟随后回到按需显示的视图）
+        """
+        if not self.filepath or self.index is None:
+            return
         try:
-            txt = b.decode(enc, errors='replace')
-        except Exception:
-            continue
-        sc, pr, hr = printable_and_chinese_score(txt)
-        # 对中文相关编码在出现汉字时加权
-        if enc.lower() in ('gbk', 'cp936', 'gb18030') and hr > 0.01:
-            sc += 0.2 + hr
-        # 如果检测器给出的是 cp949，则对 GBK 类候选稍微加分（避免把中文误判为韩文）
-        if detected_enc and detected_enc.lower() == 'cp949' and enc.lower() in ('gbk', 'cp936', 'gb18030'):
-            sc += 0.5 * hr
-        scores[enc] = (sc, pr, hr, txt)
-        if sc > best_score:
-            best_score = sc
-            best_enc = enc
-            best_text = txt
-
-    # 额外判断：如果检测器认为是 utf-16，但 GBK 的评分明显优于 utf-16（且 GBK 汉字比例较高），则改用 GBK
-    if detected_enc and detected_enc.lower().startswith('utf-16'):
-        utf16_score = scores.get(detected_enc, (-1, 0, 0, None))[0]
-        gbk_score, gbk_pr, gbk_hr, gbk_text = scores.get('gbk', (-1, 0, 0, None))
-        if gbk_score is not None and gbk_score > utf16_score and gbk_hr > 0.15 and gbk_pr > 0.6:
-            return gbk_text, 'gbk', detected_enc
-
-    # 如果 best_enc 是 None，回退到 utf-8 replace
-    if best_enc is None:
-        return b.decode('utf-8', errors='replace'), 'utf-8', detected_enc
-
-    # 如果检测出的编码（detected_enc）与最终使用编码不同，并且 detected_enc 是 cp949 → 如果我们选择了 gbk，需要标记修正
-    return best_text, best_enc, detected_enc
+            if self.tail is not None and self.tail_task is None and self.tail.rotated():
+                self.reopen_rotated()
+            if not os.path.exists(self.filepath):
+                return  # 改名轮转的间隙：等新文件出现
+            if self.tail is not None:
+                self.read_tail()
+            size = os.path.getsize(self.filepath)
+            # 处理文件被截断（日志轮转）：从头重建索引
+            if size < self.last_pos:
+                self.rebuild_index()
+                return
+            if size > self.last_pos:
+                self.last_pos = self.index.update_size()
+                self.extend_index()
+        except Exception as e:
+            print("刷新出错:", e)
+
+    def read_tail(self):
+        """同一个文件同时只有一个读取任务；任务进行中又有新事件时，结束后再读一轮"""
+        if self.tail_task is not None:
+            self.tail_again = True
+            return
+        task = TailTask(self.tail, self.line_filter, self.filter_partial)
+        task.signals.result.connect(lambda result, t=task: self.on_tail_read(t, result))
+        self.tail_task = task
+        QThreadPool.globalInstance().start(task)
+
+    def on_tail_read(self, task, result):
+        if task is not self.tail_task:
+            task.tail.close()
+            return
+        self.tail_task = None
+        if isinstance(result, Exception):
+            print("跟随出错:", result)
+            return
+        text, truncated, more, self.filter_partial = result
+        if truncated:
+            self.emit_tail("\n---- 文件被截断，从头开始 ----\n")
+        self.emit_tail(text)
+        if more or self.tail_again:
+            # 积压的数据分多轮读，每轮之间让界面处理事件
+            self.tail_again = False
+            self.read_tail()
+
+    def reopen_rotated(self):
+        """日志被改名轮转：先读完旧文件剩下的内容，再从头跟随新文件"""
+        text, _, _ = self.tail.read(sys.maxsize)
+        if self.line_filter is not None and text:
+            text, _ = self.line_filter.feed(self.filter_partial, text)
+        self.emit_tail(text)
+        self.filter_partial = ''
+        self.emit_tail("\n---- 文件已轮转，打开新文件 ----\n")
+        self.tail.close()
+        self.tail = TailReader(self.filepath, self.encoding)
+        self.start_index(LineIndex(self.filepath, self.encoding))
+        self.hub.rewatch()
+
+    def emit_tail(self, text):
+        """前台直接追加；后台只攒着，超过上限时只保留最后 TAIL_MAX_LINES 行"""
+        if not text:
+            return
+        if self.backfill_task is not None:
+            self.held.append(text)
+            return
+        if self.active:
+            self.append_tail(text)
+            return
+        self.pending.append(text)
+        self.pending_lines += text.count('\n')
+        if self.pending_lines > 2 * TAIL_MAX_LINES:
+            parts = ''.join(self.pending).rsplit('\n', TAIL_MAX_LINES)
+            self.pending = ['\n'.join(parts[1:])]
+            self.pending_lines = TAIL_MAX_LINES - 1
+            self.pending_reset = True
+
+    def append_tail(self, text):
+        """把一轮读到的内容一次性追加到控制台末尾"""
+        if not text:
+            return
+        bar = self.console.verticalScrollBar()
+        stick = bar.value() >= bar.maximum()
+        parts = text.rsplit('\n', TAIL_MAX_LINES)
+        if len(parts) > TAIL_MAX_LINES:
+            # 这一批本身就超过上限：直接替换，不必先插入再被丢弃
+            self.console.setPlainText('\n'.join(parts[1:]))
+        else:
+            cursor = QTextCursor(self.console.document())
+            cursor.movePosition(QTextCursor.End)
+            cursor.insertText(text)
+        if stick:
+            bar.setValue(bar.maximum())
 
 
-# ----------------- GUI 部分 -----------------
 class CharViewer(QMainWindow):
-    def __init__(self, filepath=None):
+    """多标签主窗口：每个文件一个 FileTab，共用全局线程池、长时间扫描的线程池与一个 FollowHub"""
+
+    def __init__(self, paths=()):
         super().__init__()
         self.setWindowTitle("通用字符浏览器")
         self.resize(920, 700)
+        if isinstance(paths, str):
+            paths = [paths]
 
-        self.filepath = None
-        self.last_pos = 0
-        self.follow_mode = False
-        self.encoding = "utf-8"
-        self.detected_encoding = None
-
-        self.text = QPlainTextEdit()
-        self.text.setReadOnly(True)
+        self.active_tab = None
+        self.hub = FollowHub(self)
+        self.scan_pool = QThreadPool(self)
+        self.scan_pool.setMaxThreadCount(SCAN_THREADS)
 
         layout = QVBoxLayout()
         topbar = QHBoxLayout()
@@ -200,11 +809,26 @@ class CharViewer(QMainWindow):
         self.open_btn.clicked.connect(self.open_file)
         topbar.addWidget(self.open_btn)
 
+        self.find_btn = QPushButton("查找")
+        self.find_btn.clicked.connect(self.show_search)
+        topbar.addWidget(self.find_btn)
+
         self.follow_btn = QPushButton("跟随关闭")
         self.follow_btn.clicked.connect(self.toggle_follow)
         topbar.addWidget(self.follow_btn)
 
-        # 手动编码下拉
+        # 跟随方式（所有标签页共用）：0 = 文件监视（事件驱动），其它值 = 按该间隔轮询
+        self.poll_spin = QSpinBox()
+        self.poll_spin.setRange(0, 60000)
+        self.poll_spin.setSingleStep(250)
+        self.poll_spin.setSuffix(" ms")
+        self.poll_spin.setPrefix("轮询 ")
+        self.poll_spin.setSpecialValueText("文件监视")
+        self.poll_spin.setToolTip("跟随方式：文件监视，或按指定间隔轮询（网络盘等监视不可用时）")
+        self.poll_spin.valueChanged.connect(self.hub.set_interval)
+        topbar.addWidget(self.poll_spin)
+
+        # 手动编码下拉（作用于当前标签页）
         self.enc_box = QComboBox()
         self.enc_box.addItems([
             "自动检测", "utf-8", "utf-8-sig", "gbk", "gb18030", "cp936",
@@ -213,122 +837,281 @@ class CharViewer(QMainWindow):
         self.enc_box.currentIndexChanged.connect(self.on_enc_change)
         topbar.addWidget(self.enc_box)
 
+        # 跟随视图的行过滤（作用于当前标签页，回车生效）
+        self.include_edit = QLineEdit()
+        self.include_edit.setPlaceholderText("包含（正则）")
+        self.include_edit.setToolTip("跟随时只显示匹配的行，多个条件用 | 分隔")
+        self.include_edit.editingFinished.connect(self.on_filter_change)
+        topbar.addWidget(self.include_edit)
+        self.exclude_edit = QLineEdit()
+        self.exclude_edit.setPlaceholderText("排除（正则）")
+        self.exclude_edit.setToolTip("跟随时隐藏匹配的行，多个条件用 | 分隔")
+        self.exclude_edit.editingFinished.connect(self.on_filter_change)
+        topbar.addWidget(self.exclude_edit)
+
         topbar.addStretch()
         layout.addLayout(topbar)
-        layout.addWidget(self.text)
+
+        self.tabs = QTabWidget()
+        self.tabs.setTabsClosable(True)
+        self.tabs.setMovable(True)
+        self.tabs.setDocumentMode(True)
+        self.tabs.tabCloseRequested.connect(self.close_tab)
+        self.tabs.currentChanged.connect(self.on_tab_changed)
+        layout.addWidget(self.tabs)
 
         container = QWidget()
         container.setLayout(layout)
         self.setCentralWidget(container)
 
-        # 状态栏：显示当前生效编码与修正信息
+        # 状态栏：显示当前标签页生效编码与修正信息
         self.status = self.statusBar()
         self.status_label = QLabel("未打开文件")
         self.status.addPermanentWidget(self.status_label)
+        self.lines_label = QLabel("")
+        self.status.addPermanentWidget(self.lines_label)
+        self.hub.message.connect(lambda text: self.status.showMessage(text, 5000))
+
+        self.build_search_dock()
+
+        for path in paths:
+            self.load_file(path)
 
-        # 定时器（tail -f）
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.check_update)
+    def build_search_dock(self):
+        """查找面板：输入 + 选项 + 结果列表（行号: 内容），双击跳转"""
+        panel = QWidget()
+        vbox = QVBoxLayout(panel)
+        vbox.setContentsMargins(4, 4, 4, 4)
+        row = QHBoxLayout()
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("查找内容（回车开始）")
+        self.search_edit.returnPressed.connect(self.start_search)
+        row.addWidget(self.search_edit)
+        self.search_regex = QCheckBox("正则")
+        row.addWidget(self.search_regex)
+        self.search_icase = QCheckBox("忽略大小写")
+        row.addWidget(self.search_icase)
+        self.search_btn = QPushButton("查找")
+        self.search_btn.clicked.connect(self.on_search_btn)
+        row.addWidget(self.search_btn)
+        vbox.addLayout(row)
+        self.search_label = QLabel("")
+        vbox.addWidget(self.search_label)
+        self.search_list = QListWidget()
+        self.search_list.setUniformItemSizes(True)
+        self.search_list.itemActivated.connect(self.on_search_item)
+        vbox.addWidget(self.search_list)
 
-        if filepath:
-            self.load_file(filepath)
+        self.search_dock = QDockWidget("查找", self)
+        self.search_dock.setWidget(panel)
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.search_dock)
+        self.search_dock.hide()
+        QShortcut(QKeySequence.Find, self, activated=self.show_search)
 
     def open_file(self):
-        path, _ = QFileDialog.getOpenFileName(self, "选择文件", "", "所有文件 (*)")
-        if path:
+        paths, _ = QFileDialog.getOpenFileNames(self, "选择文件", "", "所有文件 (*)")
+        for path in paths:
             self.load_file(path)
 
     def load_file(self, path):
-        self.filepath = path
-        self.setWindowTitle(f"通用字符浏览器 - {path}")
-        self.last_pos = 0
-        # 打开时默认回到“自动检测”
-        self.enc_box.blockSignals(True)
-        self.enc_box.setCurrentIndex(0)
-        self.enc_box.blockSignals(False)
-        self.reload_file()
+        """每个文件开一个标签页；已经打开的文件直接切过去"""
+        path = os.path.abspath(path)
+        for i in range(self.tabs.count()):
+            if self.tabs.widget(i).filepath == path:
+                self.tabs.setCurrentIndex(i)
+                return
+        tab = FileTab(self.hub, self.scan_pool)
+        tab.changed.connect(lambda t=tab: self.on_tab_info(t))
+        i = self.tabs.addTab(tab, os.path.basename(path))
+        self.tabs.setTabToolTip(i, path)
+        tab.load(path)
+        self.tabs.setCurrentIndex(i)
 
-    def reload_file(self, force_encoding=None):
-        if not self.filepath:
-            return
-        try:
-            text, used_enc, detected_enc = read_as_text(self.filepath, force_encoding)
-            self.text.setPlainText(text)
-            self.encoding = used_enc
-            self.detected_encoding = detected_enc
-            self.last_pos = os.path.getsize(self.filepath)
-
-            # 状态栏显示具体信息
-            if detected_enc and detected_enc.lower() == "cp949" and used_enc.lower().startswith("gb"):
-                self.status_label.setText(f"编码: {used_enc} (由 {detected_enc} 自动修正)")
-            elif detected_enc and detected_enc.lower().startswith("utf-16") and used_enc.lower().startswith("gb"):
-                self.status_label.setText(f"编码: {used_enc} (由 {detected_enc} 自动修正)")
-            elif detected_enc and detected_enc.lower() != used_enc.lower():
-                self.status_label.setText(f"编码: {used_enc} (检测: {detected_enc})")
-            else:
-                self.status_label.setText(f"编码: {used_enc}")
+    def close_tab(self, i):
+        tab = self.tabs.widget(i)
+        self.stop_search(tab)
+        if tab is self.active_tab:
+            self.active_tab = None
+        tab.shutdown()
+        self.tabs.removeTab(i)
+        tab.deleteLater()
 
-            # 如果是自动检测得到的编码，尽量在下拉框上反映出来（但不改变用户选择）
-            if force_encoding is None:
-                idx = self.enc_box.findText(used_enc)
-                if idx >= 0:
-                    self.enc_box.blockSignals(True)
-                    self.enc_box.setCurrentIndex(idx)
-                    self.enc_box.blockSignals(False)
+    def on_tab_changed(self, i):
+        """只有当前标签页刷新界面，其它标签页转入后台只攒数据"""
+        tab = self.tabs.widget(i)
+        if self.active_tab is not None and self.active_tab is not tab:
+            self.active_tab.set_active(False)
+        self.active_tab = tab
+        if tab is not None:
+            tab.set_active(True)
+        self.sync_controls()
+        self.sync_search()
 
-        except Exception as e:
-            self.text.setPlainText(f"读取文件失败: {e}")
-            self.status_label.setText("读取失败")
+    def on_tab_info(self, tab):
+        i = self.tabs.indexOf(tab)
+        if i >= 0:
+            name = os.path.basename(tab.filepath)
+            self.tabs.setTabText(i, f"▶ {name}" if tab.follow_mode else name)
+        if tab is self.tabs.currentWidget():
+            self.sync_controls()
+
+    def sync_controls(self):
+        """顶栏与状态栏显示当前标签页的状态"""
+        tab = self.tabs.currentWidget()
+        if tab is None:
+            self.setWindowTitle("通用字符浏览器")
+            self.follow_btn.setText("跟随关闭")
+            self.status_label.setText("未打开文件")
+            self.lines_label.setText("")
+            return
+        self.setWindowTitle(f"通用字符浏览器 - {tab.filepath}")
+        self.follow_btn.setText("跟随开启" if tab.follow_mode else "跟随关闭")
+        self.status_label.setText(tab.status_text)
+        self.lines_label.setText(tab.lines_text)
+        self.include_edit.setText(tab.filter_include)
+        self.exclude_edit.setText(tab.filter_exclude)
+        # 自动检测得到的编码也在下拉框上反映出来（但不改变用户选择）
+        idx = self.enc_box.findText(tab.forced_encoding or tab.encoding)
+        self.enc_box.blockSignals(True)
+        self.enc_box.setCurrentIndex(max(idx, 0))
+        self.enc_box.blockSignals(False)
 
     def on_enc_change(self, idx):
         sel = self.enc_box.currentText()
-        if not self.filepath:
+        tab = self.tabs.currentWidget()
+        if tab is None or not tab.filepath:
             return
-        if sel == "自动检测":
-            self.reload_file(None)
-        else:
-            self.reload_file(sel)
+        self.stop_search(tab, clear=True)
+        tab.load(tab.filepath, None if sel == "自动检测" else sel)
+
+    def on_filter_change(self):
+        tab = self.tabs.currentWidget()
+        include, exclude = self.include_edit.text(), self.exclude_edit.text()
+        if tab is None or (include, exclude) == (tab.filter_include, tab.filter_exclude):
+            return
+        try:
+            tab.set_filter(include, exclude)
+        except re.error as e:
+            self.status.showMessage(f"过滤正则错误: {e}", 5000)
 
     def toggle_follow(self):
-        self.follow_mode = not self.follow_mode
-        if self.follow_mode:
-            self.follow_btn.setText("跟随开启")
-            self.timer.start(1000)
+        tab = self.tabs.currentWidget()
+        if tab is not None:
+            tab.set_follow(not tab.follow_mode)
+
+    # ---------- 查找 ----------
+    def show_search(self):
+        self.search_dock.show()
+        self.search_edit.setFocus()
+        self.search_edit.selectAll()
+
+    def on_search_btn(self):
+        tab = self.tabs.currentWidget()
+        if tab is not None and tab.search_task is not None:
+            self.stop_search(tab)
         else:
-            self.follow_btn.setText("跟随关闭")
-            self.timer.stop()
+            self.start_search()
 
-    def check_update(self):
-        """tail -f 风格追加（用当前生效编码解码新增字节）"""
-        if not self.filepath:
+    def start_search(self):
+        query = self.search_edit.text()
+        tab = self.tabs.currentWidget()
+        if tab is None or tab.index is None or not query:
             return
-        try:
-            # 处理文件被截断（日志轮转）
+        self.stop_search(tab, clear=True)
+        regex = self.search_regex.isChecked()
+        if regex:
             try:
-                size = os.path.getsize(self.filepath)
-                if size < self.last_pos:
-                    self.last_pos = 0
-            except Exception:
-                pass
-
-            with open(self.filepath, "rb") as f:
-                f.seek(self.last_pos)
-                new_bytes = f.read()
-                if new_bytes:
-                    try:
-                        new_text = new_bytes.decode(self.encoding, errors="replace")
-                    except Exception:
-                        new_text = new_bytes.decode("utf-8", errors="replace")
-                    self.text.appendPlainText(new_text)
-                    self.text.moveCursor(QTextCursor.End)
-                self.last_pos = f.tell()
-        except Exception as e:
-            print("刷新出错:", e)
+                re.compile(query)
+            except re.error as e:
+                self.set_search_status(tab, f"正则错误: {e}")
+                return
+        task = SearchTask(tab.filepath, tab.encoding, query, regex, self.search_icase.isChecked())
+        task.signals.hits.connect(lambda hits, t=task, ft=tab: self.on_search_hits(ft, t, hits))
+        task.signals.progress.connect(lambda pct, count, t=task, ft=tab: self.on_search_progress(ft, t, pct, count))
+        task.signals.finished.connect(lambda count, t=task, ft=tab: self.on_search_finished(ft, t, count))
+        tab.search_task = task
+        self.search_btn.setText("停止")
+        self.set_search_status(tab, "查找中...")
+        self.scan_pool.start(task)
+
+    def stop_search(self, tab, clear=False):
+        if tab.search_task is not None:
+            tab.search_task.cancelled = True
+            tab.search_task = None
+            tab.search_status = f"已停止，{tab.search_count} 行匹配"
+        if clear:
+            tab.search_hits = []
+            tab.search_count = 0
+            tab.search_status = ""
+        if tab is self.tabs.currentWidget():
+            self.sync_search()
+
+    def sync_search(self):
+        """查找面板显示当前标签页的查找结果（各标签页的查找在后台继续，结果分别保存）"""
+        tab = self.tabs.currentWidget()
+        self.search_list.clear()
+        if tab is None:
+            self.search_btn.setText("查找")
+            self.search_label.setText("")
+            return
+        self.search_btn.setText("停止" if tab.search_task is not None else "查找")
+        self.search_label.setText(tab.search_status)
+        self.add_search_items(tab.search_hits)
+
+    def set_search_status(self, tab, text):
+        tab.search_status = text
+        if tab is self.tabs.currentWidget():
+            self.search_label.setText(text)
+
+    def add_search_items(self, hits):
+        self.search_list.setUpdatesEnabled(False)
+        for line, preview in hits:
+            item = QListWidgetItem(f"{line + 1}: {preview}")
+            item.setData(Qt.UserRole, line)
+            self.search_list.addItem(item)
+        self.search_list.setUpdatesEnabled(True)
+
+    def on_search_hits(self, tab, task, hits):
+        if task is not tab.search_task:
+            return
+        tab.search_hits.extend(hits)
+        if tab is self.tabs.currentWidget():
+            self.add_search_items(hits)
+
+    def on_search_progress(self, tab, task, pct, count):
+        if task is tab.search_task:
+            tab.search_count = count
+            self.set_search_status(tab, f"查找中 {pct}%，{count} 行匹配")
+
+    def on_search_finished(self, tab, task, count):
+        if task is not tab.search_task:
+            return
+        tab.search_task = None
+        tab.search_count = count
+        if tab is self.tabs.currentWidget():
+            self.search_btn.setText("查找")
+        more = f"（列出前 {SEARCH_MAX_LIST} 行）" if count > SEARCH_MAX_LIST else ""
+        self.set_search_status(tab, f"{count} 行匹配{more}")
+
+    def on_search_item(self, item):
+        tab = self.tabs.currentWidget()
+        if tab is None:
+            return
+        if not tab.show_line(item.data(Qt.UserRole)):
+            self.status.showMessage("该行尚未建立索引，请稍候", 3000)
+
+    def closeEvent(self, event):
+        for i in range(self.tabs.count()):
+            self.stop_search(self.tabs.widget(i))
+            self.tabs.widget(i).shutdown()
+        # 已取消的任务最多再跑完当前一块；等它们结束，避免退出时信号对象已被销毁
+        self.scan_pool.waitForDone(5000)
+        QThreadPool.globalInstance().waitForDone(5000)
+        super().closeEvent(event)
 
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
-    path = sys.argv[1] if len(sys.argv) > 1 else None
-    win = CharViewer(path)
+    win = CharViewer(sys.argv[1:])
     win.show()
     sys.exit(app.exec_())
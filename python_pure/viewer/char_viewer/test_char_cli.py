@@ -0,0 +1,31 @@
+# test_char_cli.py
+"""char_cli 的回归测试（pytest）"""
+import char_cli
+
+
+def test_transcode_keeps_relative_paths(tmp_path):
+    """a/x.log 与 b/x.log 输出到同一目录时不能互相覆盖"""
+    for name in ("a", "b"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "x.log").write_bytes(f"中文 {name}\n".encode('gbk') * 50)
+    out_dir = tmp_path / "out"
+    files = [str(tmp_path / "a" / "x.log"), str(tmp_path / "b" / "x.log")]
+    assert char_cli.main(["transcode", *files, "-o", str(out_dir)]) == 0
+    assert (out_dir / "a" / "x.log").read_text('utf-8').startswith("中文 a")
+    assert (out_dir / "b" / "x.log").read_text('utf-8').startswith("中文 b")
+
+
+def test_transcode_single_file_keeps_name(tmp_path):
+    src = tmp_path / "one.log"
+    src.write_bytes("中文\n".encode('gbk') * 50)
+    assert char_cli.main(["transcode", str(src), "-o", str(tmp_path / "out")]) == 0
+    assert (tmp_path / "out" / "one.log").read_text('utf-8').startswith("中文")
+
+
+def test_transcode_duplicate_input(tmp_path):
+    src = tmp_path / "dup.log"
+    src.write_bytes("中文\n".encode('gbk') * 50)
+    rc = char_cli.main(["transcode", str(src), str(tmp_path / ".." / tmp_path.name / "dup.log"),
+                        "-o", str(tmp_path / "out")])
+    assert rc == 1
+    assert (tmp_path / "out" / "dup.log").read_text('utf-8').startswith("中文")
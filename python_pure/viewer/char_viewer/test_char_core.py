@@ -0,0 +1,99 @@
+# test_char_core.py
+"""char_core 的回归测试（pytest）"""
+import os
+
+from char_core import LineIndex
+
+
+def write_lines(path, count, encoding='utf-8'):
+    with open(path, 'wb') as f:
+        f.write(''.join(f"第 {i} 行 line {i}\n" for i in range(count)).encode(encoding))
+
+
+def test_line_index_survives_truncation(tmp_path):
+    path = tmp_path / "app.log"
+    write_lines(path, 20000)
+    index = LineIndex(str(path), 'utf-8')
+    try:
+        index.scan()
+        assert index.line_count() == 20000
+        assert index.read_lines(15000, 3) == "第 15000 行 line 15000\n第 15001 行 line 15001\n第 15002 行 line 15002"
+        os.truncate(path, 100)  # copytruncate 轮转
+        assert index.shrunk()
+        for first in (0, 15000, 19990):  # 继续滚动：不能崩溃，索引失效时返回空
+            assert index.read_lines(first, 40) == ''
+    finally:
+        index.close()
+    index = LineIndex(str(path), 'utf-8')
+    try:
+        index.scan()
+        assert not index.shrunk()
+        assert index.read_lines(0, 2).startswith("第 0 行 line 0\n第 1 行")
+    finally:
+        index.close()
+
+
+def test_line_index_utf16(tmp_path):
+    path = tmp_path / "u16.log"
+    write_lines(path, 500, 'utf-16')
+    index = LineIndex(str(path), 'utf-16')
+    try:
+        index.scan()
+        assert index.line_count() == 500
+        assert index.read_lines(130, 2) == "第 130 行 line 130\n第 131 行 line 131"
+        assert index.line_of_offset(index.line_offset(321)) == 321
+    finally:
+        index.close()
+
+
+def test_detect_long_line_cjk(tmp_path):
+    """中间 / 尾部采样段开头附近没有换行时不能从多字节字符中间开始解码"""
+    from char_core import SCORE_SAMPLE_SIZE, detect_file_encoding
+    text = "中文日志内容，没有换行的长行。" * 20000  # 约 900 KB，超过 3 个采样段
+    for name, data in [("none", text), ("long", (text[:3000] + "\n") * 80)]:
+        path = tmp_path / f"{name}.log"
+        path.write_bytes(data.encode('utf-8'))
+        assert path.stat().st_size > 3 * SCORE_SAMPLE_SIZE
+        for shift in range(3):  # 采样起点落在一个字符的不同字节上
+            with open(path, 'ab') as f:
+                f.write(b'a' * shift)
+            assert detect_file_encoding(str(path))[0] == 'utf-8', (name, shift)
+
+
+def test_detect_long_line_gbk(tmp_path):
+    from char_core import detect_file_encoding
+    path = tmp_path / "gbk.log"
+    path.write_bytes(("中文日志内容，没有换行的长行。" * 30000).encode('gbk') + b'x')
+    assert detect_file_encoding(str(path))[0] in ('gbk', 'gb18030', 'cp936')
+
+
+def test_search_regex_non_ascii_haystack(tmp_path):
+    """ASCII 正则的 .、\\w、字符类在非 ASCII 文本上与 str 正则含义相同"""
+    from char_core import build_matcher, search_file
+    path = tmp_path / "cjk.log"
+    path.write_bytes("x\na中b\na_b\n".encode('utf-8'))
+    for query in ('a.b', r'a\wb', '[a]\\w[b]', 'a[^x]b', r'\ba\S'):
+        hits = [line for line, _ in search_file(str(path), 'utf-8', query, regex=True)]
+        icase = [line for line, _ in search_file(str(path), 'utf-8', query, regex=True, ignore_case=True)]
+        assert hits == icase == [1, 2], query
+    assert build_matcher('a.b', 'utf-8', regex=True)[0] == 'text'
+    assert build_matcher('ERROR|WARN', 'utf-8', regex=True)[0] == 'bytes'
+    assert build_matcher('a.b', 'utf-8')[0] == 'bytes'  # 普通查找按字面
+
+
+def test_backfill_matches_live_filter(tmp_path):
+    """回填 (filter_tail_lines) 与跟随时的逐段过滤 (LineFilter.feed) 选出同样的行"""
+    from char_core import LineFilter, filter_tail_lines
+    lines = [f"{i} a中b" if i % 3 == 0 else f"{i} a_b" if i % 3 == 1 else f"{i} ab" for i in range(3000)]
+    text = ''.join(line + '\n' for line in lines)
+    path = tmp_path / "f.log"
+    path.write_bytes(text.encode('utf-8'))
+    for include, exclude in (('a.b', ''), (r'a\wb', '_'), ('[中]', ''), ('ab', '^1')):
+        line_filter = LineFilter(include, exclude)
+        backfill = filter_tail_lines(str(path), 'utf-8', path.stat().st_size, line_filter)
+        live, partial = '', ''
+        for i in range(0, len(text), 777):  # 跟随时按任意位置切开的片段
+            kept, partial = line_filter.feed(partial, text[i: i + 777])
+            live += kept
+        assert partial == ''
+        assert backfill == live.splitlines() == line_filter.filter_lines(lines), include
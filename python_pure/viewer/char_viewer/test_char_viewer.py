@@ -0,0 +1,73 @@
+# test_char_viewer.py
+"""char_viewer 界面的回归测试（pytest，需要 PyQt5；无显示环境时用 offscreen）"""
+import os
+
+import pytest
+
+pytest.importorskip("PyQt5")
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtCore import QThreadPool  # noqa: E402
+from PyQt5.QtWidgets import QApplication  # noqa: E402
+
+import char_viewer  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QApplication.instance() or QApplication([])
+
+
+def wait_index(tab, app):
+    QThreadPool.globalInstance().waitForDone()
+    while tab.index is None or tab.index_task is not None:
+        app.processEvents()
+        tab.scan_pool.waitForDone(100)
+    app.processEvents()
+
+
+def test_scroll_after_truncate(app, tmp_path):
+    path = tmp_path / "app.log"
+    path.write_bytes(''.join(f"line {i}\n" for i in range(50000)).encode())
+    win = char_viewer.CharViewer([str(path)])
+    win.resize(600, 400)
+    win.show()
+    try:
+        tab = win.tabs.currentWidget()
+        wait_index(tab, app)
+        tab.view.scroll_to_line(40000)
+        assert "line 40000" in tab.view.text.toPlainText()
+        with open(path, "r+b") as f:  # copytruncate：截断后写入少量新内容
+            f.truncate(0)
+            f.write(b"fresh 0\nfresh 1\n")
+        tab.view.scroll_by(5)  # 以前在这里 SIGBUS
+        wait_index(tab, app)
+        assert tab.index.line_count() == 2
+        assert tab.view.text.toPlainText().startswith("fresh 0")
+    finally:
+        win.close()
+
+
+def test_tail_task_filters_on_worker(app, tmp_path):
+    """TailTask 在线程池里过滤，只把符合条件的完整行交给界面；不完整的最后一行留到下一轮"""
+    from char_core import LineFilter, TailReader
+    path = tmp_path / "t.log"
+    path.write_bytes(b"")
+    tail = TailReader(str(path), 'utf-8')
+    results = []
+    try:
+        with open(path, "ab") as f:
+            f.write("ok 1\nERROR a中b\nERROR x\nERROR a".encode())
+        task = char_viewer.TailTask(tail, LineFilter('ERROR a.b'))
+        task.signals.result.connect(results.append)
+        task.run()
+        text, truncated, more, partial = results[-1]
+        assert (text, truncated, partial) == ("ERROR a中b\n", False, "ERROR a")
+        with open(path, "ab") as f:
+            f.write(b"1b\nok\n")
+        task = char_viewer.TailTask(tail, LineFilter('ERROR a.b'), partial)
+        task.signals.result.connect(results.append)
+        task.run()
+        assert results[-1][0] == "ERROR a1b\n" and results[-1][3] == ""
+    finally:
+        tail.close()
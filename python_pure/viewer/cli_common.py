@@ -0,0 +1,17 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+各浏览器命令行工具 (binary_cli.py / char_cli.py) 共用的小工具 (不依赖 Qt)
+各工具把本目录加到 sys.path 后导入
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+
+def run_files(func, files, jobs, *extra):
+    """对每个文件调用 func(path, *extra)；jobs > 1 时按文件分到多个进程，结果按输入顺序产出"""
+    if jobs <= 1 or len(files) <= 1:
+        for path in files:
+            yield func(path, *extra)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        yield from pool.map(func, files, *[[x] * len(files) for x in extra], chunksize=8)
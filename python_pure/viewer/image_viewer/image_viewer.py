@@ -8,18 +8,493 @@
 
 功能：打开单张图片或文件夹，上一张/下一张，放大/缩小/适应窗口，使用键盘左右键切换。
 默认状态：适应窗口，窗口大小改变时自动重新适应。
+图片在后台线程池里用 QImageReader 解码，并预读前后几张，解码结果放在按字节数限制大小的 LRU 缓存里。
+适应窗口时直接按窗口大小解码（setScaledSize，JPEG 走 DCT 缩小解码），放大超过适应比例时才解码原图。
+拖动窗口边缘或连续缩放时先用快速缩放预览，停下来后再做一次平滑缩放；平滑缩放的结果按 (图像, 尺寸) 缓存。
+放大后的图像超过 LABEL_MAX_PIXELS 时改用分块显示（QGraphicsView）：后台生成逐级减半的金字塔，
+只绘制视口里可见的块，并按当前缩放比例选用合适的层级，任意放大倍数下内存占用都有上限。
+底部缩略图条只为可见的项生成缩略图（后台线程），缩略图按 (路径, 大小, 修改时间) 存在
+~/.cache/image_viewer/thumbnails.sqlite，再次打开同一个文件夹时直接读取。
+打开文件夹时在后台用 os.scandir 扫描（可包含子文件夹），找到的图片按自然顺序（img2 在 img10 前）
+陆续插入列表，扫描没结束就可以开始浏览。
 """
+from collections import OrderedDict
+import bisect
+import re
+import sqlite3
 import sys
 import os
+import threading
+import time
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QLabel, QScrollArea, QFileDialog,
-    QAction, QToolBar, QMessageBox
+    QAction, QToolBar, QMessageBox, QGraphicsItem, QGraphicsScene, QGraphicsView,
+    QStackedWidget, QStyleOptionGraphicsItem, QDockWidget, QListView
+)
+from PyQt5.QtGui import QImage, QImageReader, QPainter, QPixmap, QKeySequence, QTransform
+from PyQt5.QtCore import (
+    Qt, QAbstractListModel, QBuffer, QByteArray, QIODevice, QModelIndex, QObject, QRect, QRectF,
+    QRunnable, QSize, QThread, QThreadPool, QTimer, pyqtSignal
 )
-from PyQt5.QtGui import QPixmap, QKeySequence
-from PyQt5.QtCore import Qt
 
 
 IMAGE_EXTS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tiff', '.webp')
+PREFETCH_AHEAD = 2  # 预读后面几张
+PREFETCH_BEHIND = 1  # 预读前面几张
+IMAGE_CACHE_BYTES = 768 * 1024 * 1024  # 解码缓存上限（一张 4000 万像素的图约 160 MB，至少能放下预读范围）
+DECODE_THREADS = max(1, min(4, QThread.idealThreadCount()))
+RESCALE_DEBOUNCE_MS = 150  # 缩放/改变窗口大小停下来多久后做平滑缩放
+SCALED_CACHE_BYTES = 128 * 1024 * 1024  # 平滑缩放结果的缓存上限
+LABEL_MAX_PIXELS = 4096 * 4096  # 放大后超过这个像素数就改用分块显示
+TILE_SIZE = 512
+TILE_CACHE_TILES = 256  # 分块显示时缓存的块数（每块最多 1 MB）
+THUMB_SIZE = 128
+THUMB_MEMORY_ITEMS = 1000  # 内存里保留的缩略图数（每张最多 64 KB）
+THUMB_THREADS = 2
+SCAN_BATCH = 256  # 扫描时每找到这么多张（或每隔 SCAN_EMIT_INTERVAL 秒）送一批到界面
+SCAN_EMIT_INTERVAL = 0.1
+THUMB_DB_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'image_viewer', 'thumbnails.sqlite')
+
+
+_DIGITS = re.compile(r'(\d+)')
+
+
+def natural_key(rel_path):
+    """
+    自然排序键：按路径分段，每段里的数字按数值比较（img2 < img10），字母不分大小写
+    re.split 的结果总是 字符串, 数字, 字符串, ... 交替，所以同一位置上不会出现 str 和 int 比较
+    """
+    return tuple(
+        tuple(int(t) if i % 2 else t for i, t in enumerate(_DIGITS.split(part.lower())))
+        for part in rel_path.split(os.sep)
+    )
+
+
+def try_take(pool, task):
+    """
+    从线程池队列里撤掉还没开始的任务
+    任务跑完后由线程池删除，但它的完成信号可能还在事件队列里，这时包装对象已失效，当作撤不掉
+    """
+    try:
+        return pool.tryTake(task)
+    except RuntimeError:
+        return False
+
+
+class ImageCache:
+    """
+    解码后的 QImage 的 LRU 缓存，按 sizeInBytes() 累计，超过上限时淘汰最久未用的
+    键为 (path, bound)：bound 是缩小解码时的目标框 (w, h)，原图为 None；值为 (image, 原图尺寸)
+    """
+
+    def __init__(self, max_bytes=IMAGE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.total = 0
+        self._items = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key):
+        item = self._items.get(key)
+        if item is not None:
+            self._items.move_to_end(key)
+        return item
+
+    def put(self, key, image, original_size):
+        old = self._items.pop(key, None)
+        if old is not None:
+            self.total -= old[0].sizeInBytes()
+        self._items[key] = (image, original_size)
+        self.total += image.sizeInBytes()
+        # 至少保留刚放进来的这一张
+        while self.total > self.max_bytes and len(self._items) > 1:
+            _, (dropped, _) = self._items.popitem(last=False)
+            self.total -= dropped.sizeInBytes()
+
+    def clear(self):
+        self._items.clear()
+        self.total = 0
+
+
+class ScaledCache:
+    """平滑缩放后的 QPixmap 的 LRU 缓存，键为 (文件路径, 解码尺寸, 宽, 高)，来回翻看同一张图也能命中"""
+
+    def __init__(self, max_bytes=SCALED_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.total = 0
+        self._items = OrderedDict()
+
+    @staticmethod
+    def _bytes(pixmap):
+        return pixmap.width() * pixmap.height() * 4
+
+    def get(self, key):
+        pixmap = self._items.get(key)
+        if pixmap is not None:
+            self._items.move_to_end(key)
+        return pixmap
+
+    def put(self, key, pixmap):
+        old = self._items.pop(key, None)
+        if old is not None:
+            self.total -= self._bytes(old)
+        self._items[key] = pixmap
+        self.total += self._bytes(pixmap)
+        while self.total > self.max_bytes and len(self._items) > 1:
+            _, dropped = self._items.popitem(last=False)
+            self.total -= self._bytes(dropped)
+
+    def clear(self):
+        self._items.clear()
+        self.total = 0
+
+
+class DecodeSignals(QObject):
+    done = pyqtSignal(object, QImage, QSize, str)  # key, image, 原图尺寸, 错误信息
+
+
+class DecodeTask(QRunnable):
+    """
+    在线程池里用 QImageReader 解码（QImage 可以在非界面线程使用，QPixmap 不行）
+    key = (path, bound)：bound 不为 None 时直接解码成放得进 bound 的大小（只缩小不放大）
+    """
+
+    def __init__(self, key):
+        super().__init__()
+        self.key = key
+        self.signals = DecodeSignals()
+
+    def run(self):
+        path, bound = self.key
+        reader = QImageReader(path)
+        original_size = reader.size()  # 只读文件头
+        if bound is not None and original_size.isValid():
+            box = QSize(*bound)
+            if original_size.width() > box.width() or original_size.height() > box.height():
+                reader.setScaledSize(original_size.scaled(box, Qt.KeepAspectRatio))
+        image = reader.read()
+        error = reader.errorString() if image.isNull() else ''
+        if not original_size.isValid():
+            original_size = image.size()
+        self.signals.done.emit(self.key, image, original_size, error)
+
+
+class PyramidSignals(QObject):
+    done = pyqtSignal(object, object)  # 源图像的 cacheKey, [QImage, ...]
+
+
+class PyramidTask(QRunnable):
+    """从源图像开始逐级缩小一半，直到放得进一个块，返回除源图像外的各级"""
+
+    def __init__(self, key, image):
+        super().__init__()
+        self.key = key
+        self.image = image
+        self.signals = PyramidSignals()
+
+    def run(self):
+        levels = []
+        image = self.image
+        while max(image.width(), image.height()) > TILE_SIZE:
+            image = image.scaled(max(image.width() // 2, 1), max(image.height() // 2, 1),
+                                 Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+            levels.append(image)
+        self.signals.done.emit(self.key, levels)
+
+
+class TiledImageItem(QGraphicsItem):
+    """
+    分块绘制的图片，场景坐标就是原图像素坐标
+    levels 是同一张图的多个分辨率（由大到小）；绘制时选分辨率不低于屏幕需要的最小一级，
+    只把与可见区域相交的块转成 QPixmap（LRU 缓存）
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)  # exposedRect 只包含需要重绘的区域
+        self.size = QSize()
+        self.levels = []
+        self.source_key = None
+        self.tiles = OrderedDict()  # (level, tx, ty) -> QPixmap
+
+    def set_source(self, key, size, image):
+        self.prepareGeometryChange()
+        self.source_key = key
+        self.size = QSize(size)
+        self.levels = [image] if image is not None else []
+        self.tiles.clear()
+        self.update()
+
+    def add_levels(self, levels):
+        self.levels = sorted(self.levels + levels, key=lambda image: -image.width())
+        self.tiles.clear()
+        self.update()
+
+    def boundingRect(self):
+        return QRectF(0, 0, self.size.width(), self.size.height())
+
+    def pick_level(self, lod):
+        chosen = 0
+        for i, image in enumerate(self.levels):
+            if image.width() >= self.size.width() * lod:
+                chosen = i
+        return chosen
+
+    def tile(self, level, tx, ty):
+        key = (level, tx, ty)
+        pixmap = self.tiles.get(key)
+        if pixmap is None:
+            image = self.levels[level]
+            rect = QRect(tx * TILE_SIZE, ty * TILE_SIZE, TILE_SIZE, TILE_SIZE).intersected(image.rect())
+            pixmap = QPixmap.fromImage(image.copy(rect))
+            self.tiles[key] = pixmap
+            while len(self.tiles) > TILE_CACHE_TILES:
+                self.tiles.popitem(last=False)
+        else:
+            self.tiles.move_to_end(key)
+        return pixmap
+
+    def paint(self, painter, option, widget=None):
+        if not self.levels or self.size.isEmpty():
+            return
+        lod = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+        level = self.pick_level(lod)
+        image = self.levels[level]
+        sx = image.width() / self.size.width()
+        sy = image.height() / self.size.height()
+        exposed = option.exposedRect.intersected(self.boundingRect())
+        tx0 = int(exposed.left() * sx) // TILE_SIZE
+        ty0 = int(exposed.top() * sy) // TILE_SIZE
+        tx1 = min(int(exposed.right() * sx), image.width() - 1) // TILE_SIZE
+        ty1 = min(int(exposed.bottom() * sy), image.height() - 1) // TILE_SIZE
+        for ty in range(ty0, ty1 + 1):
+            for tx in range(tx0, tx1 + 1):
+                pixmap = self.tile(level, tx, ty)
+                target = QRectF(tx * TILE_SIZE / sx, ty * TILE_SIZE / sy,
+                                pixmap.width() / sx, pixmap.height() / sy)
+                painter.drawPixmap(target, pixmap, QRectF(pixmap.rect()))
+
+
+class ThumbnailStore:
+    """
+    缩略图磁盘缓存：一个 SQLite 文件，每张图一行 (path, size, mtime_ns, data)
+    大小或修改时间对不上就视为过期；每个线程用自己的连接，出错时当作没有缓存
+    """
+
+    def __init__(self, path=THUMB_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS thumbs '
+                         '(path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, data BLOB)')
+            self._local.conn = conn
+        return conn
+
+    def get(self, path, size, mtime_ns):
+        try:
+            row = self._conn().execute(
+                'SELECT size, mtime_ns, data FROM thumbs WHERE path = ?', (path,)).fetchone()
+        except (OSError, sqlite3.Error):
+            return None
+        if row is None or row[0] != size or row[1] != mtime_ns:
+            return None
+        return row[2]
+
+    def put(self, path, size, mtime_ns, data):
+        try:
+            conn = self._conn()
+            with conn:
+                conn.execute('INSERT OR REPLACE INTO thumbs VALUES (?, ?, ?, ?)',
+                             (path, size, mtime_ns, data))
+        except (OSError, sqlite3.Error):
+            pass
+
+
+class ThumbSignals(QObject):
+    done = pyqtSignal(str, QImage)  # path, 缩略图（失败时为空）
+
+
+class ThumbTask(QRunnable):
+    """先查磁盘缓存，没有再缩小解码并写回缓存（不透明的图存 JPEG，否则 PNG）"""
+
+    def __init__(self, path, store):
+        super().__init__()
+        self.path = path
+        self.store = store
+        self.signals = ThumbSignals()
+
+    def run(self):
+        image = QImage()
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            self.signals.done.emit(self.path, image)
+            return
+        data = self.store.get(self.path, st.st_size, st.st_mtime_ns)
+        if data is not None:
+            image.loadFromData(data)
+        if image.isNull():
+            reader = QImageReader(self.path)
+            size = reader.size()
+            if size.isValid() and (size.width() > THUMB_SIZE or size.height() > THUMB_SIZE):
+                reader.setScaledSize(size.scaled(THUMB_SIZE, THUMB_SIZE, Qt.KeepAspectRatio))
+            image = reader.read()
+            if not image.isNull():
+                buf = QByteArray()
+                out = QBuffer(buf)
+                out.open(QIODevice.WriteOnly)
+                image.save(out, 'PNG' if image.hasAlphaChannel() else 'JPG', 85)
+                out.close()
+                self.store.put(self.path, st.st_size, st.st_mtime_ns, bytes(buf))
+        self.signals.done.emit(self.path, image)
+
+
+class ScanSignals(QObject):
+    found = pyqtSignal(int, object)  # 扫描编号, [(排序键, path), ...]
+    finished = pyqtSignal(int, int, str)  # 扫描编号, 找到的图片数, 错误信息（打不开要扫描的文件夹时）
+
+
+class ScanTask(QRunnable):
+    """用 os.scandir 找出文件夹（可选包含子文件夹）里的图片，分批送回；不跟随目录符号链接"""
+
+    def __init__(self, scan_id, root, recursive=False):
+        super().__init__()
+        self.scan_id = scan_id
+        self.root = root
+        self.recursive = recursive
+        self.cancelled = False
+        self.signals = ScanSignals()
+
+    def run(self):
+        prefix = len(os.path.join(self.root, ''))
+        batch = []
+        count = 0
+        error = ''
+        last_emit = time.monotonic()
+        stack = [self.root]
+        while stack and not self.cancelled:
+            folder = stack.pop()
+            try:
+                with os.scandir(folder) as it:
+                    for entry in it:
+                        if self.cancelled:
+                            break
+                        if not entry.name.lower().endswith(IMAGE_EXTS):
+                            if self.recursive and entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                            continue
+                        batch.append((natural_key(entry.path[prefix:]), entry.path))
+                        count += 1
+                        if len(batch) >= SCAN_BATCH or time.monotonic() - last_emit > SCAN_EMIT_INTERVAL:
+                            self.signals.found.emit(self.scan_id, batch)
+                            batch = []
+                            last_emit = time.monotonic()
+            except OSError as e:
+                if folder == self.root:
+                    error = str(e)
+        if batch:
+            self.signals.found.emit(self.scan_id, batch)
+        self.signals.finished.emit(self.scan_id, count, error)
+
+
+class ThumbnailModel(QAbstractListModel):
+    """
+    缩略图条的数据：data() 被问到某一行的图标时才去生成，所以只有可见的项会排队
+    滚动时调用 cancel_pending() 撤掉还没开始的任务，剩下可见的会在重绘时重新排队
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.paths = []  # 按 keys 排好序；与 ImageViewer.image_list 是同一个列表
+        self.keys = []  # 与 paths 一一对应的自然排序键
+        self.key_of = {}  # path -> 排序键，用来二分查找行号
+        self.pixmaps = OrderedDict()  # path -> QPixmap（LRU）
+        self.pending = {}  # path -> ThumbTask
+        self.store = ThumbnailStore()
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(THUMB_THREADS)
+        self.placeholder = QPixmap(THUMB_SIZE, THUMB_SIZE)
+        self.placeholder.fill(Qt.transparent)
+
+    def reset(self):
+        self.beginResetModel()
+        self.cancel_pending()
+        self.paths = []
+        self.keys = []
+        self.key_of = {}
+        self.endResetModel()
+
+    def insert(self, key, path):
+        """按排序键插入，返回插入的行号"""
+        row = bisect.bisect_right(self.keys, key)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.keys.insert(row, key)
+        self.paths.insert(row, path)
+        self.key_of[path] = key
+        self.endInsertRows()
+        return row
+
+    def row_of(self, path):
+        key = self.key_of.get(path)
+        if key is None:
+            return -1
+        row = bisect.bisect_left(self.keys, key)
+        while row < len(self.paths) and self.paths[row] != path:
+            row += 1
+        return row if row < len(self.paths) else -1
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.paths)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        path = self.paths[index.row()]
+        if role == Qt.DecorationRole:
+            pixmap = self.pixmaps.get(path)
+            if pixmap is None:
+                self.request(path)
+                return self.placeholder
+            self.pixmaps.move_to_end(path)
+            return pixmap
+        if role == Qt.ToolTipRole:
+            return os.path.basename(path)
+        return None
+
+    def request(self, path):
+        if path in self.pending:
+            return
+        task = ThumbTask(path, self.store)
+        task.signals.done.connect(self.on_done)
+        self.pending[path] = task
+        self.pool.start(task)
+
+    def cancel_pending(self):
+        for path, task in list(self.pending.items()):
+            if try_take(self.pool, task):
+                del self.pending[path]
+
+    def on_done(self, path, image):
+        self.pending.pop(path, None)
+        # 失败的也记下（用占位图），免得反复重试
+        self.pixmaps[path] = QPixmap.fromImage(image) if not image.isNull() else self.placeholder
+        while len(self.pixmaps) > THUMB_MEMORY_ITEMS:
+            self.pixmaps.popitem(last=False)
+        row = self.row_of(path)
+        if row >= 0:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+    def shutdown(self):
+        self.pool.clear()
+        self.pool.waitForDone()
 
 
 class ImageViewer(QMainWindow):
@@ -36,7 +511,39 @@ class ImageViewer(QMainWindow):
         self.scroll_area = QScrollArea()
         self.scroll_area.setWidget(self.image_label)
         self.scroll_area.setWidgetResizable(True)
-        self.setCentralWidget(self.scroll_area)
+
+        # 放大到很大时用的分块显示
+        self.tiled_item = TiledImageItem()
+        self.tiled_scene = QGraphicsScene(self)
+        self.tiled_scene.addItem(self.tiled_item)
+        self.tiled_view = QGraphicsView(self.tiled_scene)
+        self.tiled_view.setRenderHint(QPainter.SmoothPixmapTransform)
+        self.tiled_view.setDragMode(QGraphicsView.ScrollHandDrag)
+        self.tiled_view.setTransformationAnchor(QGraphicsView.AnchorViewCenter)
+        self.tiled_view.setBackgroundBrush(self.palette().window())
+
+        self.stack = QStackedWidget()
+        self.stack.addWidget(self.scroll_area)
+        self.stack.addWidget(self.tiled_view)
+        self.setCentralWidget(self.stack)
+
+        # 底部缩略图条：uniformItemSizes 让 QListView 只对可见的项取数据
+        self.thumb_model = ThumbnailModel(self)
+        self.thumb_view = QListView()
+        self.thumb_view.setModel(self.thumb_model)
+        self.thumb_view.setViewMode(QListView.IconMode)
+        self.thumb_view.setFlow(QListView.LeftToRight)
+        self.thumb_view.setWrapping(False)
+        self.thumb_view.setMovement(QListView.Static)
+        self.thumb_view.setUniformItemSizes(True)
+        self.thumb_view.setIconSize(QSize(THUMB_SIZE, THUMB_SIZE))
+        self.thumb_view.setGridSize(QSize(THUMB_SIZE + 8, THUMB_SIZE + 8))
+        self.thumb_view.setFixedHeight(THUMB_SIZE + 8 + self.thumb_view.horizontalScrollBar().sizeHint().height() + 4)
+        self.thumb_view.horizontalScrollBar().valueChanged.connect(self.thumb_model.cancel_pending)
+        self.thumb_view.clicked.connect(self.on_thumb_clicked)
+        self.thumb_dock = QDockWidget('缩略图', self)
+        self.thumb_dock.setWidget(self.thumb_view)
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.thumb_dock)
 
         self.toolbar = QToolBar('工具')
         self.addToolBar(self.toolbar)
@@ -73,15 +580,48 @@ class ImageViewer(QMainWindow):
         for act in (open_file_act, open_folder_act, prev_act, next_act,
                     fit_act, normal_act, zoom_in_act, zoom_out_act):
             self.toolbar.addAction(act)
+        self.toolbar.addAction(self.thumb_dock.toggleViewAction())
+
+        self.recursive_act = QAction('包含子文件夹', self)
+        self.recursive_act.setCheckable(True)
+        self.recursive_act.toggled.connect(self.rescan)
+        self.toolbar.addAction(self.recursive_act)
 
         self.statusBar().showMessage('就绪')
+        self.scan_label = QLabel()
+        self.statusBar().addPermanentWidget(self.scan_label)
 
         # data
         self.image_list = []
         self.current_index = -1
         self.scale_factor = 1.0
         self.fit_mode = True  # 是否处于适应窗口模式
-        self.original_pixmap = None  # 保存原始图像
+        self.source_pixmap = None  # 当前图片解码出来的图像（适应窗口时可能是缩小解码的）
+        self.original_size = QSize()  # 原图尺寸，scale_factor 相对它计算
+
+        # 后台解码 + 预读
+        self.cache = ImageCache()
+        self.decode_pool = QThreadPool(self)
+        self.decode_pool.setMaxThreadCount(DECODE_THREADS)
+        self.pending = {}  # key -> DecodeTask（排队或解码中）
+        self.source_image = None  # 与 source_pixmap 相同的 QImage，分块显示用
+        self.source_path = None  # source_pixmap 对应的文件
+        self.pyramid_tasks = {}  # 源图像的 cacheKey -> PyramidTask
+
+        # 文件夹扫描
+        self.folder = None
+        self.focus_path = None  # 打开单个文件时先放进列表的那个文件，扫描时跳过
+        self.scan_id = 0
+        self.scan_task = None
+        self.scan_count = 0
+        self.user_moved = False  # 扫描中用户还没翻过页时，始终显示排在最前面的那张
+
+        # 交互时先快速缩放，停下来后再平滑缩放
+        self.scaled_cache = ScaledCache()
+        self.rescale_timer = QTimer(self)
+        self.rescale_timer.setSingleShot(True)
+        self.rescale_timer.setInterval(RESCALE_DEBOUNCE_MS)
+        self.rescale_timer.timeout.connect(self.adjust_image_to_label)
 
     def open_file(self):
         path, _ = QFileDialog.getOpenFileName(self, '打开图片', os.path.expanduser('~'))
@@ -95,82 +635,276 @@ class ImageViewer(QMainWindow):
             self.load_folder_or_file(folder)
 
     def load_folder_or_file(self, folder, focus=None):
-        try:
-            files = sorted(os.listdir(folder))
-        except Exception as e:
-            QMessageBox.warning(self, '错误', f'无法打开文件夹: {e}')
+        """
+        在后台扫描 folder，找到的图片陆续按自然顺序插入列表
+        focus 是打开单个文件时的那个文件：先放进列表并显示，不用等扫描
+        """
+        self.stop_scan()
+        self.folder = os.path.normpath(folder)
+        recursive = self.recursive_act.isChecked()
+        self.focus_path = None
+        if focus and focus.lower().endswith(IMAGE_EXTS):
+            focus = os.path.normpath(focus)
+            # 只保留这次扫描也会找到的文件：在 folder 下，不包含子文件夹时还必须直接在 folder 里
+            if os.path.dirname(focus) == self.folder or (
+                    recursive and focus.startswith(os.path.join(self.folder, ''))):
+                self.focus_path = focus
+        self.user_moved = self.focus_path is not None
+        self.thumb_model.reset()
+        self.image_list = self.thumb_model.paths
+        self.current_index = -1
+        self.cache.clear()
+        self.scaled_cache.clear()
+        if self.focus_path is not None:
+            self.current_index = self.thumb_model.insert(
+                natural_key(os.path.relpath(self.focus_path, self.folder)), self.focus_path)
+            self.show_image()
+        self.scan_id += 1
+        self.scan_count = 0
+        task = ScanTask(self.scan_id, self.folder, recursive)
+        task.signals.found.connect(self.on_scan_found)
+        task.signals.finished.connect(self.on_scan_finished)
+        self.scan_task = task
+        self.scan_label.setText('扫描中...')
+        QThreadPool.globalInstance().start(task)
+
+    def rescan(self):
+        if self.folder is not None:
+            self.load_folder_or_file(self.folder, focus=self.current_path())
+
+    def stop_scan(self):
+        if self.scan_task is not None:
+            self.scan_task.cancelled = True
+            self.scan_task = None
+
+    def on_scan_found(self, scan_id, entries):
+        if scan_id != self.scan_id:
             return
-        images = [os.path.join(folder, f) for f in files if f.lower().endswith(IMAGE_EXTS)]
-        if not images:
-            QMessageBox.information(self, '提示', '文件夹中没有支持的图片格式')
+        for key, path in entries:
+            if path == self.focus_path:
+                continue
+            row = self.thumb_model.insert(key, path)
+            if row <= self.current_index:
+                self.current_index += 1  # 插在当前图片前面，当前图片不变
+        self.scan_count += len(entries)
+        self.scan_label.setText(f'扫描中... {self.scan_count} 张')
+        if self.image_list and (self.current_index < 0 or (not self.user_moved and self.current_index != 0)):
+            self.current_index = 0
+            self.show_image()
+        elif self.source_pixmap is not None:
+            self.statusBar().showMessage(self.status_text())  # 序号变了
+
+    def on_scan_finished(self, scan_id, count, error):
+        if scan_id != self.scan_id:
             return
-        self.image_list = images
-        if focus and focus in images:
-            self.current_index = images.index(focus)
+        self.scan_task = None
+        self.scan_label.setText(f'共 {len(self.image_list)} 张')
+        if error and not self.image_list:
+            QMessageBox.warning(self, '错误', f'无法打开文件夹: {error}')
+        elif not self.image_list:
+            QMessageBox.information(self, '提示', '文件夹中没有支持的图片格式')
         else:
-            self.current_index = 0
-        self.show_image()
+            self.prefetch()
+
+    def status_text(self):
+        path = self.current_path()
+        if path is None:
+            return ''
+        name = os.path.relpath(path, self.folder) if self.folder else os.path.basename(path)
+        return f"{name}  ({self.current_index+1}/{len(self.image_list)})"
 
     def show_image(self):
         if not (0 <= self.current_index < len(self.image_list)):
             return
         path = self.image_list[self.current_index]
-        pix = QPixmap(path)
-        if pix.isNull():
-            QMessageBox.warning(self, '错误', f'无法加载图片: {path}')
-            return
-        # 保存原始图像
-        self.original_pixmap = pix
+        self.source_pixmap = None
+        self.source_image = None
+        self.tiled_item.set_source(None, QSize(), None)
+        index = self.thumb_model.index(self.current_index)
+        self.thumb_view.setCurrentIndex(index)
+        self.thumb_view.scrollTo(index)
+        item = self.lookup(path)
+        if item is not None:
+            self.display_image(path, *item)
+        else:
+            self.statusBar().showMessage(f"{os.path.basename(path)}  加载中...")
+            self.request_decode(self.wanted_key(path), priority=1)
+        self.prefetch()
+
+    def display_image(self, path, image, original_size):
+        self.source_pixmap = QPixmap.fromImage(image)
+        self.source_image = image
+        self.source_path = path
+        self.original_size = original_size
         if self.fit_mode:
             self.fit_to_window()
         else:
             self.adjust_image_to_label()
-        self.statusBar().showMessage(f"{os.path.basename(path)}  ({self.current_index+1}/{len(self.image_list)})")
+        self.statusBar().showMessage(self.status_text())
+
+    def on_thumb_clicked(self, index):
+        if index.row() != self.current_index:
+            self.user_moved = True
+            self.current_index = index.row()
+            self.show_image()
 
-    def adjust_image_to_label(self):
-        if self.original_pixmap is None:
+    def current_path(self):
+        if 0 <= self.current_index < len(self.image_list):
+            return self.image_list[self.current_index]
+        return None
+
+    def wanted_key(self, path):
+        """适应窗口时按窗口大小缩小解码，否则解码原图"""
+        if self.fit_mode:
+            size = self.scroll_area.viewport().size()
+            return path, (max(size.width(), 1), max(size.height(), 1))
+        return path, None
+
+    def lookup(self, path):
+        """缓存里可用的解码结果：优先正好合适的，其次原图"""
+        item = self.cache.get(self.wanted_key(path))
+        if item is None:
+            item = self.cache.get((path, None))
+        return item
+
+    def request_decode(self, key, priority=0):
+        """提交解码任务（已在缓存或已在排队的跳过）；当前图片用较高优先级插到队列前面"""
+        if key in self.cache or key in self.pending:
+            return
+        task = DecodeTask(key)
+        task.signals.done.connect(self.on_decoded)
+        self.pending[key] = task
+        self.decode_pool.start(task, priority)
+
+    def prefetch(self):
+        """预读当前图片前后几张；已经不在预读范围内、还没开始解码的任务撤掉"""
+        n = len(self.image_list)
+        if n == 0:
+            return
+        paths = [self.image_list[(self.current_index + d) % n] for d in range(1, PREFETCH_AHEAD + 1)]
+        paths += [self.image_list[(self.current_index - d) % n] for d in range(1, PREFETCH_BEHIND + 1)]
+        wanted = [self.wanted_key(path) for path in paths]
+        current = self.current_path()
+        for key, task in list(self.pending.items()):
+            if key[0] != current and key not in wanted and try_take(self.decode_pool, task):
+                del self.pending[key]
+        for key in wanted:
+            if self.lookup(key[0]) is None:
+                self.request_decode(key)
+
+    def on_decoded(self, key, image, original_size, error):
+        self.pending.pop(key, None)
+        path = key[0]
+        if image.isNull():
+            if path == self.current_path() and self.source_pixmap is None:
+                QMessageBox.warning(self, '错误', f'无法加载图片: {path}\n{error}')
+            return
+        self.cache.put(key, image, original_size)
+        # 当前图片：第一次解码完成，或者换成分辨率更高的版本
+        if path == self.current_path() and (
+                self.source_pixmap is None or image.width() > self.source_pixmap.width()):
+            self.display_image(path, image, original_size)
+
+    def ensure_resolution(self):
+        """当前显示比例超过已解码图像的分辨率时，补解码（窗口变大时按新窗口，放大时解码原图）"""
+        path = self.current_path()
+        if path is None or self.source_pixmap is None:
+            return
+        need = self.original_size.width() * self.scale_factor
+        if self.source_pixmap.width() + 1 >= min(need, self.original_size.width()):  # 允许取整误差
+            return
+        # 同一张图已经有解码任务在跑就先等它，完成后显示时会再检查一次
+        if any(key[0] == path for key in self.pending):
             return
-        new_size = self.original_pixmap.size() * self.scale_factor
-        scaled = self.original_pixmap.scaled(new_size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        self.request_decode(self.wanted_key(path), priority=1)
+
+    def adjust_image_to_label(self, fast=False):
+        """
+        按 scale_factor 显示当前图片
+        fast=True 用于拖动窗口、连续缩放这类交互：缓存里没有就先快速缩放预览，停下来后由定时器再平滑缩放
+        """
+        if self.source_pixmap is None:
+            return
+        new_size = self.original_size * self.scale_factor
+        if new_size.width() * new_size.height() > LABEL_MAX_PIXELS:
+            self.show_tiled()
+            return
+        self.stack.setCurrentWidget(self.scroll_area)
+        # 每次从解码缓存取出都会生成新的 QPixmap (cacheKey 不同)，所以按文件和解码尺寸作键
+        decoded = self.source_pixmap.size()
+        key = (self.source_path, (decoded.width(), decoded.height()), new_size.width(), new_size.height())
+        scaled = self.scaled_cache.get(key)
+        if scaled is None and fast:
+            scaled = self.source_pixmap.scaled(new_size, Qt.KeepAspectRatio, Qt.FastTransformation)
+            self.rescale_timer.start()
+        elif scaled is None:
+            scaled = self.source_pixmap.scaled(new_size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+            self.scaled_cache.put(key, scaled)
         self.image_label.setPixmap(scaled)
         self.image_label.resize(scaled.size())
+        if not fast:
+            self.rescale_timer.stop()
+            self.ensure_resolution()
+
+    def show_tiled(self):
+        """分块显示当前图片：缩放只改视图的变换，换了源图像时重新在后台生成金字塔"""
+        self.rescale_timer.stop()
+        self.image_label.clear()
+        key = self.source_image.cacheKey()
+        if self.tiled_item.source_key != key:
+            self.tiled_item.set_source(key, self.original_size, self.source_image)
+            self.tiled_scene.setSceneRect(self.tiled_item.boundingRect())
+            task = PyramidTask(key, self.source_image)
+            task.signals.done.connect(self.on_pyramid)
+            self.pyramid_tasks[key] = task
+            self.decode_pool.start(task)
+        self.tiled_view.setTransform(QTransform.fromScale(self.scale_factor, self.scale_factor))
+        self.stack.setCurrentWidget(self.tiled_view)
+        self.ensure_resolution()
+
+    def on_pyramid(self, key, levels):
+        if key == self.tiled_item.source_key:
+            self.tiled_item.add_levels(levels)
+        self.pyramid_tasks.pop(key, None)
 
     def next_image(self):
         if not self.image_list:
             return
+        self.user_moved = True
         self.current_index = (self.current_index + 1) % len(self.image_list)
         self.show_image()
 
     def prev_image(self):
         if not self.image_list:
             return
+        self.user_moved = True
         self.current_index = (self.current_index - 1) % len(self.image_list)
         self.show_image()
 
-    def fit_to_window(self):
-        if self.original_pixmap is None:
+    def fit_to_window(self, fast=False):
+        if self.source_pixmap is None:
             return
         area_size = self.scroll_area.viewport().size()
-        w_ratio = area_size.width() / self.original_pixmap.width()
-        h_ratio = area_size.height() / self.original_pixmap.height()
+        w_ratio = area_size.width() / self.original_size.width()
+        h_ratio = area_size.height() / self.original_size.height()
         self.scale_factor = min(w_ratio, h_ratio, 1.0)
         self.fit_mode = True
-        self.adjust_image_to_label()
+        self.adjust_image_to_label(fast)
 
     def normal_size(self):
-        if self.original_pixmap is None:
+        if self.source_pixmap is None:
             return
         self.scale_factor = 1.0
         self.fit_mode = False
         self.adjust_image_to_label()
 
     def zoom(self, factor):
-        if self.original_pixmap is None:
+        if self.source_pixmap is None:
             return
         self.scale_factor *= factor
         self.scale_factor = max(0.1, min(self.scale_factor, 10.0))
         self.fit_mode = False
-        self.adjust_image_to_label()
+        self.adjust_image_to_label(fast=True)
 
     def keyPressEvent(self, event):
         if event.key() == Qt.Key_Right:
@@ -190,8 +924,17 @@ class ImageViewer(QMainWindow):
 
     def resizeEvent(self, event):
         super().resizeEvent(event)
-        if self.fit_mode and self.original_pixmap is not None:
-            self.fit_to_window()
+        if self.fit_mode and self.source_pixmap is not None:
+            self.fit_to_window(fast=True)
+
+
+    def closeEvent(self, event):
+        self.stop_scan()
+        QThreadPool.globalInstance().waitForDone()
+        self.thumb_model.shutdown()
+        self.decode_pool.clear()
+        self.decode_pool.waitForDone()
+        super().closeEvent(event)
 
 
 def main():
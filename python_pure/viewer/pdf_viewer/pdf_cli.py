@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PDF Viewer 命令行工具 (不依赖 PyQt6，适合批量处理)
+用法:
+  python pdf_cli.py export FILE -o OUTDIR [-s SCALE | --dpi DPI] [-p PAGES] [-j JOBS]
+      PAGES: "1-10,15,20-" (从 1 开始，默认全部)
+每页输出一行报告 (制表符分隔)：页号 / 输出文件；渲染与界面 实际大小 模式相同 (比例 1 = 72 dpi)
+页按块分给多个进程并行渲染，每个进程自己打开文件
+"""
+import argparse
+import sys
+import time
+
+import fitz  # PyMuPDF
+
+from pdf_core import export_pdf, parse_pages
+
+
+def cmd_export(args, out):
+    try:
+        with fitz.open(args.file) as doc:
+            pages = parse_pages(args.pages, doc.page_count)
+    except ValueError:
+        sys.stderr.write(f"无法识别的页码范围: {args.pages}\n")
+        return 2
+    except Exception as e:  # fitz 打开失败抛出的异常类型不固定
+        sys.stderr.write(f"{args.file}: {e}\n")
+        return 1
+    scale = args.dpi / 72 if args.dpi else args.scale
+    out.write("page\tpath\n")
+    rc = 0
+    t0 = time.perf_counter()
+    for n, path, err in export_pdf(args.file, args.out_dir, scale, pages, args.jobs):
+        if err:
+            sys.stderr.write(f"第 {n + 1} 页: {err}\n")
+            rc = 1
+            continue
+        out.write(f"{n + 1}\t{path}\n")
+    elapsed = time.perf_counter() - t0
+    sys.stderr.write(f"{len(pages)} 页, {elapsed:.2f} s, {len(pages) / max(elapsed, 1e-9):.1f} 页/s\n")
+    return rc
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="PDF 页面导出 (无界面，多进程并行)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("export", help="把页面渲染成 PNG")
+    p.add_argument("file")
+    p.add_argument("-o", "--out-dir", required=True, help="输出目录")
+    p.add_argument("-s", "--scale", type=float, default=2.0, help="渲染比例 (默认 2，与界面实际大小相同)")
+    p.add_argument("--dpi", type=float, default=None, help="按 dpi 指定比例 (覆盖 --scale)")
+    p.add_argument("-p", "--pages", default=None, help='页码范围，例如 "1-10,15"')
+    p.add_argument("-j", "--jobs", type=int, default=None, help="并行进程数 (默认 CPU 核数)")
+    p.set_defaults(func=cmd_export)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args, sys.stdout)
+    except BrokenPipeError:  # eg: | head
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PDF Viewer 核心 (不依赖 Qt)
+- 缩放比例计算 (与界面的 适应宽度 / 适应整页 / 实际大小 相同)
+- 多进程并行把页面渲染成 PNG：页按块分给 ProcessPoolExecutor，每个进程自己打开文件
+- 全文查找：逐页提取单词及其矩形，建倒排索引；提取结果按文件内容哈希缓存 (gzip JSON)
+pdf_viewer.py (界面) 与 pdf_cli.py (命令行) 共用本模块
+"""
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import gzip
+import hashlib
+import json
+import os
+
+import fitz  # PyMuPDF
+
+EXPORT_CHUNK_PAGES = 8  # 每个导出任务负责的页数；小块便于各进程负载均衡，也能及时报告进度
+HASH_CHUNK_SIZE = 1024 * 1024
+TEXT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pdf_viewer", "text")
+TEXT_CACHE_VERSION = 1
+SEARCH_RESULT_CACHE = 32  # 记住最近几次查找的结果
+
+
+def page_scale(page_w, page_h, mode, view_w, view_h, zoom_factor):
+    """按缩放模式计算渲染比例"""
+    if mode == "fit_width":
+        return view_w / page_w
+    if mode == "fit_page":
+        return min(view_w / page_w, view_h / page_h)
+    return zoom_factor  # actual
+
+
+def parse_pages(spec, page_count):
+    """
+    "1-10,15,20-" -> 从 0 开始的页号列表 (排序去重)；spec 为空表示全部
+    超出范围的页忽略，格式错误抛 ValueError
+    """
+    if not spec:
+        return list(range(page_count))
+    pages = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            lo, hi = part.split("-", 1)
+            lo = int(lo) if lo.strip() else 1
+            hi = int(hi) if hi.strip() else page_count
+        else:
+            lo = hi = int(part)
+        pages.update(range(max(lo, 1) - 1, min(hi, page_count)))
+    return sorted(pages)
+
+
+def export_name(path, page_no, page_count):
+    """导出文件名: <文件名>_<页号>.png，页号补零到相同位数便于排序"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return f"{stem}_{page_no + 1:0{len(str(page_count))}d}.png"
+
+
+_doc = None  # 每个进程一个，连续的任务复用
+
+
+def _worker_document(path):
+    global _doc
+    if _doc is None or _doc.name != path:
+        _close_worker_document()
+        _doc = fitz.open(path)
+    return _doc
+
+
+def _close_worker_document():
+    global _doc
+    if _doc is not None:
+        _doc.close()
+        _doc = None
+
+
+def export_pages(path, pages, out_dir, scale):
+    """在当前进程里渲染并保存 pages；返回 [(page_no, out_path, error), ...]"""
+    try:
+        doc = _worker_document(path)
+    except Exception as e:  # fitz 打开失败抛出的异常类型不固定
+        return [(n, None, str(e)) for n in pages]
+    results = []
+    for n in pages:
+        out = os.path.join(out_dir, export_name(path, n, doc.page_count))
+        try:
+            pix = doc.load_page(n).get_pixmap(matrix=fitz.Matrix(scale, scale), alpha=False)
+            pix.save(out)
+            results.append((n, out, None))
+        except Exception as e:
+            results.append((n, None, str(e)))
+    return results
+
+
+def export_pdf(path, out_dir, scale=2.0, pages=None, jobs=None, cancelled=None, mp_context=None,
+               in_process=True):
+    """
+    把 pages (默认全部) 渲染成 PNG 放到 out_dir，按完成顺序逐页产出 (page_no, out_path, error)
+    jobs > 1 时页按 EXPORT_CHUNK_PAGES 一块分给多个进程；cancelled() 为真时撤掉还没开始的块
+    in_process=False 时只有一个进程也放到子进程里渲染 (界面里用，不和界面的渲染线程同时调用 PyMuPDF)
+    """
+    if pages is None:
+        with fitz.open(path) as doc:
+            pages = list(range(doc.page_count))
+    jobs = jobs or os.cpu_count() or 1
+    chunks = [pages[i: i + EXPORT_CHUNK_PAGES] for i in range(0, len(pages), EXPORT_CHUNK_PAGES)]
+    os.makedirs(out_dir, exist_ok=True)
+    if not chunks:
+        return
+    if in_process and (jobs <= 1 or len(chunks) <= 1):
+        try:
+            for chunk in chunks:
+                if cancelled and cancelled():
+                    return
+                yield from export_pages(path, chunk, out_dir, scale)
+        finally:
+            _close_worker_document()  # 不在子进程里，导出完不再占着文件
+        return
+    with ProcessPoolExecutor(max_workers=min(jobs, len(chunks)), mp_context=mp_context) as pool:
+        futures = [pool.submit(export_pages, path, chunk, out_dir, scale) for chunk in chunks]
+        for future in as_completed(futures):
+            if cancelled and cancelled():
+                for f in futures:
+                    f.cancel()
+                return
+            yield from future.result()
+
+
+# ========= 全文查找 =========
+
+def file_digest(path):
+    """整个文件内容的 blake2b 哈希 (十六进制)，用作文本缓存的键"""
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(HASH_CHUNK_SIZE)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+
+def extract_words(doc, pages):
+    """
+    pages 里每页的单词：[[x0, y0, x1, y1, text], ...] (阅读顺序，坐标单位 pt，保留一位小数)
+    返回与 pages 对应的列表
+    """
+    result = []
+    for n in pages:
+        words = doc.load_page(n).get_text("words", sort=True)
+        result.append([[round(w[0], 1), round(w[1], 1), round(w[2], 1), round(w[3], 1), w[4]] for w in words])
+    return result
+
+
+def _text_cache_path(digest):
+    return os.path.join(TEXT_CACHE_DIR, digest + ".json.gz")
+
+
+def load_text_cache(digest):
+    """缓存的逐页单词列表；没有或格式不对时返回 None"""
+    try:
+        with gzip.open(_text_cache_path(digest), "rt", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError, EOFError):
+        return None
+    if not isinstance(data, dict) or data.get("version") != TEXT_CACHE_VERSION:
+        return None
+    return data.get("pages")
+
+
+def save_text_cache(digest, pages):
+    """写临时文件再替换，写到一半被中断也不会留下损坏的缓存"""
+    path = _text_cache_path(digest)
+    tmp = path + ".tmp"
+    try:
+        os.makedirs(TEXT_CACHE_DIR, exist_ok=True)
+        data = json.dumps({"version": TEXT_CACHE_VERSION, "pages": pages}, ensure_ascii=False,
+                          separators=(",", ":"))
+        with gzip.open(tmp, "wb", compresslevel=3) as f:
+            f.write(data.encode("utf-8"))  # 一次写入，比 json.dump 到文本流快得多
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+class TextIndex:
+    """
+    倒排索引：小写单词 -> [(页号, 该页第几个单词), ...]
+    查找不区分大小写；多个词按短语查找 (相邻的单词依次包含各个词)，每个词可以只是单词的一部分
+    """
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.lower = [[word[4].lower() for word in words] for words in pages]
+        self.postings = {}
+        for page_no, tokens in enumerate(self.lower):
+            for i, token in enumerate(tokens):
+                self.postings.setdefault(token, []).append((page_no, i))
+        self._results = OrderedDict()  # 规范化后的查询 -> 结果
+
+    def search(self, query):
+        """返回 [(页号, [(x0, y0, x1, y1), ...]), ...]，按页和页内位置排序；每个元素是一处匹配"""
+        terms = query.lower().split()
+        if not terms:
+            return []
+        cache_key = " ".join(terms)
+        result = self._results.get(cache_key)
+        if result is not None:
+            self._results.move_to_end(cache_key)
+            return result
+        n = len(terms)
+        found = []
+        for token, postings in self.postings.items():
+            if terms[0] not in token:
+                continue
+            for page_no, i in postings:
+                tokens = self.lower[page_no]
+                if i + n > len(tokens):
+                    continue
+                if n == 1 or all(terms[k] in tokens[i + k] for k in range(1, n)):
+                    found.append((page_no, i))
+        found.sort()
+        result = [(page_no, [tuple(w[:4]) for w in self.pages[page_no][i: i + n]]) for page_no, i in found]
+        self._results[cache_key] = result
+        while len(self._results) > SEARCH_RESULT_CACHE:
+            self._results.popitem(last=False)
+        return result
@@ -1,10 +1,295 @@
+"""
+PDF 浏览器 (PyQt6 + PyMuPDF)
+页面在后台线程渲染，渲染结果按 (页, 缩放模式, 比例) 放在按字节数限制大小的 LRU 缓存里，
+并预先渲染前后几页；渲染线程池共用一份 fitz.Document (每个文件只打开一次)，不和界面线程共用。
+连续滚动模式按每页尺寸先排好位置（不渲染），只渲染与视口（上下各加一屏）相交的页，
+离开较远的页从缓存里丢掉，页数再多内存占用也有上限。
+"导出 PNG" 用多个进程并行渲染所有页 (pdf_core.export_pdf，与 pdf_cli.py 相同)。
+打开文件后在后台逐页提取文本建立倒排索引，按文件内容哈希缓存在 ~/.cache/pdf_viewer/text，
+查找时直接查索引，在页面上标出匹配位置，可以跳到上一处 / 下一处。
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+import bisect
+import multiprocessing
+import os
 import sys
+import threading
 import fitz  # PyMuPDF
 from PyQt6.QtWidgets import (
-    QApplication, QMainWindow, QFileDialog, QToolBar, QLineEdit, QLabel, QScrollArea
+    QApplication, QMainWindow, QFileDialog, QToolBar, QLineEdit, QLabel, QScrollArea,
+    QStackedWidget, QWidget, QDockWidget, QListWidget, QListWidgetItem
 )
-from PyQt6.QtGui import QAction, QPixmap, QImage
-from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QAction, QPixmap, QImage, QPainter, QColor
+from PyQt6.QtCore import Qt, QObject, QRect, QRectF, QRunnable, QThreadPool, pyqtSignal
+
+from pdf_core import (
+    TextIndex, export_pdf, extract_words, file_digest, load_text_cache, page_scale, save_text_cache,
+)
+
+PREFETCH_AHEAD = 2  # 预先渲染后面几页
+PREFETCH_BEHIND = 1  # 预先渲染前面几页
+RENDER_CACHE_BYTES = 256 * 1024 * 1024  # 渲染缓存上限
+# PyMuPDF 不支持多线程并发调用，后台只用一个渲染线程（多核并行渲染见导出功能的多进程实现）
+RENDER_THREADS = 1
+PAGE_GAP = 12  # 连续滚动模式下页与页之间的间隔
+RENDER_MARGIN = 1.0  # 连续滚动模式下视口上下各多渲染几屏
+KEEP_PAGES = 6  # 渲染范围以外再保留几页的缓存，更远的丢掉
+TEXT_CHUNK_PAGES = 20  # 提取文本时每个任务负责的页数（任务优先级低于渲染，穿插在渲染之间执行）
+HIT_COLOR = QColor(255, 230, 0, 90)
+CURRENT_HIT_COLOR = QColor(255, 120, 0, 130)
+
+
+def render_page_image(doc, page_no, scale):
+    """把一页渲染成 QImage（复制一份，不再引用 pixmap 的内存）"""
+    page = doc.load_page(page_no)
+    pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), alpha=False)
+    image = QImage(pix.samples, pix.width, pix.height, pix.stride, QImage.Format.Format_RGB888)
+    return image.copy()
+
+
+class RenderDocument:
+    """
+    渲染线程池共用的一份 fitz.Document：同一文件只打开一次，换文件时关掉旧的
+    任务在锁内使用，界面线程换文件 / 关闭窗口时调用 close() 明确关掉
+    PyMuPDF 不能在多个线程里同时调用（即使是各自打开的文档也不行），所以不是每个渲染线程一份文档，
+    而是 RENDER_THREADS = 1 加上这把锁：界面里放弃了渲染的并行，多核并行只用在多进程导出上
+    界面线程只在打开文件时通过它读一次页面尺寸，之后不再直接调用 PyMuPDF
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.path = None
+        self.doc = None
+
+    @contextmanager
+    def use(self, path):
+        with self.lock:
+            if self.doc is None or self.path != path:
+                self._close()
+                self.doc = fitz.open(path)
+                self.path = path
+            yield self.doc
+
+    def close(self):
+        with self.lock:
+            self._close()
+
+    def _close(self):
+        if self.doc is not None:
+            self.doc.close()
+        self.doc = None
+        self.path = None
+
+
+class RenderCache:
+    """渲染好的 QImage 的 LRU 缓存，按 sizeInBytes() 累计，超过上限时淘汰最久未用的"""
+
+    def __init__(self, max_bytes=RENDER_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.total = 0
+        self._items = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key):
+        image = self._items.get(key)
+        if image is not None:
+            self._items.move_to_end(key)
+        return image
+
+    def put(self, key, image):
+        old = self._items.pop(key, None)
+        if old is not None:
+            self.total -= old.sizeInBytes()
+        self._items[key] = image
+        self.total += image.sizeInBytes()
+        while self.total > self.max_bytes and len(self._items) > 1:
+            _, dropped = self._items.popitem(last=False)
+            self.total -= dropped.sizeInBytes()
+
+    def evict(self, drop):
+        """丢掉 drop(key) 为真的项"""
+        for key in [key for key in self._items if drop(key)]:
+            self.total -= self._items.pop(key).sizeInBytes()
+
+    def clear(self):
+        self._items.clear()
+        self.total = 0
+
+
+class RenderSignals(QObject):
+    done = pyqtSignal(str, object, QImage, str)  # 文件路径, key, image, 错误信息
+
+
+class RenderTask(QRunnable):
+    """在后台线程渲染一页；key = (页号, 缩放模式, 比例)"""
+
+    def __init__(self, path, key, document):
+        super().__init__()
+        self.path = path
+        self.key = key
+        self.document = document
+        self.signals = RenderSignals()
+
+    def run(self):
+        page_no, _, scale = self.key
+        try:
+            with self.document.use(self.path) as doc:
+                image = render_page_image(doc, page_no, scale)
+            error = ""
+        except Exception as e:  # 损坏的页面 / 文件被删除等
+            image, error = QImage(), str(e)
+        self.signals.done.emit(self.path, self.key, image, error)
+
+
+class ExportSignals(QObject):
+    progress = pyqtSignal(int, int)  # 已完成页数, 总页数
+    finished = pyqtSignal(int, str)  # 成功页数, 错误信息（只保留第一条）
+
+
+class ExportTask(QRunnable):
+    """在后台线程里驱动多进程导出，逐页报告进度"""
+
+    def __init__(self, path, out_dir, scale, page_count):
+        super().__init__()
+        self.path = path
+        self.out_dir = out_dir
+        self.scale = scale
+        self.page_count = page_count
+        self.cancelled = False
+        self.signals = ExportSignals()
+
+    def run(self):
+        done = ok = 0
+        first_error = ""
+        try:
+            # 界面进程里有多个线程，子进程用 spawn 启动，不 fork；
+            # 只有一个核时也在子进程里渲染，PyMuPDF 只在渲染线程池里使用
+            for _, _, err in export_pdf(self.path, self.out_dir, self.scale, list(range(self.page_count)),
+                                        cancelled=lambda: self.cancelled,
+                                        mp_context=multiprocessing.get_context("spawn"), in_process=False):
+                done += 1
+                if err:
+                    first_error = first_error or err
+                else:
+                    ok += 1
+                self.signals.progress.emit(done, self.page_count)
+        except Exception as e:  # 输出目录不可写、子进程异常退出等
+            first_error = first_error or str(e)
+        self.signals.finished.emit(ok, first_error)
+
+
+class TextSignals(QObject):
+    loaded = pyqtSignal(str, str, object)  # 文件路径, 内容哈希, 缓存的逐页单词（没有缓存时为 None）
+    extracted = pyqtSignal(str, int, object)  # 文件路径, 起始页号, 逐页单词
+
+
+class TextLoadTask(QRunnable):
+    """计算文件哈希并读取文本缓存（不用 fitz，可以放在任意线程）"""
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.signals = TextSignals()
+
+    def run(self):
+        try:
+            digest = file_digest(self.path)
+        except OSError:
+            digest = ""
+        pages = load_text_cache(digest) if digest else None
+        self.signals.loaded.emit(self.path, digest, pages)
+
+
+class ExtractTask(QRunnable):
+    """提取一段页的单词；放在渲染线程池里执行，和渲染共用同一份 fitz.Document"""
+
+    def __init__(self, path, first, last, document):
+        super().__init__()
+        self.path = path
+        self.first = first
+        self.last = last
+        self.document = document
+        self.signals = TextSignals()
+
+    def run(self):
+        try:
+            with self.document.use(self.path) as doc:
+                words = extract_words(doc, range(self.first, self.last))
+        except Exception:  # 个别页面损坏时整段按没有文本处理
+            words = [[] for _ in range(self.first, self.last)]
+        self.signals.extracted.emit(self.path, self.first, words)
+
+
+class TextSaveTask(QRunnable):
+    def __init__(self, digest, pages):
+        super().__init__()
+        self.digest = digest
+        self.pages = pages
+
+    def run(self):
+        save_text_cache(self.digest, self.pages)
+
+
+def try_take(pool, task):
+    """撤掉还没开始的任务；已经跑完（信号还在路上）的任务包装对象已失效，当作撤不掉"""
+    try:
+        return pool.tryTake(task)
+    except RuntimeError:
+        return False
+
+
+class ContinuousView(QWidget):
+    """
+    连续滚动模式的页面区域：按每页尺寸和比例排好位置，高度是所有页之和
+    只画与重绘区域相交的页，缓存里没有的先画白色占位
+    """
+
+    def __init__(self, viewer):
+        super().__init__()
+        self.viewer = viewer
+        self.tops = []  # 每页顶端的 y
+        self.keys = []  # 每页的渲染 key
+
+    def relayout(self, view_w, view_h):
+        viewer = self.viewer
+        tops, keys = [], []
+        y, width = PAGE_GAP, 0
+        for n, (page_w, page_h) in enumerate(viewer.page_sizes):
+            scale = round(page_scale(page_w, page_h, viewer.scale_mode, view_w, view_h, viewer.zoom_factor), 4)
+            tops.append(y)
+            keys.append((n, viewer.scale_mode, scale))
+            y += int(page_h * scale) + PAGE_GAP
+            width = max(width, int(page_w * scale))
+        self.tops, self.keys = tops, keys
+        self.setFixedSize(max(width, view_w), y)
+        self.update()
+
+    def page_at(self, y):
+        return max(0, bisect.bisect_right(self.tops, y) - 1)
+
+    def page_rect(self, n):
+        page_w, page_h = self.viewer.page_sizes[n]
+        scale = self.keys[n][2]
+        w, h = int(page_w * scale), int(page_h * scale)
+        return QRect((self.width() - w) // 2, self.tops[n], w, h)
+
+    def paintEvent(self, event):
+        if not self.tops:
+            return
+        painter = QPainter(self)
+        area = event.rect()
+        painter.fillRect(area, self.palette().mid())  # 页与页之间的间隔
+        for n in range(self.page_at(area.top()), self.page_at(area.bottom()) + 1):
+            rect = self.page_rect(n)
+            image = self.viewer.cache.get(self.keys[n])
+            if image is None:
+                painter.fillRect(rect, Qt.GlobalColor.white)
+            else:
+                painter.drawImage(rect.topLeft(), image)
+            self.viewer.draw_hits(painter, n, rect.x(), rect.y(), self.keys[n][2])
 
 
 class PDFViewer(QMainWindow):
@@ -12,8 +297,10 @@ class PDFViewer(QMainWindow):
         super().__init__()
         self.setWindowTitle("PDF 浏览器 - 稳定版 (带缩放)")
 
-        self.doc = None
+        self.path = None
+        self.page_sizes = []  # 每页的 (宽, 高)，单位 pt；界面线程只用它，不直接访问 fitz.Document
         self.current_page = 0
+        self.continuous = False  # 连续滚动模式
         self.scale_mode = "actual"  # actual / fit_width / fit_page
         self.zoom_factor = 2.0  # 默认放大 2 倍渲染
 
@@ -24,7 +311,18 @@ class PDFViewer(QMainWindow):
         self.scroll = QScrollArea()
         self.scroll.setWidgetResizable(True)
         self.scroll.setWidget(self.image_label)
-        self.setCentralWidget(self.scroll)
+
+        # 连续滚动模式；竖直滚动条常显，免得适应宽度时滚动条出现/消失引起反复重排
+        self.cont_view = ContinuousView(self)
+        self.cont_scroll = QScrollArea()
+        self.cont_scroll.setWidget(self.cont_view)
+        self.cont_scroll.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOn)
+        self.cont_scroll.verticalScrollBar().valueChanged.connect(self.update_visible)
+
+        self.stack = QStackedWidget()
+        self.stack.addWidget(self.scroll)
+        self.stack.addWidget(self.cont_scroll)
+        self.setCentralWidget(self.stack)
 
         # 工具栏
         toolbar = QToolBar("工具栏")
@@ -61,64 +359,443 @@ class PDFViewer(QMainWindow):
         actual_action.triggered.connect(lambda: self.set_scale_mode("actual"))
         toolbar.addAction(actual_action)
 
+        continuous_action = QAction("连续滚动", self)
+        continuous_action.setCheckable(True)
+        continuous_action.toggled.connect(self.set_continuous)
+        toolbar.addAction(continuous_action)
+
+        export_action = QAction("导出 PNG", self)
+        export_action.triggered.connect(self.export_png)
+        toolbar.addAction(export_action)
+        self.export_task = None
+
+        # 查找
+        toolbar.addSeparator()
+        self.search_input = QLineEdit(self)
+        self.search_input.setFixedWidth(160)
+        self.search_input.setPlaceholderText("查找文本")
+        self.search_input.returnPressed.connect(self.on_search_enter)
+        toolbar.addWidget(self.search_input)
+        prev_hit_action = QAction("上一处", self)
+        prev_hit_action.setShortcut("Shift+F3")
+        prev_hit_action.triggered.connect(lambda: self.step_hit(-1))
+        toolbar.addAction(prev_hit_action)
+        next_hit_action = QAction("下一处", self)
+        next_hit_action.setShortcut("F3")
+        next_hit_action.triggered.connect(lambda: self.step_hit(1))
+        toolbar.addAction(next_hit_action)
+        self.hit_label = QLabel(self)
+        toolbar.addWidget(self.hit_label)
+        find_action = QAction("查找", self)
+        find_action.setShortcut("Ctrl+F")
+        find_action.triggered.connect(lambda: (self.search_input.setFocus(), self.search_input.selectAll()))
+        self.addAction(find_action)
+
+        # 每页匹配数
+        self.hit_list = QListWidget()
+        self.hit_list.itemClicked.connect(self.on_hit_page_clicked)
+        self.hit_dock = QDockWidget("查找结果", self)
+        self.hit_dock.setWidget(self.hit_list)
+        self.addDockWidget(Qt.DockWidgetArea.LeftDockWidgetArea, self.hit_dock)
+        self.hit_dock.hide()
+
+        self.text_index = None  # TextIndex，建好之前为 None
+        self.text_digest = ""
+        self.text_pages = []  # 提取中的逐页单词
+        self.text_remaining = 0  # 还没提取完的页数
+        self.extract_tasks = {}  # 起始页号 -> ExtractTask
+        self.text_load_task = None
+        self.search_query = ""  # 索引建好后要执行的查询
+        self.hits = []  # [(页号, [(x0, y0, x1, y1), ...]), ...]
+        self.hits_by_page = {}  # 页号 -> [在 hits 中的序号]
+        self.current_hit = -1
+
+        # 后台渲染 + 预读
+        self.cache = RenderCache()
+        self.render_pool = QThreadPool(self)
+        self.render_pool.setMaxThreadCount(RENDER_THREADS)
+        self.render_doc = RenderDocument()  # 渲染 / 提取文本任务共用，只打开一次
+        self.pending = {}  # key -> RenderTask（排队或渲染中）
+
     # ========= 功能 =========
 
     def open_pdf(self):
         file_path, _ = QFileDialog.getOpenFileName(self, "打开 PDF 文件", "", "PDF Files (*.pdf)")
         if file_path:
-            self.doc = fitz.open(file_path)
-            self.current_page = 0
-            self.show_page()
+            self.load_pdf(file_path)
+
+    def load_pdf(self, file_path):
+        self.cancel_pending()
+        self.pending = {}  # 正在渲染的旧文件页面，完成时按路径忽略
+        self.cache.clear()
+        self.reset_search()
+        self.render_doc.close()  # 等正在执行的任务结束后关掉旧文件
+        with self.render_doc.use(file_path) as doc:  # 在锁内读页面尺寸，同一份文档留给渲染任务用
+            page_sizes = [(r.width, r.height) for r in (doc.load_page(n).rect for n in range(doc.page_count))]
+        self.path = file_path
+        self.page_sizes = page_sizes
+        self.current_page = 0
+        self.start_text_index()
+        if self.continuous:
+            self.relayout()
+        self.show_page()
 
     def set_scale_mode(self, mode):
         self.scale_mode = mode
+        if self.continuous:
+            self.relayout(keep_position=True)
+            self.update_visible()
+        else:
+            self.show_page()
+
+    def set_continuous(self, on):
+        self.continuous = on
+        self.stack.setCurrentWidget(self.cont_scroll if on else self.scroll)
+        if on:
+            self.image_label.clear()
+            self.relayout()
         self.show_page()
 
-    def show_page(self):
-        if not self.doc:
+    def relayout(self, keep_position=False):
+        """
+        按当前缩放模式和窗口大小重新排列连续滚动模式的页面
+        keep_position: 视口顶端仍停在原来那页的同一相对位置
+        """
+        if not self.page_sizes:
             return
-        page = self.doc.load_page(self.current_page)
+        view = self.cont_view
+        bar = self.cont_scroll.verticalScrollBar()
+        if keep_position and view.tops:
+            page = view.page_at(bar.value())
+            rect = view.page_rect(page)
+            frac = (bar.value() - rect.top()) / max(rect.height(), 1)
+        viewport = self.cont_scroll.viewport()
+        view.relayout(viewport.width(), viewport.height())
+        if keep_position and view.tops:
+            rect = view.page_rect(page)
+            bar.setValue(rect.top() + int(frac * rect.height()))
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if self.continuous and self.page_sizes:
+            self.relayout(keep_position=True)
+            self.update_visible()
+
+    def update_visible(self):
+        """
+        连续滚动模式：渲染视口里（先）和上下一屏以内的页，撤掉已经滚远的排队任务，
+        丢掉离开更远的页的缓存；当前页取视口中间的那页
+        """
+        if not self.continuous or not self.page_sizes or not self.cont_view.tops:
+            return
+        view = self.cont_view
+        top = self.cont_scroll.verticalScrollBar().value()
+        height = self.cont_scroll.viewport().height()
+        margin = int(height * RENDER_MARGIN)
+        first, last = view.page_at(top), view.page_at(top + height)
+        lo, hi = view.page_at(top - margin), view.page_at(top + height + margin)
+        for key, task in list(self.pending.items()):
+            if not lo <= key[0] <= hi and try_take(self.render_pool, task):
+                del self.pending[key]
+        for n in range(first, last + 1):
+            self.request_render(view.keys[n], priority=1)
+        for n in list(range(lo, first)) + list(range(last + 1, hi + 1)):
+            self.request_render(view.keys[n])
+        self.cache.evict(lambda key: not lo - KEEP_PAGES <= key[0] <= hi + KEEP_PAGES)
+        self.current_page = view.page_at(top + height // 2)
+        self.update_page_label()
+
+    def update_page_label(self):
+        self.page_input.setText(str(self.current_page + 1))
+        self.setWindowTitle(f"PDF 浏览器 - 第 {self.current_page+1}/{len(self.page_sizes)} 页")
 
-        # 获取窗口大小
+    def render_key(self, page_no):
+        """(页号, 缩放模式, 比例)；比例取 4 位小数，窗口大小没变时同一页得到同一个 key"""
+        page_w, page_h = self.page_sizes[page_no]
         view_w = self.scroll.viewport().width()
         view_h = self.scroll.viewport().height()
-        page_w, page_h = page.rect.width, page.rect.height
+        scale = page_scale(page_w, page_h, self.scale_mode, view_w, view_h, self.zoom_factor)
+        return page_no, self.scale_mode, round(scale, 4)
+
+    def show_page(self):
+        if not self.page_sizes:
+            return
+        if self.continuous:
+            # 滚到该页顶端，渲染由 update_visible 负责
+            bar = self.cont_scroll.verticalScrollBar()
+            target = self.cont_view.tops[self.current_page] - PAGE_GAP
+            page = self.current_page
+            if bar.value() != target:
+                bar.setValue(target)
+            self.update_visible()
+            self.current_page = page  # 最后几页滚不到顶端时仍以跳转的页为准
+            self.update_page_label()
+            return
+        key = self.render_key(self.current_page)
+        image = self.cache.get(key)
+        if image is not None:
+            self.image_label.setPixmap(self.page_pixmap(key, image))
+        else:
+            self.request_render(key, priority=1)
+
+        self.update_page_label()
+        self.prefetch()
 
-        # 计算缩放比例
-        if self.scale_mode == "fit_width":
-            scale = view_w / page_w
-        elif self.scale_mode == "fit_page":
-            scale = min(view_w / page_w, view_h / page_h)
-        else:  # actual
-            scale = self.zoom_factor
+    def request_render(self, key, priority=0):
+        """提交渲染任务（已在缓存或已在排队的跳过）；当前页用较高优先级插到队列前面"""
+        if key in self.cache or key in self.pending:
+            return
+        task = RenderTask(self.path, key, self.render_doc)
+        task.signals.done.connect(self.on_rendered)
+        self.pending[key] = task
+        self.render_pool.start(task, priority)
 
-        mat = fitz.Matrix(scale, scale)
-        pix = page.get_pixmap(matrix=mat)
+    def prefetch(self):
+        """预先渲染当前页前后几页；翻过去以后不再需要、还没开始的任务撤掉"""
+        pages = [self.current_page + d for d in range(1, PREFETCH_AHEAD + 1)]
+        pages += [self.current_page - d for d in range(1, PREFETCH_BEHIND + 1)]
+        wanted = [self.render_key(n) for n in pages if 0 <= n < len(self.page_sizes)]
+        for key, task in list(self.pending.items()):
+            if key[0] != self.current_page and key not in wanted and try_take(self.render_pool, task):
+                del self.pending[key]
+        for key in wanted:
+            self.request_render(key)
 
-        image = QImage(pix.samples, pix.width, pix.height, pix.stride, QImage.Format.Format_RGB888)
-        self.image_label.setPixmap(QPixmap.fromImage(image))
+    def cancel_pending(self):
+        for key, task in list(self.pending.items()):
+            if try_take(self.render_pool, task):
+                del self.pending[key]
 
-        self.page_input.setText(str(self.current_page + 1))
-        self.setWindowTitle(f"PDF 浏览器 - 第 {self.current_page+1}/{self.doc.page_count} 页")
+    def on_rendered(self, path, key, image, error):
+        if path != self.path:
+            return  # 已经换了文件
+        self.pending.pop(key, None)
+        if image.isNull():
+            if key[0] == self.current_page:
+                self.image_label.setText(f"第 {key[0] + 1} 页渲染失败: {error}")
+            return
+        self.cache.put(key, image)
+        if not self.page_sizes:
+            return
+        if self.continuous:
+            view = self.cont_view
+            if key[0] < len(view.keys) and view.keys[key[0]] == key:
+                view.update(view.page_rect(key[0]))
+        elif key == self.render_key(self.current_page):
+            self.image_label.setPixmap(self.page_pixmap(key, image))
+
+    def page_pixmap(self, key, image):
+        """单页模式显示用的 pixmap：有匹配时在副本上标出"""
+        pixmap = QPixmap.fromImage(image)
+        if key[0] in self.hits_by_page:
+            painter = QPainter(pixmap)
+            self.draw_hits(painter, key[0], 0, 0, key[2])
+            painter.end()
+        return pixmap
+
+    def refresh_page(self):
+        """匹配结果或当前匹配变了以后重画"""
+        if not self.page_sizes:
+            return
+        if self.continuous:
+            self.cont_view.update()
+            return
+        key = self.render_key(self.current_page)
+        image = self.cache.get(key)
+        if image is not None:
+            self.image_label.setPixmap(self.page_pixmap(key, image))
+
+    # ========= 全文查找 =========
+
+    def reset_search(self):
+        for first, task in list(self.extract_tasks.items()):
+            try_take(self.render_pool, task)
+        self.extract_tasks = {}
+        self.text_index = None
+        self.text_digest = ""
+        self.text_pages = []
+        self.text_remaining = 0
+        self.search_query = ""
+        self.hits = []
+        self.hits_by_page = {}
+        self.current_hit = -1
+        self.hit_list.clear()
+        self.hit_label.clear()
+
+    def start_text_index(self):
+        """先查缓存（后台计算文件哈希），没有缓存时再逐段提取"""
+        task = TextLoadTask(self.path)
+        task.signals.loaded.connect(self.on_text_loaded)
+        self.text_load_task = task
+        QThreadPool.globalInstance().start(task)
+
+    def on_text_loaded(self, path, digest, pages):
+        if path != self.path:
+            return
+        self.text_load_task = None
+        self.text_digest = digest
+        if pages is not None and len(pages) == len(self.page_sizes):
+            self.on_text_ready(pages)
+            return
+        count = len(self.page_sizes)
+        self.text_pages = [None] * count
+        self.text_remaining = count
+        for first in range(0, count, TEXT_CHUNK_PAGES):
+            task = ExtractTask(self.path, first, min(first + TEXT_CHUNK_PAGES, count), self.render_doc)
+            task.signals.extracted.connect(self.on_text_extracted)
+            self.extract_tasks[first] = task
+            self.render_pool.start(task, -1)
+        if count == 0:
+            self.on_text_ready([])
+
+    def on_text_extracted(self, path, first, words):
+        if path != self.path or first not in self.extract_tasks:
+            return
+        del self.extract_tasks[first]
+        self.text_pages[first: first + len(words)] = words
+        self.text_remaining -= len(words)
+        if self.search_query:
+            done = len(self.page_sizes) - self.text_remaining
+            self.hit_label.setText(f"建立索引 {done}/{len(self.page_sizes)} 页")
+        if self.text_remaining == 0:
+            if self.text_digest:
+                QThreadPool.globalInstance().start(TextSaveTask(self.text_digest, self.text_pages))
+            self.on_text_ready(self.text_pages)
+
+    def on_text_ready(self, pages):
+        self.text_index = TextIndex(pages)
+        self.text_pages = []
+        if self.search_query:
+            self.run_search(self.search_query)
+
+    def on_search_enter(self):
+        query = self.search_input.text().strip()
+        if query and query == self.search_query and self.text_index is not None:
+            self.step_hit(1)
+        else:
+            self.run_search(query)
+
+    def run_search(self, query):
+        self.search_query = query
+        self.hits = []
+        self.hits_by_page = {}
+        self.current_hit = -1
+        self.hit_list.clear()
+        if not query or not self.page_sizes:
+            self.hit_label.clear()
+            self.refresh_page()
+            return
+        if self.text_index is None:
+            self.hit_label.setText("建立索引中...")
+            return
+        self.hits = self.text_index.search(query)
+        for i, (page_no, _) in enumerate(self.hits):
+            self.hits_by_page.setdefault(page_no, []).append(i)
+        for page_no, indices in self.hits_by_page.items():
+            item = QListWidgetItem(f"第 {page_no + 1} 页  ({len(indices)})")
+            item.setData(Qt.ItemDataRole.UserRole, page_no)
+            self.hit_list.addItem(item)
+        if not self.hits:
+            self.hit_label.setText("未找到")
+            self.refresh_page()
+            return
+        self.hit_dock.show()
+        # 从当前页开始的第一处
+        first = next((i for i, (page_no, _) in enumerate(self.hits) if page_no >= self.current_page), 0)
+        self.goto_hit(first)
+
+    def step_hit(self, delta):
+        if self.hits:
+            self.goto_hit((self.current_hit + delta) % len(self.hits))
+
+    def on_hit_page_clicked(self, item):
+        self.goto_hit(self.hits_by_page[item.data(Qt.ItemDataRole.UserRole)][0])
+
+    def goto_hit(self, index):
+        self.current_hit = index
+        page_no, rects = self.hits[index]
+        self.hit_label.setText(f"第 {index + 1}/{len(self.hits)} 处，共 {len(self.hits_by_page)} 页")
+        if page_no != self.current_page:
+            self.current_page = page_no
+            self.show_page()
+        self.refresh_page()
+        # 让匹配位置出现在视口里
+        x0, y0 = rects[0][0], rects[0][1]
+        if self.continuous:
+            view = self.cont_view
+            rect = view.page_rect(page_no)
+            bar = self.cont_scroll.verticalScrollBar()
+            y = rect.y() + int(y0 * view.keys[page_no][2])
+            if not bar.value() <= y < bar.value() + self.cont_scroll.viewport().height() - 40:
+                bar.setValue(y - self.cont_scroll.viewport().height() // 3)
+                self.current_page = page_no
+                self.update_page_label()
+        else:
+            scale = self.render_key(page_no)[2]
+            pixmap = self.image_label.pixmap()
+            off_x = max(0, (self.image_label.width() - pixmap.width()) // 2)
+            off_y = max(0, (self.image_label.height() - pixmap.height()) // 2)
+            self.scroll.ensureVisible(off_x + int(x0 * scale), off_y + int(y0 * scale), 50, 100)
+
+    def draw_hits(self, painter, page_no, x, y, scale):
+        """在页面 (左上角 x, y，比例 scale) 上标出该页的匹配，当前匹配用另一种颜色"""
+        for i in self.hits_by_page.get(page_no, ()):
+            color = CURRENT_HIT_COLOR if i == self.current_hit else HIT_COLOR
+            for x0, y0, x1, y1 in self.hits[i][1]:
+                painter.fillRect(QRectF(x + x0 * scale, y + y0 * scale,
+                                        (x1 - x0) * scale, (y1 - y0) * scale), color)
+
+    def export_png(self):
+        """按 实际大小 的比例把所有页导出成 PNG（多进程）"""
+        if not self.page_sizes or self.export_task is not None:
+            return
+        out_dir = QFileDialog.getExistingDirectory(self, "选择导出目录", os.path.dirname(self.path))
+        if not out_dir:
+            return
+        task = ExportTask(self.path, out_dir, self.zoom_factor, len(self.page_sizes))
+        task.signals.progress.connect(self.on_export_progress)
+        task.signals.finished.connect(self.on_export_finished)
+        self.export_task = task
+        self.statusBar().showMessage("导出中...")
+        QThreadPool.globalInstance().start(task)
+
+    def on_export_progress(self, done, total):
+        self.statusBar().showMessage(f"导出中... {done}/{total} 页")
+
+    def on_export_finished(self, ok, error):
+        self.export_task = None
+        message = f"导出完成: {ok} 页"
+        if error:
+            message += f"（有页面失败: {error}）"
+        self.statusBar().showMessage(message)
+
+    def closeEvent(self, event):
+        if self.export_task is not None:
+            self.export_task.cancelled = True
+        QThreadPool.globalInstance().waitForDone()
+        self.render_pool.clear()
+        self.render_pool.waitForDone()
+        self.render_doc.close()
+        super().closeEvent(event)
 
     def prev_page(self):
-        if self.doc and self.current_page > 0:
+        if self.page_sizes and self.current_page > 0:
             self.current_page -= 1
             self.show_page()
 
     def next_page(self):
-        if self.doc and self.current_page < self.doc.page_count - 1:
+        if self.page_sizes and self.current_page < len(self.page_sizes) - 1:
             self.current_page += 1
             self.show_page()
 
     def go_to_page(self):
-        if not self.doc:
+        if not self.page_sizes:
             return
         try:
             page = int(self.page_input.text()) - 1
         except ValueError:
             return
-        if 0 <= page < self.doc.page_count:
+        if 0 <= page < len(self.page_sizes):
             self.current_page = page
             self.show_page()
 
@@ -128,6 +805,8 @@ def main():
     viewer = PDFViewer()
     viewer.resize(1200, 900)
     viewer.show()
+    if len(sys.argv) > 1:
+        viewer.load_pdf(sys.argv[1])
     sys.exit(app.exec())
 
 